@@ -0,0 +1,391 @@
+"""
+Bulk Import Module
+Streams a CSV of SNs into registration jobs: rows are parsed as the upload
+arrives, matched by SN against the discovery location index to find their
+OLT and F/S/P, spooled to MongoDB and then registered per OLT and port in the
+background, with progress kept on the import document. Imports whose worker
+stopped beating are resumed by another (or the restarted) worker.
+"""
+import asyncio
+import codecs
+import csv
+import logging
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+# Rows buffered before they are resolved and written to import_rows
+INSERT_BATCH = 500
+
+# Error of rows whose registration was cut off before its result came back
+UNKNOWN_ERROR = 'Proses terhenti saat registrasi, periksa status ONT di OLT'
+
+
+async def iter_csv_rows(chunks):
+    """Yield (line_number, row dict) from an async iterator of byte chunks.
+
+    Only complete records are handed to the csv module: a record ends at a
+    newline outside quotes, so quoted fields may still span lines.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    header = None
+    pending = ''
+    line_number = 0
+
+    def records(text, final=False):
+        nonlocal pending
+        pending += text
+        out = []
+        scan = 0
+        while True:
+            end = pending.find('\n', scan)
+            if end < 0:
+                break
+            if pending.count('"', 0, end) % 2:
+                # Newline inside a quoted field, keep reading
+                scan = end + 1
+                continue
+            out.append(pending[:end + 1])
+            pending = pending[end + 1:]
+            scan = 0
+        if final and pending:
+            out.append(pending)
+            pending = ''
+        return out
+
+    def rows(text, final=False):
+        nonlocal header, line_number
+        out = []
+        for record in records(text, final):
+            line_number += 1
+            values = next(csv.reader([record]), [])
+            if not any(v.strip() for v in values):
+                continue
+            if header is None:
+                header = [v.strip().lower() for v in values]
+                continue
+            out.append((line_number, {k: v.strip() for k, v in zip(header, values)}))
+        return out
+
+    async for chunk in chunks:
+        for row in rows(decoder.decode(chunk)):
+            yield row
+    for row in rows(decoder.decode(b'', final=True), final=True):
+        yield row
+
+
+class BulkImporter:
+    """Spools CSV rows per import and registers them OLT by OLT.
+
+    `register_olt(olt_id, jobs, username)` is an async generator that
+    consumes jobs ({profile_id, fsp, row_ids, entries}) over one OLT session
+    and yields (job, results) for each. `resolver.resolve(sn)` returns
+    {olt_id, fsp} or None.
+
+    Rows go from pending to sending just before their job reaches the OLT.
+    A run that dies leaves them sending; they become 'unknown' rather than
+    being registered twice.
+    """
+
+    def __init__(self, db, register_olt, resolver, concurrency=8, job_size=64, owner=None, stale_after=120):
+        self.db = db
+        self.register_olt = register_olt
+        self.resolver = resolver
+        self.concurrency = concurrency
+        self.job_size = job_size
+        self.owner = owner
+        self.stale_after = stale_after
+        self._task = None
+        self._runs = set()
+
+    async def ensure_indexes(self):
+        await self.db.import_rows.create_index([
+            ('import_id', ASCENDING), ('olt_id', ASCENDING), ('status', ASCENDING),
+            ('fsp', ASCENDING), ('profile_id', ASCENDING), ('line', ASCENDING)
+        ])
+
+    async def _profile_id(self, cache, olt_id, key):
+        if (olt_id, key) not in cache:
+            query = {'olt_id': olt_id}
+            if ObjectId.is_valid(key):
+                query['_id'] = ObjectId(key)
+            else:
+                query['name'] = key
+            profile = await self.db.profiles.find_one(query, {'_id': 1})
+            cache[(olt_id, key)] = str(profile['_id']) if profile else None
+        return cache[(olt_id, key)]
+
+    async def _row_doc(self, import_id, line, row, default_profile, profiles):
+        sn = row.get('sn', '').upper()
+        doc = {
+            'import_id': import_id,
+            'line': line,
+            'sn': sn,
+            'description': row.get('description', ''),
+            'olt_id': None,
+            'fsp': None,
+            'profile_id': None,
+            'status': 'pending',
+            'error': None,
+        }
+        profile_key = row.get('profile') or default_profile
+        location = await self.resolver.resolve(sn) if sn else None
+        if not sn:
+            doc.update(status='failed', error='Kolom sn kosong')
+        elif location is None:
+            doc.update(status='unresolved', error='SN tidak ditemukan di hasil discovery terbaru')
+        elif not profile_key:
+            doc.update(location, status='failed', error='Profile tidak ditentukan')
+        else:
+            doc.update(location)
+            doc['profile_id'] = await self._profile_id(profiles, location['olt_id'], profile_key)
+            if doc['profile_id'] is None:
+                doc.update(status='failed', error=f"Profile '{profile_key}' tidak ditemukan pada OLT")
+        return doc
+
+    async def _flush(self, import_id, docs):
+        if not docs:
+            return
+        await self.db.import_rows.insert_many(docs)
+        counts = {'rows': len(docs)}
+        for doc in docs:
+            counts[doc['status']] = counts.get(doc['status'], 0) + 1
+        await self.db.imports.update_one(
+            {'_id': ObjectId(import_id)}, {'$inc': {f'counts.{k}': v for k, v in counts.items()}}
+        )
+        docs.clear()
+
+    async def ingest(self, chunks, username, default_profile=None):
+        """Spool an uploaded CSV into import_rows; returns the import document."""
+        now = datetime.now(timezone.utc)
+        result = await self.db.imports.insert_one({
+            'status': 'uploading',
+            'owner': self.owner,
+            'heartbeat_at': now,
+            'created_by': username,
+            'created_at': now,
+            'updated_at': now,
+            'default_profile': default_profile,
+            'counts': {'rows': 0, 'pending': 0, 'unresolved': 0, 'failed': 0, 'registered': 0, 'unknown': 0},
+            'olts': {},
+            'error': None,
+        })
+        import_id = str(result.inserted_id)
+        profiles = {}
+        batch = []
+        heartbeat = asyncio.create_task(self._heartbeat(import_id))
+        try:
+            async for line, row in iter_csv_rows(chunks):
+                batch.append(await self._row_doc(import_id, line, row, default_profile, profiles))
+                if len(batch) >= INSERT_BATCH:
+                    await self._flush(import_id, batch)
+            await self._flush(import_id, batch)
+        except Exception as e:
+            await self._set(import_id, status='failed', error=str(e))
+            raise
+        finally:
+            heartbeat.cancel()
+        await self._set(import_id, status='queued', heartbeat_at=datetime.now(timezone.utc))
+        return await self.get(import_id)
+
+    async def _heartbeat(self, import_id):
+        """Keep an import this worker is handling from looking abandoned."""
+        if self.stale_after <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.stale_after / 4)
+            try:
+                await self.db.imports.update_one(
+                    {'_id': ObjectId(import_id), 'owner': self.owner},
+                    {'$set': {'heartbeat_at': datetime.now(timezone.utc)}}
+                )
+            except Exception as e:
+                logger.error(f"Bulk import {import_id} heartbeat failed: {e}")
+
+    async def _set(self, import_id, **fields):
+        fields['updated_at'] = datetime.now(timezone.utc)
+        await self.db.imports.update_one({'_id': ObjectId(import_id)}, {'$set': fields})
+
+    async def get(self, import_id):
+        if not ObjectId.is_valid(import_id):
+            return None
+        return await self.db.imports.find_one({'_id': ObjectId(import_id)})
+
+    async def rows(self, import_id, status=None, skip=0, limit=100):
+        query = {'import_id': import_id}
+        if status:
+            query['status'] = status
+        return await self.db.import_rows.find(query).sort('line', ASCENDING).skip(skip).limit(limit).to_list(limit)
+
+    async def _jobs(self, import_id, olt_id):
+        """Pending rows of one OLT as jobs of one port and profile each."""
+        cursor = self.db.import_rows.find(
+            {'import_id': import_id, 'olt_id': olt_id, 'status': 'pending'}
+        ).sort([('fsp', ASCENDING), ('profile_id', ASCENDING), ('line', ASCENDING)])
+        job = None
+        async for row in cursor:
+            key = (row['fsp'], row['profile_id'])
+            if job and (job['key'] != key or len(job['row_ids']) >= self.job_size):
+                yield await self._sending(job)
+                job = None
+            if job is None:
+                job = {'key': key, 'fsp': row['fsp'], 'profile_id': row['profile_id'], 'row_ids': [], 'entries': []}
+            job['row_ids'].append(row['_id'])
+            job['entries'].append({'sn': row['sn'], 'fsp': row['fsp'], 'description': row['description']})
+        if job:
+            yield await self._sending(job)
+
+    async def _sending(self, job):
+        await self.db.import_rows.update_many(
+            {'_id': {'$in': job['row_ids']}}, {'$set': {'status': 'sending'}}
+        )
+        return job
+
+    async def _record(self, import_id, olt_id, job, results):
+        registered = 0
+        for row_id, result in zip(job['row_ids'], results):
+            status = 'registered' if result.get('success') else 'failed'
+            registered += status == 'registered'
+            await self.db.import_rows.update_one({'_id': row_id}, {'$set': {
+                'status': status,
+                'error': result.get('error'),
+                'ont_id': result.get('ont_id'),
+                'service_port_id': result.get('service_port_id'),
+            }})
+        failed = len(job['row_ids']) - registered
+        await self.db.imports.update_one({'_id': ObjectId(import_id)}, {
+            '$inc': {
+                'counts.pending': -len(job['row_ids']),
+                'counts.registered': registered,
+                'counts.failed': failed,
+                f'olts.{olt_id}.done': len(job['row_ids']),
+            },
+            '$set': {'updated_at': datetime.now(timezone.utc)},
+        })
+
+    async def _settle(self, import_id, olt_id, from_status, status, message):
+        result = await self.db.import_rows.update_many(
+            {'import_id': import_id, 'olt_id': olt_id, 'status': from_status},
+            {'$set': {'status': status, 'error': message}}
+        )
+        if result.modified_count:
+            await self.db.imports.update_one({'_id': ObjectId(import_id)}, {'$inc': {
+                'counts.pending': -result.modified_count,
+                f'counts.{status}': result.modified_count,
+                f'olts.{olt_id}.done': result.modified_count,
+            }})
+
+    async def _fail_pending(self, import_id, olt_id, message):
+        await self._settle(import_id, olt_id, 'sending', 'unknown', UNKNOWN_ERROR)
+        await self._settle(import_id, olt_id, 'pending', 'failed', message)
+
+    async def _run_olt(self, import_id, olt_id, username, semaphore):
+        async with semaphore:
+            await self.db.imports.update_one(
+                {'_id': ObjectId(import_id)}, {'$set': {f'olts.{olt_id}.status': 'running'}}
+            )
+            status, error = 'completed', None
+            try:
+                async for job, results in self.register_olt(olt_id, self._jobs(import_id, olt_id), username):
+                    await self._record(import_id, olt_id, job, results)
+            except Exception as e:
+                logger.error(f"Bulk import {import_id} failed on OLT {olt_id}: {e}")
+                status, error = 'failed', str(e)
+                await self._fail_pending(import_id, olt_id, error)
+            await self.db.imports.update_one({'_id': ObjectId(import_id)}, {'$set': {
+                f'olts.{olt_id}.status': status,
+                f'olts.{olt_id}.error': error,
+            }})
+
+    async def run(self, import_id):
+        """Register every pending row, OLTs in parallel and each OLT's ports in order."""
+        now = datetime.now(timezone.utc)
+        await self._set(import_id, status='running', started_at=now, owner=self.owner, heartbeat_at=now)
+        heartbeat = asyncio.create_task(self._heartbeat(import_id))
+        try:
+            doc = await self.get(import_id)
+            totals = await self.db.import_rows.aggregate([
+                {'$match': {'import_id': import_id, 'status': 'pending'}},
+                {'$group': {'_id': '$olt_id', 'total': {'$sum': 1}}},
+            ]).to_list(None)
+            started = doc.get('olts') or {}
+            pending = {t['_id'] for t in totals}
+            # A resumed run keeps the progress of OLTs it already started
+            olts = {
+                f'olts.{t["_id"]}': {
+                    **started.get(t['_id'], {'total': t['total'], 'done': 0}), 'status': 'queued', 'error': None,
+                }
+                for t in totals
+            }
+            olts.update({
+                f'olts.{olt_id}.status': 'completed'
+                for olt_id, progress in started.items()
+                if olt_id not in pending and progress.get('status') in ('queued', 'running')
+            })
+            if olts:
+                await self._set(import_id, **olts)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(
+                self._run_olt(import_id, t['_id'], doc['created_by'], semaphore) for t in totals
+            ))
+        except Exception as e:
+            logger.error(f"Bulk import {import_id} error: {e}")
+            await self._set(import_id, status='failed', error=str(e), finished_at=datetime.now(timezone.utc))
+            return
+        finally:
+            heartbeat.cancel()
+        await self._set(import_id, status='completed', finished_at=datetime.now(timezone.utc))
+
+    async def resume_stale(self):
+        """Take over imports whose worker stopped beating; returns the IDs resumed."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        resumed = []
+        stale = await self.db.imports.find(
+            {'status': {'$in': ['uploading', 'queued', 'running']}, 'heartbeat_at': {'$lt': cutoff}},
+            {'status': 1, 'heartbeat_at': 1}
+        ).to_list(None)
+        for doc in stale:
+            now = datetime.now(timezone.utc)
+            claim = {'$set': {'owner': self.owner, 'heartbeat_at': now, 'updated_at': now}}
+            if doc['status'] == 'uploading':
+                # The upload connection is gone with its worker; the CSV cannot be finished
+                claim['$set'].update(status='failed', error='Upload terputus sebelum selesai', finished_at=now)
+            taken = await self.db.imports.update_one(
+                {'_id': doc['_id'], 'status': doc['status'], 'heartbeat_at': doc['heartbeat_at']}, claim
+            )
+            if not taken.modified_count or doc['status'] == 'uploading':
+                continue
+            import_id = str(doc['_id'])
+            logger.info(f"Resuming bulk import {import_id} ({doc['status']})")
+            cut_off = await self.db.import_rows.distinct('olt_id', {'import_id': import_id, 'status': 'sending'})
+            for olt_id in cut_off:
+                await self._settle(import_id, olt_id, 'sending', 'unknown', UNKNOWN_ERROR)
+            task = asyncio.create_task(self.run(import_id))
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+            resumed.append(import_id)
+        return resumed
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.resume_stale()
+            except Exception as e:
+                logger.error(f"Bulk import resume error: {e}")
+            await asyncio.sleep(self.stale_after / 2)
+
+    def start(self):
+        if self._task is None and self.stale_after > 0:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
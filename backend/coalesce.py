@@ -0,0 +1,64 @@
+"""
+Request Coalescing Module
+Single-flight execution of identical OLT operations, with an optional
+freshness window so a result that just landed can answer later callers.
+"""
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing the same key into one execution."""
+
+    def __init__(self, freshness=0.0):
+        self.freshness = freshness
+        self._inflight = {}
+        self._recent = {}
+        # Bumped by invalidate(); a run started before it must not cache its result
+        self._generation = {}
+
+    async def run(self, key, func, *args, **kwargs):
+        """Run func(*args, **kwargs) once per key. Returns (result, shared).
+
+        `shared` is True when the caller received a result produced by another
+        caller (joined an in-flight call or hit the freshness window).
+        """
+        recent = self._recent.get(key)
+        if recent and time.monotonic() - recent[0] <= self.freshness:
+            return recent[1], True
+
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            # Run detached from the caller so a disconnecting client does not
+            # cancel the work other callers are waiting on
+            generation = self._generation.get(key, 0)
+            task = asyncio.ensure_future(self._execute(key, generation, func, args, kwargs))
+            self._inflight[key] = task
+        else:
+            logger.info(f"Joining in-flight operation for {key}")
+        return await asyncio.shield(task), shared
+
+    async def _execute(self, key, generation, func, args, kwargs):
+        try:
+            result = await func(*args, **kwargs)
+            if self.freshness > 0 and self._generation.get(key, 0) == generation:
+                self._recent[key] = (time.monotonic(), result)
+            return result
+        finally:
+            # invalidate() may have detached this run and a newer one taken the key
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self, key):
+        """Drop any cached result for key so the next call runs fresh.
+
+        A call already in flight still answers the callers that joined it,
+        but later callers start a new one and its result is not cached.
+        """
+        self._recent.pop(key, None)
+        self._inflight.pop(key, None)
+        self._generation[key] = self._generation.get(key, 0) + 1
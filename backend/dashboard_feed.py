@@ -0,0 +1,126 @@
+"""
+Dashboard Feed Module
+Keeps the dashboard numbers and recent activity in memory, seeded once from
+MongoDB and then advanced by event-bus events, so live dashboards cost
+nothing until a registration, scan or list change actually happens.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Fields of a registration log pushed to live dashboards
+LOG_SUMMARY_FIELDS = [
+    'olt_id', 'olt_name', 'profile_name', 'sn', 'fsp', 'ont_id',
+    'success', 'error', 'registered_at', 'registered_by',
+]
+
+
+def log_summary(log):
+    summary = {'id': str(log['_id'])} if '_id' in log else {}
+    for field in LOG_SUMMARY_FIELDS:
+        value = log.get(field)
+        summary[field] = value.isoformat() if isinstance(value, datetime) else value
+    return summary
+
+
+def day_start(now=None):
+    return (now or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class DashboardFeed:
+    """Incrementally maintained `/dashboard/stats` for push clients."""
+
+    def __init__(self, db, bus, archived_totals, recent=5):
+        self.db = db
+        self.bus = bus
+        self.archived_totals = archived_totals
+        self.recent = recent
+        self.stats = None
+        self._day = None
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+        bus.listen(self.on_event)
+
+    async def compute(self, projection=None):
+        """Dashboard stats straight from MongoDB."""
+        total_olts = await self.db.olts.count_documents({})
+        total_profiles = await self.db.profiles.count_documents({})
+        total_registrations = await self.db.registration_logs.count_documents({})
+        success_registrations = await self.db.registration_logs.count_documents({'success': True})
+        failed_registrations = await self.db.registration_logs.count_documents({'success': False})
+        archived = await self.archived_totals()
+        today_registrations = await self.db.registration_logs.count_documents(
+            {'registered_at': {'$gte': day_start()}}
+        )
+        recent_logs = await self.db.registration_logs.find({}, projection).sort(
+            'registered_at', -1
+        ).limit(self.recent).to_list(self.recent)
+        return {
+            'total_olts': total_olts,
+            'total_profiles': total_profiles,
+            'total_registrations': total_registrations + archived['count'],
+            'success_registrations': success_registrations + archived['success'],
+            'failed_registrations': failed_registrations + archived['failed'],
+            'archived_registrations': archived['count'],
+            'today_registrations': today_registrations,
+            'recent_logs': recent_logs,
+        }
+
+    async def snapshot(self):
+        async with self._lock:
+            if self.stats is None:
+                stats = await self.compute({f: 1 for f in LOG_SUMMARY_FIELDS})
+                stats['recent_logs'] = [log_summary(l) for l in stats['recent_logs']]
+                self.stats = stats
+                self._day = day_start()
+        self._roll_day()
+        return dict(self.stats)
+
+    def _roll_day(self):
+        today = day_start()
+        if self._day != today:
+            self._day = today
+            self.stats['today_registrations'] = 0
+
+    def on_event(self, event):
+        if self.stats is None:
+            return
+        kind = event['type']
+        if kind == 'registration':
+            self._roll_day()
+            log = event['log']
+            self.stats['total_registrations'] += 1
+            self.stats['success_registrations' if log['success'] else 'failed_registrations'] += 1
+            self.stats['today_registrations'] += 1
+            self.stats['recent_logs'] = ([log] + self.stats['recent_logs'])[:self.recent]
+        elif kind in ('olts_changed', 'profiles_changed'):
+            self._spawn(self._recount(kind.split('_')[0]))
+        elif kind == 'registration_logs_changed' and event.get('remote'):
+            # Another worker wrote logs this bus never saw
+            self._spawn(self._reseed())
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _reseed(self):
+        self.stats = None
+        try:
+            await self.snapshot()
+        except Exception as e:
+            logger.error(f"Dashboard reseed failed: {e}")
+            return
+        self.bus.publish({'type': 'stats'})
+
+    async def _recount(self, collection):
+        try:
+            count = await self.db[collection].count_documents({})
+        except Exception as e:
+            logger.error(f"Dashboard recount of {collection} failed: {e}")
+            return
+        if self.stats is not None:
+            self.stats[f'total_{collection}'] = count
+            self.bus.publish({'type': 'stats'})
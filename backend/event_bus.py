@@ -0,0 +1,74 @@
+"""
+Event Bus Module
+In-process publish/subscribe for things worth pushing to live clients
+(registration logs, discovery snapshots, list changes). Publishing never
+blocks: each subscriber has a bounded queue that drops its oldest event
+when a slow client falls behind.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, bus, maxsize):
+        self.bus = bus
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Fan-out of event dicts ({'type': ..., ...}) to listeners and subscribers."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._listeners = []
+        self.published = 0
+
+    def listen(self, callback):
+        """Call `callback(event)` synchronously on every publish."""
+        self._listeners.append(callback)
+
+    def subscribe(self):
+        subscription = Subscription(self, self.queue_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscriptions.discard(subscription)
+
+    @property
+    def subscribers(self):
+        return len(self._subscriptions)
+
+    def publish(self, event):
+        """Deliver from the event loop thread; never waits on a subscriber."""
+        self.published += 1
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Event listener error on {event.get('type')}: {e}")
+        for subscription in list(self._subscriptions):
+            subscription.offer(event)
+
+    def snapshot(self):
+        return {
+            'published': self.published,
+            'subscribers': self.subscribers,
+            'dropped': sum(s.dropped for s in self._subscriptions),
+        }
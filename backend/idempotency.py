@@ -0,0 +1,142 @@
+"""
+Idempotency Module
+Idempotency-Key support for long-running requests: the first request with a
+key runs the job, repeats of a finished key get the stored result, and
+repeats of a running key attach to the job instead of starting it again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def request_fingerprint(payload):
+    """Stable hash of a request body, so a key cannot be reused for another request."""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class IdempotencyStore:
+    """Results by (user, scope, key) in `idempotency_keys`, plus the jobs running here."""
+
+    def __init__(self, db, ttl=86400, wait=30, stale_after=60, owner=None, poll_interval=0.5):
+        self.db = db
+        self.ttl = ttl
+        self.wait = wait
+        # A running key whose heartbeat is this old belongs to a dead worker
+        self.stale_after = stale_after
+        self.owner = owner
+        self.poll_interval = poll_interval
+        self._running = {}
+
+    async def ensure_indexes(self):
+        await self.db.idempotency_keys.create_index('expires_at', expireAfterSeconds=0)
+
+    async def run(self, key, scope, username, payload, job):
+        """Run `job()` once per key; returns (result, replayed)."""
+        doc_id = f"{username}:{scope}:{key}"
+        fingerprint = request_fingerprint(payload)
+        while True:
+            if doc_id in self._running:
+                task, running_fingerprint = self._running[doc_id]
+                if running_fingerprint != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key sudah dipakai untuk request yang berbeda")
+                # Same worker: share the job's outcome, including its errors
+                return await asyncio.shield(task), True
+
+            now = datetime.now(timezone.utc)
+            try:
+                await self.db.idempotency_keys.insert_one({
+                    '_id': doc_id,
+                    'fingerprint': fingerprint,
+                    'status': 'running',
+                    'owner': self.owner,
+                    'created_at': now,
+                    'heartbeat_at': now,
+                    'expires_at': now + timedelta(seconds=self.ttl),
+                })
+                break
+            except DuplicateKeyError:
+                pass
+
+            doc = await self.db.idempotency_keys.find_one({'_id': doc_id})
+            if doc is None:
+                continue
+            if doc['fingerprint'] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key sudah dipakai untuk request yang berbeda")
+            if doc['status'] == 'done':
+                return doc['response'], True
+            heartbeat_at = doc.get('heartbeat_at') or doc['created_at']
+            if (datetime.now(timezone.utc) - _utc(heartbeat_at)).total_seconds() > self.stale_after:
+                # Its worker stopped beating mid-job: let this request start over
+                await self.db.idempotency_keys.delete_one(
+                    {'_id': doc_id, 'status': 'running', 'heartbeat_at': doc.get('heartbeat_at')}
+                )
+                continue
+            return await self._await_remote(doc_id), True
+
+        task = asyncio.create_task(self._execute(doc_id, job))
+        self._running[doc_id] = (task, fingerprint)
+        task.add_done_callback(lambda t: self._finished(doc_id, t))
+        # Shielded: a client that gives up does not cancel the registration
+        return await asyncio.shield(task), False
+
+    def _finished(self, doc_id, task):
+        self._running.pop(doc_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.info(f"Idempotent job {doc_id} failed: {task.exception()}")
+
+    async def _heartbeat(self, doc_id):
+        """Keep a running key from looking abandoned while its job is alive."""
+        while True:
+            await asyncio.sleep(self.stale_after / 4)
+            try:
+                await self.db.idempotency_keys.update_one(
+                    {'_id': doc_id, 'status': 'running', 'owner': self.owner},
+                    {'$set': {'heartbeat_at': datetime.now(timezone.utc)}}
+                )
+            except Exception as e:
+                logger.error(f"Idempotency heartbeat for {doc_id} failed: {e}")
+
+    async def _execute(self, doc_id, job):
+        heartbeat = asyncio.create_task(self._heartbeat(doc_id))
+        try:
+            result = jsonable_encoder(await job())
+        except BaseException:
+            # Failed jobs may be retried with the same key
+            await self.db.idempotency_keys.delete_one({'_id': doc_id})
+            raise
+        finally:
+            heartbeat.cancel()
+        await self.db.idempotency_keys.update_one(
+            {'_id': doc_id},
+            {'$set': {'status': 'done', 'response': result, 'finished_at': datetime.now(timezone.utc)}}
+        )
+        return result
+
+    async def _await_remote(self, doc_id):
+        """Wait for a job another worker is running under this key."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            doc = await self.db.idempotency_keys.find_one({'_id': doc_id}, {'status': 1, 'response': 1})
+            if doc is None:
+                raise HTTPException(status_code=409, detail="Request sebelumnya gagal, kirim ulang untuk mencoba lagi")
+            if doc['status'] == 'done':
+                return doc['response']
+        raise HTTPException(
+            status_code=409, detail="Request dengan Idempotency-Key ini masih diproses",
+            headers={'Retry-After': '5'}
+        )
@@ -0,0 +1,311 @@
+"""
+ONT Inventory Module
+Background synchronizer that mirrors each OLT's ONT and service-port tables
+into indexed MongoDB collections so lookups never need a telnet session.
+"""
+import asyncio
+import contextlib
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DeleteOne, UpdateOne
+
+from olt_lease import LeaseUnavailableError
+from olt_telnet import parse_ont_info_output, parse_service_port_table
+
+logger = logging.getLogger(__name__)
+
+# ONT IDs per GPON port on MA5600 (0-127)
+MAX_ONTS_PER_PORT = 128
+
+ONT_FIELDS = ('sn', 'control_flag', 'run_state', 'config_state')
+SERVICE_PORT_FIELDS = ('vlan', 'vlan_attr', 'fsp', 'ont_id', 'gemport')
+PORT_FIELDS = ('ont_count', 'online_count', 'used_ont_ids', 'service_port_count', 'full')
+
+
+def split_fsp(fsp):
+    """Split 'F/S/P' into (frame, slot, port) ints."""
+    parts = (fsp or '').split('/')
+    frame = int(parts[0]) if len(parts) > 0 and parts[0].isdigit() else 0
+    slot = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+    port = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+    return frame, slot, port
+
+
+async def parse_inline(func, raw_output):
+    return func(raw_output)
+
+
+def summarize_ports(onts, service_ports):
+    """Build per-port usage records from ONT and service-port rows."""
+    ports = {}
+    for ont in onts:
+        p = ports.setdefault(ont['fsp'], {'used_ont_ids': [], 'online_count': 0, 'service_port_count': 0})
+        p['used_ont_ids'].append(ont['ont_id'])
+        if ont.get('run_state') == 'online':
+            p['online_count'] += 1
+    for sp in service_ports:
+        if sp.get('fsp'):
+            p = ports.setdefault(sp['fsp'], {'used_ont_ids': [], 'online_count': 0, 'service_port_count': 0})
+            p['service_port_count'] += 1
+
+    records = []
+    for fsp, p in ports.items():
+        used = sorted(set(p['used_ont_ids']))
+        records.append({
+            'fsp': fsp,
+            'ont_count': len(used),
+            'online_count': p['online_count'],
+            'used_ont_ids': used,
+            'service_port_count': p['service_port_count'],
+            'full': len(used) >= MAX_ONTS_PER_PORT,
+        })
+    return records
+
+
+def _as_utc(value):
+    """MongoDB returns naive UTC datetimes unless tz_aware is set."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8', errors='ignore')).hexdigest()
+
+
+class InventorySynchronizer:
+    """Pulls ONT/service-port tables from every OLT into MongoDB."""
+
+    JOB_LEASE = 'job:inventory'
+
+    def __init__(self, db, session_factory, interval=900, tick=60, concurrency=4, parse=parse_inline,
+                 leases=None):
+        self.db = db
+        # With leases, one worker runs the periodic sync for the whole fleet
+        self.leases = leases
+        self.session_factory = session_factory
+        self.parse = parse
+        self.interval = interval
+        self.tick = min(tick, interval) if interval > 0 else tick
+        self.concurrency = concurrency
+        self._task = None
+        self._running = set()
+
+    async def ensure_indexes(self):
+        """Create the lookup indexes used by the search API."""
+        await self.db.ont_inventory.create_index('sn')
+        await self.db.ont_inventory.create_index(
+            [('olt_id', ASCENDING), ('fsp', ASCENDING), ('ont_id', ASCENDING)], unique=True
+        )
+        await self.db.service_port_inventory.create_index(
+            [('olt_id', ASCENDING), ('sp_id', ASCENDING)], unique=True
+        )
+        await self.db.service_port_inventory.create_index(
+            [('olt_id', ASCENDING), ('fsp', ASCENDING), ('ont_id', ASCENDING)]
+        )
+        await self.db.port_inventory.create_index(
+            [('olt_id', ASCENDING), ('fsp', ASCENDING)], unique=True
+        )
+        await self.db.port_inventory.create_index('full')
+        await self.db.inventory_sync.create_index('olt_id', unique=True)
+
+    async def _pull_tables(self, olt):
+        """Fetch raw ONT info and service-port tables from an OLT."""
+        async with self.session_factory(olt) as conn:
+            # Frame-level query lists every ONT on every board in one command
+            ont_raw = await asyncio.to_thread(conn.send_command, "display ont info 0 all")
+            sp_raw = await asyncio.to_thread(conn.send_command, "display service-port all")
+        return ont_raw, sp_raw
+
+    async def _apply_diff(self, collection, olt, key_fields, fields, records, now):
+        """Upsert changed rows and drop vanished ones. Returns (changed, removed)."""
+        olt_id = str(olt['_id'])
+        projection = {k: 1 for k in key_fields + fields}
+        existing = {}
+        async for doc in collection.find({'olt_id': olt_id}, projection):
+            existing[tuple(doc.get(k) for k in key_fields)] = doc
+
+        ops = []
+        seen = set()
+        for rec in records:
+            key = tuple(rec[k] for k in key_fields)
+            if key in seen:
+                continue
+            seen.add(key)
+            old = existing.get(key)
+            if old is not None and all(old.get(f) == rec.get(f) for f in fields):
+                continue
+            doc = {f: rec.get(f) for f in fields}
+            doc.update({'olt_name': olt['name'], 'synced_at': now})
+            if 'fsp' in key_fields:
+                doc['frame'], doc['slot'], doc['port'] = split_fsp(rec['fsp'])
+            ops.append(UpdateOne(
+                {'olt_id': olt_id, **{k: rec[k] for k in key_fields}},
+                {'$set': doc},
+                upsert=True
+            ))
+
+        removed = [old['_id'] for key, old in existing.items() if key not in seen]
+        ops.extend(DeleteOne({'_id': _id}) for _id in removed)
+
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+        return len(ops) - len(removed), len(removed)
+
+    async def sync_olt(self, olt, force=False):
+        """Synchronize one OLT. Unchanged tables skip all collection writes."""
+        olt_id = str(olt['_id'])
+        if olt_id in self._running:
+            return {'olt_id': olt_id, 'status': 'running'}
+        self._running.add(olt_id)
+        started = datetime.now(timezone.utc)
+        try:
+            ont_raw, sp_raw = await self._pull_tables(olt)
+            state = await self.db.inventory_sync.find_one({'olt_id': olt_id}) or {}
+            ont_hash, sp_hash = _digest(ont_raw), _digest(sp_raw)
+
+            changed = removed = 0
+            if force or state.get('ont_hash') != ont_hash or state.get('sp_hash') != sp_hash:
+                onts = await self.parse(parse_ont_info_output, ont_raw)
+                service_ports = await self.parse(parse_service_port_table, sp_raw)
+                for coll, keys, fields, records in (
+                    (self.db.ont_inventory, ('fsp', 'ont_id'), ONT_FIELDS, onts),
+                    (self.db.service_port_inventory, ('sp_id',), SERVICE_PORT_FIELDS, service_ports),
+                    (self.db.port_inventory, ('fsp',), PORT_FIELDS, summarize_ports(onts, service_ports)),
+                ):
+                    c, r = await self._apply_diff(coll, olt, keys, fields, records, started)
+                    changed += c
+                    removed += r
+                counts = {'ont_count': len(onts), 'service_port_count': len(service_ports)}
+            else:
+                counts = {}
+
+            finished = datetime.now(timezone.utc)
+            await self.db.inventory_sync.update_one(
+                {'olt_id': olt_id},
+                {
+                    '$set': {
+                        'olt_name': olt['name'],
+                        'status': 'ok',
+                        'error': None,
+                        'synced_at': finished,
+                        'duration_ms': int((finished - started).total_seconds() * 1000),
+                        'ont_hash': ont_hash,
+                        'sp_hash': sp_hash,
+                        'changed': changed,
+                        'removed': removed,
+                        **counts
+                    },
+                    # Version moves whenever a sync finds changed rows; plans pin it
+                    '$inc': {'version': 1 if changed or removed else 0}
+                },
+                upsert=True
+            )
+            logger.info(f"Inventory sync {olt['name']}: {changed} changed, {removed} removed")
+            return {'olt_id': olt_id, 'status': 'ok', 'changed': changed, 'removed': removed}
+        except Exception as e:
+            logger.error(f"Inventory sync error for {olt.get('name')}: {e}")
+            await self.db.inventory_sync.update_one(
+                {'olt_id': olt_id},
+                {'$set': {
+                    'olt_name': olt.get('name'),
+                    'status': 'error',
+                    'error': str(e),
+                    'attempted_at': datetime.now(timezone.utc)
+                }},
+                upsert=True
+            )
+            return {'olt_id': olt_id, 'status': 'error', 'error': str(e)}
+        finally:
+            self._running.discard(olt_id)
+
+    async def sync_all(self, stale_only=False, force=False):
+        """Synchronize every OLT with bounded concurrency."""
+        olts = await self.db.olts.find().to_list(None)
+        if stale_only:
+            fresh_before = datetime.now(timezone.utc).timestamp() - self.interval
+            states = {
+                s['olt_id']: s async for s in self.db.inventory_sync.find({}, {'olt_id': 1, 'synced_at': 1})
+            }
+            olts = [
+                o for o in olts
+                if not states.get(str(o['_id']), {}).get('synced_at')
+                or _as_utc(states[str(o['_id'])]['synced_at']).timestamp() < fresh_before
+            ]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(olt):
+            async with semaphore:
+                return await self.sync_olt(olt, force=force)
+
+        return await asyncio.gather(*(bounded(o) for o in olts))
+
+    async def note_registered_ont(self, olt, fsp, ont_id, sn, service_ports):
+        """Record an ONT added through the app without waiting for the next sync."""
+        olt_id = str(olt['_id'])
+        now = datetime.now(timezone.utc)
+        frame, slot, port = split_fsp(fsp)
+        await self.db.ont_inventory.update_one(
+            {'olt_id': olt_id, 'fsp': fsp, 'ont_id': ont_id},
+            {'$set': {
+                'sn': sn, 'olt_name': olt['name'], 'frame': frame, 'slot': slot, 'port': port,
+                'control_flag': 'active', 'run_state': '', 'config_state': '', 'synced_at': now
+            }},
+            upsert=True
+        )
+        for sp in service_ports:
+            await self.db.service_port_inventory.update_one(
+                {'olt_id': olt_id, 'sp_id': sp['sp_id']},
+                {'$set': {
+                    'vlan': sp['vlan'], 'vlan_attr': 'common', 'fsp': fsp, 'ont_id': ont_id,
+                    'gemport': sp.get('gemport'), 'olt_name': olt['name'],
+                    'frame': frame, 'slot': slot, 'port': port, 'synced_at': now
+                }},
+                upsert=True
+            )
+        onts = await self.db.ont_inventory.find({'olt_id': olt_id, 'fsp': fsp}).to_list(None)
+        sp_count = await self.db.service_port_inventory.count_documents({'olt_id': olt_id, 'fsp': fsp})
+        summary = summarize_ports(onts, [])[0]
+        summary.update({
+            'service_port_count': sp_count, 'olt_name': olt['name'],
+            'frame': frame, 'slot': slot, 'port': port, 'synced_at': now
+        })
+        await self.db.port_inventory.update_one(
+            {'olt_id': olt_id, 'fsp': fsp}, {'$set': summary}, upsert=True
+        )
+        # Hashes no longer describe the stored rows; next sync must diff
+        await self.db.inventory_sync.update_one(
+            {'olt_id': olt_id}, {'$set': {'ont_hash': None, 'sp_hash': None}}
+        )
+
+    async def get_version(self, olt_id):
+        """Return (version, synced_at) for an OLT's inventory, or (None, None)."""
+        state = await self.db.inventory_sync.find_one({'olt_id': olt_id}, {'version': 1, 'synced_at': 1})
+        if not state or not state.get('synced_at'):
+            return None, None
+        return state.get('version', 0), state['synced_at']
+
+    async def run_forever(self):
+        while True:
+            try:
+                async with (self.leases.job(self.JOB_LEASE) if self.leases else contextlib.nullcontext()):
+                    await self.sync_all(stale_only=True)
+            except LeaseUnavailableError:
+                pass
+            except Exception as e:
+                logger.error(f"Inventory sync loop error: {e}")
+            await asyncio.sleep(self.tick)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,132 @@
+"""
+Log Export Module
+Streams registration logs straight from a MongoDB cursor as CSV or NDJSON,
+optionally gzipped on the fly, so an export of any range runs in constant
+memory.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from bson import ObjectId
+
+# Columns exported when the caller does not pick a projection
+DEFAULT_FIELDS = [
+    'registered_at', 'registered_by', 'olt_id', 'olt_name', 'profile_name',
+    'sn', 'fsp', 'ont_id', 'service_port_id', 'description', 'success', 'error',
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Bytes buffered before a chunk goes out to the client
+CHUNK_BYTES = 64 * 1024
+
+
+def log_filter(start=None, end=None, olt_id=None, username=None, success=None):
+    """MongoDB filter for registration logs in [start, end)."""
+    query = {}
+    registered_at = {}
+    if start:
+        registered_at['$gte'] = start
+    if end:
+        registered_at['$lt'] = end
+    if registered_at:
+        query['registered_at'] = registered_at
+    if olt_id:
+        query['olt_id'] = olt_id
+    if username:
+        query['registered_by'] = username
+    if success is not None:
+        query['success'] = success
+    return query
+
+
+def _plain(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _csv_cell(value):
+    value = _plain(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'))
+    return '' if value is None else value
+
+
+class _CsvRows:
+    def __init__(self, fields):
+        self.fields = fields
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def header(self):
+        return self._line(self.fields)
+
+    def row(self, doc):
+        return self._line([_csv_cell(doc.get(f)) for f in self.fields])
+
+    def _line(self, values):
+        self.writer.writerow(values)
+        line = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line
+
+
+class _NdjsonRows:
+    def __init__(self, fields):
+        self.fields = fields
+
+    def header(self):
+        return ''
+
+    def row(self, doc):
+        return json.dumps({f: _plain(doc.get(f)) for f in self.fields}, separators=(',', ':')) + '\n'
+
+
+async def stream_logs(cursor, fmt='csv', fields=None, compress=False):
+    """Yield the export body in CHUNK_BYTES pieces as the cursor advances."""
+    fields = fields or DEFAULT_FIELDS
+    rows = _CsvRows(fields) if fmt == 'csv' else _NdjsonRows(fields)
+    # wbits=31 writes a gzip container rather than a raw zlib stream
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    pending = []
+    size = 0
+
+    def flush():
+        nonlocal size
+        data = ''.join(pending).encode('utf-8')
+        pending.clear()
+        size = 0
+        return gzipper.compress(data) if gzipper else data
+
+    header = rows.header()
+    if header:
+        pending.append(header)
+        size += len(header)
+    async for doc in cursor:
+        line = rows.row(doc)
+        pending.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            chunk = flush()
+            if chunk:
+                yield chunk
+    chunk = flush()
+    if gzipper:
+        chunk += gzipper.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,126 @@
+"""
+Event Loop Monitor Module
+Measures event-loop lag with a heartbeat task and, from a watchdog thread,
+captures the loop thread's stack and in-flight requests whenever the loop
+stops responding, so the blocking handler shows up in the logs.
+"""
+import asyncio
+import collections
+import itertools
+import sys
+import threading
+import time
+import traceback
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Heartbeat on the loop, watchdog off the loop."""
+
+    def __init__(self, interval=0.1, threshold=0.25, history=20, lag_histogram=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_histogram = lag_histogram
+        self.beat = time.monotonic()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.reports = collections.deque(maxlen=history)
+        self._requests = {}
+        self._ids = itertools.count()
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    @contextmanager
+    def track(self, label):
+        """Mark a request as in flight for stall reports."""
+        request_id = next(self._ids)
+        self._requests[request_id] = (label, time.monotonic())
+        try:
+            yield
+        finally:
+            self._requests.pop(request_id, None)
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.beat = now
+            self.max_lag = max(self.max_lag, lag)
+            if self.lag_histogram is not None:
+                self.lag_histogram.observe(lag)
+
+    def _loop_stack(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return []
+        return [f"{f.filename}:{f.lineno} {f.name}" for f in traceback.extract_stack(frame)[-8:]]
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            beat = self.beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or reported == beat:
+                continue
+            # One report per stall, taken while the loop is still blocked
+            reported = beat
+            self.stalls += 1
+            now = time.monotonic()
+            report = {
+                'stalled_seconds': round(stalled, 3),
+                'at': datetime.now(timezone.utc).isoformat(),
+                'requests': [
+                    {'request': label, 'running_seconds': round(now - started, 3)}
+                    for label, started in list(self._requests.values())
+                ],
+                'stack': self._loop_stack(),
+            }
+            self.reports.append(report)
+            where = report['stack'][-1] if report['stack'] else 'unknown'
+            logger.warning(
+                f"Event loop blocked for {stalled:.2f}s at {where}; "
+                f"in flight: {[r['request'] for r in report['requests']]}"
+            )
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self):
+        return {
+            'enabled': self.enabled,
+            'threshold_seconds': self.threshold,
+            'current_lag_seconds': round(max(0.0, time.monotonic() - self.beat - self.interval), 3),
+            'max_lag_seconds': round(self.max_lag, 3),
+            'stalls': self.stalls,
+            'in_flight_requests': len(self._requests),
+            'recent_stalls': list(self.reports),
+        }
@@ -0,0 +1,116 @@
+"""
+OLT Circuit Breaker Module
+Tracks consecutive connect/command failures per OLT and fails fast while an
+OLT is unreachable, probing again with half-open attempts and backoff.
+"""
+import time
+import logging
+
+from olt_telnet import OLTConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(OLTConnectionError):
+    """Raised instead of connecting while an OLT's circuit is open."""
+
+    def __init__(self, key, retry_after, last_error=None):
+        self.key = key
+        self.retry_after = max(0.0, retry_after)
+        self.last_error = last_error
+        message = f"OLT tidak merespons, koneksi ditahan {int(self.retry_after) + 1} detik lagi"
+        if last_error:
+            message += f" (error terakhir: {last_error})"
+        super().__init__(message)
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open once the backoff elapses; one probe decides the rest.
+    """
+
+    def __init__(self, key, failure_threshold=3, base_backoff=10.0, max_backoff=300.0):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.state = 'closed'
+        self.failures = 0
+        self.opens = 0
+        self.retry_at = 0.0
+        self.probe_in_flight = False
+        self.last_error = None
+        self.total_failures = 0
+        self.total_rejections = 0
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError."""
+        now = time.monotonic()
+        if self.state == 'open':
+            if now < self.retry_at:
+                self.total_rejections += 1
+                raise CircuitOpenError(self.key, self.retry_at - now, self.last_error)
+            self.state = 'half_open'
+            logger.info(f"Circuit {self.key} half-open, probing")
+        if self.state == 'half_open':
+            if self.probe_in_flight:
+                self.total_rejections += 1
+                raise CircuitOpenError(self.key, self.base_backoff, self.last_error)
+            self.probe_in_flight = True
+
+    def record_success(self):
+        if self.state != 'closed':
+            logger.info(f"Circuit {self.key} closed")
+        self.state = 'closed'
+        self.failures = 0
+        self.opens = 0
+        self.probe_in_flight = False
+
+    def record_failure(self, error):
+        self.failures += 1
+        self.total_failures += 1
+        self.last_error = str(error)
+        self.probe_in_flight = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            backoff = min(self.max_backoff, self.base_backoff * (2 ** self.opens))
+            self.opens += 1
+            self.state = 'open'
+            self.retry_at = time.monotonic() + backoff
+            logger.warning(f"Circuit {self.key} open for {backoff:.0f}s: {error}")
+
+    def abandon(self):
+        """The admitted call ended without a verdict (e.g. cancelled)."""
+        self.probe_in_flight = False
+
+    def reset(self):
+        self.record_success()
+        self.last_error = None
+
+    def snapshot(self):
+        retry_after = self.retry_at - time.monotonic() if self.state == 'open' else 0.0
+        return {
+            'key': self.key,
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'retry_after_seconds': round(max(0.0, retry_after), 1),
+            'last_error': self.last_error,
+            'total_failures': self.total_failures,
+            'total_rejections': self.total_rejections,
+        }
+
+
+class BreakerRegistry:
+    """Hands out one CircuitBreaker per OLT."""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._breakers = {}
+
+    def get(self, key):
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(key, **self.defaults)
+        return self._breakers[key]
+
+    def snapshot(self):
+        return [b.snapshot() for b in self._breakers.values()]
@@ -0,0 +1,58 @@
+"""
+OLT Health Probe Module
+Cheap asyncio TCP/banner probe used by the fleet health check; thousands of
+OLTs can be probed concurrently without any telnet login or worker thread.
+"""
+import asyncio
+import time
+
+
+async def probe_tcp(host, port=23, timeout=5.0, banner=b"name:"):
+    """Connect to the OLT telnet port and wait for the login banner."""
+    started = time.monotonic()
+    result = {
+        'reachable': False,
+        'banner': False,
+        'connect_ms': None,
+        'latency_ms': None,
+        'error': None,
+    }
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except asyncio.TimeoutError:
+        result['error'] = f"Timeout koneksi ke {host}:{port}"
+        return result
+    except ConnectionRefusedError:
+        result['error'] = f"Koneksi ditolak oleh {host}:{port}"
+        return result
+    except OSError as e:
+        result['error'] = f"Gagal koneksi: {str(e)}"
+        return result
+
+    result['reachable'] = True
+    result['connect_ms'] = round((time.monotonic() - started) * 1000, 1)
+    received = b""
+    try:
+        deadline = started + timeout
+        while banner not in received:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            chunk = await asyncio.wait_for(reader.read(1024), remaining)
+            if not chunk:
+                break
+            received += chunk
+    except (asyncio.TimeoutError, OSError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    result['banner'] = banner in received
+    result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+    if not result['banner']:
+        result['error'] = 'Port terbuka tetapi prompt login tidak muncul'
+    return result
@@ -0,0 +1,256 @@
+"""
+OLT Lease Module
+MongoDB-backed leases that give one worker process ownership of an OLT at a
+time. Each takeover bumps a fencing token; writes that depend on ownership
+(telnet mutations, ID reservations) verify the token first, so a worker
+that lost its lease while paused cannot act on stale state. A lease is
+renewed while in use and fails over to another worker once it expires.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from olt_telnet import OLTConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseUnavailableError(OLTConnectionError):
+    """Raised when another worker kept an OLT's lease past the wait time."""
+
+    def __init__(self, name, owner, retry_after):
+        self.name = name
+        self.owner = owner
+        self.retry_after = max(0.0, retry_after)
+        super().__init__(f"OLT sedang ditangani worker lain ({owner}), coba lagi nanti")
+
+
+class LeaseLostError(OLTConnectionError):
+    """Raised by a fencing check when the lease moved to another worker."""
+
+    def __init__(self, name, token):
+        self.name = name
+        self.token = token
+        super().__init__(f"Lease {name} (token {token}) sudah diambil alih worker lain")
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+class Lease:
+    """A held lease; `token` is the fencing token of this ownership."""
+
+    def __init__(self, manager, name, token):
+        self.manager = manager
+        self.name = name
+        self.token = token
+        self.holders = 0
+
+    async def verify(self):
+        """Fencing check before a write that assumes ownership."""
+        await self.manager.verify(self)
+
+
+class LeaseManager:
+    """Acquires, renews and yields `leases` documents for this worker."""
+
+    def __init__(self, db, ttl=30, wait=30, owner=None, keep=None, on_yield=None):
+        self.db = db
+        self.ttl = ttl
+        self.wait = wait
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # keep(name): hold an unused lease a while longer (e.g. idle pooled sessions)
+        self.keep = keep or (lambda name: False)
+        # on_yield(name): drop local state before handing a lease to a waiting worker
+        self.on_yield = on_yield
+        self._held = {}
+        self._locks = {}
+        self._task = None
+        self.acquired = 0
+        self.lost = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    async def ensure_indexes(self):
+        # No TTL index: the document must outlive expiry so tokens keep increasing
+        await self.db.leases.create_index('owner')
+
+    def _lock(self, name):
+        if name not in self._locks:
+            self._locks[name] = asyncio.Lock()
+        return self._locks[name]
+
+    async def _try_acquire(self, name):
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.db.leases.find_one_and_update(
+                {'_id': name, '$or': [{'owner': None}, {'expires_at': {'$lte': now}}]},
+                {
+                    '$set': {
+                        'owner': self.owner,
+                        'acquired_at': now,
+                        'expires_at': now + timedelta(seconds=self.ttl),
+                        'wanted_by': None,
+                    },
+                    '$inc': {'token': 1},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held and unexpired: the upsert collided with the live document
+            return None
+        self.acquired += 1
+        return Lease(self, name, doc['token'])
+
+    async def acquire(self, name, wait=None):
+        """Take (or join) ownership of `name`, waiting up to `wait` seconds."""
+        if not self.enabled:
+            lease = Lease(self, name, None)
+            lease.holders = 1
+            return lease
+        wait = self.wait if wait is None else wait
+        async with self._lock(name):
+            lease = self._held.get(name)
+            if lease is None:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + wait
+                delay = 0.2
+                while True:
+                    lease = await self._try_acquire(name)
+                    if lease is not None:
+                        break
+                    current = await self.db.leases.find_one_and_update(
+                        {'_id': name}, {'$set': {'wanted_by': self.owner}}
+                    ) or {}
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        # Giving up: do not leave the owner yielding to nobody
+                        await self.db.leases.update_one(
+                            {'_id': name, 'wanted_by': self.owner}, {'$set': {'wanted_by': None}}
+                        )
+                        expires_at = _utc(current.get('expires_at'))
+                        retry_after = (expires_at - datetime.now(timezone.utc)).total_seconds() if expires_at else 0
+                        raise LeaseUnavailableError(name, current.get('owner'), retry_after)
+                    await asyncio.sleep(min(delay, remaining))
+                    delay = min(delay * 2, 2.0)
+                self._held[name] = lease
+                logger.info(f"Lease {name} acquired by {self.owner} (token {lease.token})")
+            lease.holders += 1
+            return lease
+
+    async def release(self, lease):
+        if lease.token is None:
+            return
+        lease.holders = max(0, lease.holders - 1)
+        if lease.holders == 0 and not self.keep(lease.name):
+            await self._drop(lease)
+
+    @asynccontextmanager
+    async def hold(self, name, wait=None):
+        lease = await self.acquire(name, wait)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    def job(self, name):
+        """Hold a singleton background job's lease; LeaseUnavailableError if another worker runs it."""
+        return self.hold(name, wait=0)
+
+    async def _drop(self, lease):
+        if self._held.get(lease.name) is not lease:
+            return
+        del self._held[lease.name]
+        await self.db.leases.update_one(
+            {'_id': lease.name, 'owner': self.owner, 'token': lease.token},
+            {'$set': {'owner': None, 'expires_at': datetime.now(timezone.utc)}}
+        )
+
+    async def verify(self, lease):
+        if lease.token is None:
+            return
+        doc = await self.db.leases.find_one({'_id': lease.name}, {'owner': 1, 'token': 1, 'expires_at': 1})
+        expires_at = _utc((doc or {}).get('expires_at'))
+        if (not doc or doc.get('owner') != self.owner or doc.get('token') != lease.token
+                or expires_at <= datetime.now(timezone.utc)):
+            self._forget(lease)
+            raise LeaseLostError(lease.name, lease.token)
+
+    async def fence(self, name):
+        """Fencing check for `name` by whoever in this worker is using it."""
+        if not self.enabled:
+            return
+        lease = self._held.get(name)
+        if lease is None:
+            raise LeaseLostError(name, None)
+        await self.verify(lease)
+
+    def _forget(self, lease):
+        if self._held.get(lease.name) is lease:
+            del self._held[lease.name]
+            self.lost += 1
+            logger.warning(f"Lease {lease.name} (token {lease.token}) lost by {self.owner}")
+
+    async def renew(self):
+        """Extend every held lease; yield idle ones someone else is waiting for."""
+        now = datetime.now(timezone.utc)
+        for lease in list(self._held.values()):
+            doc = await self.db.leases.find_one_and_update(
+                {'_id': lease.name, 'owner': self.owner, 'token': lease.token},
+                {'$set': {'expires_at': now + timedelta(seconds=self.ttl)}},
+                return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                self._forget(lease)
+                continue
+            if lease.holders == 0 and (doc.get('wanted_by') or not self.keep(lease.name)):
+                if self.on_yield is not None:
+                    await self.on_yield(lease.name)
+                await self._drop(lease)
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.renew()
+            except Exception as e:
+                logger.error(f"Lease renewal error: {e}")
+
+    def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lease in list(self._held.values()):
+            await self._drop(lease)
+
+    def snapshot(self):
+        return {
+            'enabled': self.enabled,
+            'owner': self.owner,
+            'ttl_seconds': self.ttl,
+            'held': [
+                {'name': l.name, 'token': l.token, 'holders': l.holders}
+                for l in self._held.values()
+            ],
+            'acquired': self.acquired,
+            'lost': self.lost,
+        }
@@ -0,0 +1,115 @@
+"""
+OLT Session Pool Module
+Keeps logged-in telnet sessions (at the config prompt) for reuse so repeated
+operations on the same OLT skip the login/enable/config round-trips.
+"""
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """Idle-session pool keyed by OLT id.
+
+    `teardown(conn)` disposes of a session the pool gives up (expired, dead
+    or drained at shutdown); it runs on the event loop and must not block.
+    """
+
+    def __init__(self, max_idle_per_olt=1, idle_timeout=60.0):
+        self.max_idle_per_olt = max_idle_per_olt
+        self.idle_timeout = idle_timeout
+        self.teardown = None
+        self._idle = {}
+        self._task = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.idle_timeout > 0 and self.max_idle_per_olt > 0
+
+    def checkout(self, key):
+        """Return a live idle session for key, or None."""
+        idle = self._idle.get(key, [])
+        now = time.monotonic()
+        while idle:
+            conn, since = idle.pop()
+            if now - since <= self.idle_timeout and conn.is_alive():
+                self.hits += 1
+                return conn
+            self._discard(conn)
+        self.misses += 1
+        return None
+
+    def checkin(self, key, conn):
+        """Offer a clean session back. Returns False if the caller must close it."""
+        if not self.enabled:
+            return False
+        idle = self._idle.setdefault(key, [])
+        if len(idle) >= self.max_idle_per_olt:
+            return False
+        idle.append((conn, time.monotonic()))
+        return True
+
+    def _discard(self, conn):
+        try:
+            if self.teardown is not None:
+                self.teardown(conn)
+            else:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Error closing idle session: {e}")
+
+    def evict_expired(self):
+        """Pop idle sessions past the idle timeout; returns them for teardown."""
+        now = time.monotonic()
+        expired = []
+        for key, idle in self._idle.items():
+            keep = []
+            for conn, since in idle:
+                (expired if now - since > self.idle_timeout else keep).append((conn, since))
+            self._idle[key] = keep
+        return [conn for conn, _ in expired]
+
+    def drain(self, key=None):
+        """Remove idle sessions (for one OLT or all) and return them."""
+        keys = [key] if key is not None else list(self._idle)
+        drained = []
+        for k in keys:
+            drained.extend(conn for conn, _ in self._idle.pop(k, []))
+        return drained
+
+    async def run_reaper(self):
+        interval = max(5.0, self.idle_timeout / 2)
+        while True:
+            await asyncio.sleep(interval)
+            for conn in self.evict_expired():
+                self._discard(conn)
+
+    def start(self, teardown):
+        self.teardown = teardown
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self.run_reaper())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for conn in self.drain():
+            self._discard(conn)
+
+    def snapshot(self):
+        return {
+            'enabled': self.enabled,
+            'idle_timeout_seconds': self.idle_timeout,
+            'max_idle_per_olt': self.max_idle_per_olt,
+            'idle_sessions': {k: len(v) for k, v in self._idle.items() if v},
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -10,43 +10,127 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+class OLTConnectionError(Exception):
+    """Raised when a session to the OLT cannot be established."""
+
+
+# Error lines the MA5600 CLI prints instead of executing a command
+CLI_ERROR_PATTERNS = [
+    re.compile(r'%\s*(Unknown command|Parameter error|Incomplete command|Too many parameters|Ambiguous command)[^\r\n]*', re.IGNORECASE),
+    re.compile(r'Failure:[^\r\n]*'),
+    re.compile(r'Error:[^\r\n]*'),
+]
+
+# Session parked at the global config prompt, the state pooled sessions must be in
+CONFIG_PROMPT = re.compile(rb"[\w.\-]+\(config\)#\s*$")
+
+
+def command_error(output):
+    """Return the CLI error line in a command's output, or None."""
+    for pattern in CLI_ERROR_PATTERNS:
+        match = pattern.search(output or '')
+        if match:
+            return match.group(0).strip()
+    return None
+
+
+def command_verb(command):
+    """Reduce a CLI command to its type, e.g. 'ont add 0 2 sn-auth ...' -> 'ont add'."""
+    verb = []
+    for token in command.split():
+        if any(c.isdigit() for c in token) or '"' in token or token == 'all':
+            break
+        verb.append(token)
+        if len(verb) == 3:
+            break
+    return ' '.join(verb) or command.strip()
+
+
 class HuaweiOLTConnection:
     """Manages telnet connection to Huawei MA5600 OLT."""
     
-    def __init__(self, host, port=23, username='', password='', timeout=15):
+    def __init__(self, host, port=23, username='', password='', timeout=15, throttle=None, recorder=None,
+                 pipeline_window=1):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.timeout = timeout
+        self.throttle = throttle
+        self.recorder = recorder
+        self.pipeline_window = pipeline_window
+        self.telnet_factory = telnetlib.Telnet
+        self.sysname = None
         self.tn = None
+        self.command_errors = 0
+        # Whether the last prompt read back was the plain (config)# prompt
+        self.at_config = False
+        self.timeline = []
+        self._timeline_start = time.monotonic()
+    
+    def reset_timeline(self, reused=False):
+        """Start a fresh timeline (new session or pooled session reuse)."""
+        self.timeline = []
+        self._timeline_start = time.monotonic()
+        if reused:
+            self._record('pool_reuse', self._timeline_start)
+    
+    def _record(self, phase, started, **details):
+        """Append one timed phase/command to the timeline."""
+        now = time.monotonic()
+        event = {
+            'phase': phase,
+            'at_ms': round((started - self._timeline_start) * 1000, 1),
+            'duration_ms': round((now - started) * 1000, 1),
+        }
+        event.update(details)
+        self.timeline.append(event)
+        return event
     
     def connect(self):
         """Connect and authenticate to OLT. Returns (success, message)."""
+        self.reset_timeline()
         try:
             logger.info(f"Connecting to OLT {self.host}:{self.port}")
-            self.tn = telnetlib.Telnet(self.host, self.port, self.timeout)
+            started = time.monotonic()
+            tn = self.telnet_factory(self.host, self.port, self.timeout)
+            self.tn = self.recorder.wrap(tn) if self.recorder else tn
+            self._record('tcp_connect', started)
             
             # Wait for Username prompt
-            self.tn.read_until(b"name:", timeout=self.timeout)
+            started = time.monotonic()
+            text = self.tn.read_until(b"name:", timeout=self.timeout)
+            self._record('login_banner', started, bytes=len(text))
             self.tn.write(self.username.encode('ascii') + b"\n")
             
             # Wait for Password prompt
-            self.tn.read_until(b"assword:", timeout=self.timeout)
+            started = time.monotonic()
+            text = self.tn.read_until(b"assword:", timeout=self.timeout)
+            self._record('login_username', started, bytes=len(text))
             self.tn.write(self.password.encode('ascii') + b"\n")
             
             # Wait for prompt (>)
+            started = time.monotonic()
             idx, match, text = self.tn.expect([b">", b"failed", b"invalid"], timeout=self.timeout)
+            self._record('login_password', started, bytes=len(text), ok=idx == 0)
             if idx != 0:
                 return (False, "Login gagal: username/password salah")
             
             # Enter enable mode
+            started = time.monotonic()
             self.tn.write(b"enable\n")
-            self.tn.read_until(b"#", timeout=self.timeout)
+            text = self.tn.read_until(b"#", timeout=self.timeout)
+            self._record('enable', started, bytes=len(text))
             
             # Enter config mode
+            started = time.monotonic()
             self.tn.write(b"config\n")
-            self.tn.read_until(b"(config)#", timeout=self.timeout)
+            text = self.tn.read_until(b"(config)#", timeout=self.timeout)
+            self._record('config', started, bytes=len(text))
+            # The sysname lets pipelined output be split at exact prompts
+            match = re.search(rb"([\w.\-]+)\(config\)#", text)
+            self.sysname = match.group(1) if match else None
+            self.at_config = bool(CONFIG_PROMPT.search(text))
             
             logger.info(f"Successfully connected to OLT {self.host}")
             return (True, "Berhasil terkoneksi ke OLT")
@@ -65,48 +149,179 @@ class HuaweiOLTConnection:
         if not self.tn:
             raise Exception("Tidak terkoneksi ke OLT")
         
+        if self.throttle:
+            self.throttle.before_command()
+        
         logger.info(f"Sending command: {command}")
+        if self.recorder:
+            self.recorder.command(command)
+        command_started = time.monotonic()
         self.tn.write(command.encode('ascii') + b"\n")
         
         output = ""
+        received = 0
+        pages = 0
+        first_page_ms = None
+        ok = True
         while True:
             try:
+                started = time.monotonic()
                 idx, match, text = self.tn.expect(
                     [b"---- More", b"Press 'Q'", wait_for],
                     timeout=timeout
                 )
+                if self.throttle:
+                    # Each page/prompt wait is one OLT round-trip
+                    self.throttle.observe(time.monotonic() - started)
+                if first_page_ms is None:
+                    first_page_ms = round((time.monotonic() - command_started) * 1000, 1)
+                received += len(text)
                 decoded = text.decode('ascii', errors='ignore')
                 output += decoded
                 
-                if idx in (0, 1):
+                if idx == -1:
+                    # Neither pager nor prompt arrived in time
+                    self.command_errors += 1
+                    ok = False
+                    logger.warning(f"Timeout waiting for prompt after: {command}")
+                    break
+                elif idx in (0, 1):
                     # Pagination - send space to continue
+                    pages += 1
                     self.tn.write(b" ")
-                    time.sleep(0.3)
+                    time.sleep(self.throttle.page_delay() if self.throttle else 0.3)
                 else:
                     # Got prompt, done
                     break
             except EOFError:
+                self.command_errors += 1
+                ok = False
                 break
             except Exception as e:
+                self.command_errors += 1
+                ok = False
                 logger.error(f"Error reading command output: {e}")
                 break
         
+        self.at_config = ok and bool(CONFIG_PROMPT.search(text))
+        self._record(
+            'command', command_started,
+            command=command, verb=command_verb(command),
+            bytes=received, pages=pages, first_page_ms=first_page_ms, ok=ok,
+            error=command_error(output)
+        )
         return output
     
-    def disconnect(self):
-        """Close the connection."""
+    def send_commands(self, commands, timeout=30, window=None):
+        """Send a burst of independent commands; returns one output per command sent.
+        
+        With a window above 1, up to `window` commands are written at once and
+        the echoed stream is split back into outputs at each prompt. A pager
+        or a timeout desynchronizes the stream, so the burst stops there:
+        commands written but not read back get None (the OLT may still run
+        them), commands never written are left off the end, and the socket is
+        dropped so the session cannot be reused.
+        """
+        window = window or self.pipeline_window
+        outputs = []
+        if window <= 1 or len(commands) <= 1:
+            for command in commands:
+                errors = self.command_errors
+                output = self.send_command(command, timeout=timeout)
+                if self.command_errors > errors:
+                    self._lose_sync(command)
+                    return outputs + [None]
+                outputs.append(output)
+            return outputs
+        if not self.tn:
+            raise Exception("Tidak terkoneksi ke OLT")
+        
+        sysname = re.escape(self.sysname) if self.sysname else rb"[\w.\-]+"
+        prompt = re.compile(sysname + rb"(\([^)\r\n]*\))?[#>]")
+        for start in range(0, len(commands), window):
+            chunk = commands[start:start + window]
+            if self.throttle:
+                self.throttle.before_command()
+            logger.info(f"Sending {len(chunk)} pipelined commands")
+            if self.recorder:
+                self.recorder.commands(chunk)
+            self.tn.write(''.join(command + '\n' for command in chunk).encode('ascii'))
+            
+            for offset, command in enumerate(chunk):
+                started = time.monotonic()
+                try:
+                    idx, match, text = self.tn.expect([b"---- More", b"Press 'Q'", prompt], timeout=timeout)
+                except (EOFError, OSError) as e:
+                    logger.error(f"Error reading pipelined output: {e}")
+                    idx, text = -1, b""
+                if self.throttle and idx == 2:
+                    self.throttle.observe(time.monotonic() - started)
+                output = text.decode('ascii', errors='ignore')
+                ok = idx == 2
+                self._record(
+                    'command', started,
+                    command=command, verb=command_verb(command),
+                    bytes=len(text), pages=0, first_page_ms=None, ok=ok,
+                    pipelined=len(chunk), error=command_error(output)
+                )
+                self.at_config = ok and bool(CONFIG_PROMPT.search(text))
+                if not ok:
+                    self.command_errors += 1
+                    self._lose_sync(command)
+                    # This command and the rest of its window went out unread
+                    return outputs + [None] * (len(chunk) - offset)
+                outputs.append(output)
+        return outputs
+    
+    def _lose_sync(self, command):
+        """Replies no longer line up with commands: drop the socket."""
+        logger.warning(f"Command stream lost sync after: {command}")
+        self.close()
+    
+    def at_config_prompt(self):
+        """True when the session is open and was last seen at the (config)# prompt."""
+        return self.tn is not None and self.at_config
+    
+    def is_alive(self):
+        """Non-blocking check that the session has not been closed by the OLT."""
+        if not self.tn:
+            return False
+        try:
+            # Drains stray output; raises EOFError once the socket is closed
+            self.tn.read_very_eager()
+            return True
+        except (EOFError, OSError):
+            return False
+    
+    def close(self):
+        """Drop the socket without logging out."""
         if self.tn:
             try:
-                self.tn.write(b"quit\n")
-                time.sleep(0.2)
-                self.tn.write(b"quit\n")
-                time.sleep(0.2)
-                self.tn.write(b"quit\n")
-                time.sleep(0.2)
                 self.tn.close()
             except:
                 pass
             self.tn = None
+        if self.recorder:
+            self.recorder.close()
+    
+    def disconnect(self, confirm_timeout=0):
+        """Log out and close the connection.
+        
+        The quits go out in one write and the socket is closed right away;
+        the OLT frees the VTY when the TCP session ends. With confirm_timeout
+        set, the logout confirmation prompt is answered before closing.
+        """
+        if self.tn:
+            try:
+                # config -> enable -> user -> logout
+                self.tn.write(b"quit\nquit\nquit\n")
+                if confirm_timeout > 0:
+                    idx, match, text = self.tn.expect([rb"\(y/n\)"], timeout=confirm_timeout)
+                    if idx == 0:
+                        self.tn.write(b"y\n")
+            except:
+                pass
+        self.close()
 
 
 # ============================================================
@@ -178,12 +393,17 @@ def parse_autofind_output(raw_output):
     return results
 
 
+def _normalize_fsp_spacing(line):
+    """Join F/S/P columns the OLT pads with spaces ('0/ 1/7' -> '0/1/7')."""
+    return re.sub(r'(\d+)/\s+(\d+)/\s*(\d+)', r'\1/\2/\3', line)
+
+
 def parse_ont_info_output(raw_output):
     """Parse 'display ont info X all' to get list of existing ONT IDs."""
     ont_ids = []
     
     for line in raw_output.strip().split('\n'):
-        line = line.strip()
+        line = _normalize_fsp_spacing(line.strip())
         if not line or line.startswith('-') or line.startswith('F/S/P') or line.startswith('In port'):
             continue
         if 'ONT' in line and 'ID' in line and 'SN' in line:
@@ -197,6 +417,7 @@ def parse_ont_info_output(raw_output):
                     ont_id = int(parts[1])
                     sn = parts[2]
                     ont_ids.append({
+                        'fsp': fsp,
                         'ont_id': ont_id,
                         'sn': sn,
                         'control_flag': parts[3] if len(parts) > 3 else '',
@@ -229,6 +450,130 @@ def parse_service_port_output(raw_output):
     return sp_ids
 
 
+def parse_service_port_table(raw_output):
+    """Parse 'display service-port all' into full service-port records.
+    
+    Handles both the 'gpon 0/1 /7  <ont> <gemport>' layout printed by the OLT
+    and the compact 'gpon 0/1/7 /<ont>' layout.
+    """
+    records = []
+    
+    for line in raw_output.strip().split('\n'):
+        line = line.strip()
+        if not line or line.startswith('-') or line.startswith('INDEX') or line.startswith('VLAN'):
+            continue
+        
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        try:
+            sp_id = int(parts[0])
+            vlan = int(parts[1])
+        except ValueError:
+            continue
+        
+        record = {
+            'sp_id': sp_id,
+            'vlan': vlan,
+            'vlan_attr': parts[2],
+            'fsp': None,
+            'ont_id': None,
+            'gemport': None,
+        }
+        
+        if 'gpon' in parts:
+            rest = parts[parts.index('gpon') + 1:]
+            fsp = ''
+            while rest and fsp.count('/') < 2:
+                fsp += rest.pop(0)
+            record['fsp'] = fsp
+            if rest and rest[0].startswith('/') and rest[0][1:].isdigit():
+                record['ont_id'] = int(rest.pop(0)[1:])
+            numbers = [int(t) for t in rest if t.isdigit()]
+            if record['ont_id'] is None and numbers:
+                record['ont_id'] = numbers.pop(0)
+            if numbers:
+                record['gemport'] = numbers.pop(0)
+        
+        records.append(record)
+    
+    return records
+
+
+# (pattern, outcome code) checked in order against 'ont add' / 'service-port' output
+ONT_ADD_FAILURES = [
+    (re.compile(r'SN already exist', re.IGNORECASE), 'duplicate_sn'),
+    (re.compile(r'ONT ID (has )?already exist|ONT is already exist', re.IGNORECASE), 'ont_id_taken'),
+    (re.compile(r'(line|srv|service)[\s-]*profile.*(does not exist|not exist)', re.IGNORECASE), 'profile_missing'),
+    (re.compile(r'(number of ONTs?|ONT number).*(upper limit|exceed|full)|port is full', re.IGNORECASE), 'port_full'),
+]
+SERVICE_PORT_FAILURES = [
+    (re.compile(r'(service virtual port|index).*(has existed|already exist)', re.IGNORECASE), 'service_port_exists'),
+    (re.compile(r'VLAN.*(does not exist|not exist)', re.IGNORECASE), 'vlan_missing'),
+    (re.compile(r'GEM ?port.*(does not exist|not exist)', re.IGNORECASE), 'gemport_missing'),
+    (re.compile(r'ONT.*(does not exist|not exist)', re.IGNORECASE), 'ont_missing'),
+]
+
+# Outcomes that leave open whether the OLT ran the command
+INDETERMINATE_OUTCOMES = ('no_response', 'unknown')
+
+ONT_ADD_SUCCESS = re.compile(r'success:\s*(\d+)', re.IGNORECASE)
+ONT_ID_ASSIGNED = re.compile(r'ONTID\s*:\s*(\d+)', re.IGNORECASE)
+
+
+def _outcome(code, message=None, **details):
+    return {'code': code, 'ok': code == 'success', 'message': message, **details}
+
+
+def _classify_failure(output, failures):
+    if output is None:
+        return not_read()
+    if not output:
+        return _outcome('no_response', 'Tidak ada respons dari OLT')
+    error = command_error(output)
+    if error:
+        for pattern, code in failures:
+            if pattern.search(error):
+                return _outcome(code, error)
+        return _outcome('cli_error', error)
+    return None
+
+
+def not_executed(outcome):
+    """True when the OLT certainly did not run the command, so its IDs are free again."""
+    return not outcome['ok'] and outcome['code'] not in INDETERMINATE_OUTCOMES
+
+
+def not_sent(message):
+    """Outcome of a command that was never written to the OLT."""
+    return _outcome('not_sent', message)
+
+
+def not_read(message='Perintah terkirim tetapi respons OLT tidak terbaca, periksa di OLT'):
+    """Outcome of a command that may have reached the OLT but whose reply was never read."""
+    return _outcome('unknown', message)
+
+
+def classify_ont_add(output):
+    """Turn 'ont add' output into a typed outcome; success carries the assigned ONT ID.
+    
+    None stands for a command that was written but never read back.
+    """
+    failure = _classify_failure(output, ONT_ADD_FAILURES)
+    if failure:
+        return failure
+    added = ONT_ADD_SUCCESS.search(output)
+    if added and int(added.group(1)) == 0:
+        return _outcome('failed', 'OLT melaporkan success: 0')
+    assigned = ONT_ID_ASSIGNED.search(output)
+    return _outcome('success', ont_id=int(assigned.group(1)) if assigned else None)
+
+
+def classify_service_port(output):
+    """Turn 'service-port' output into a typed outcome (silent output means success)."""
+    return _classify_failure(output, SERVICE_PORT_FAILURES) or _outcome('success')
+
+
 def find_next_available_ont_id(existing_onts, max_id=127):
     """Find the next available ONT ID (0-127)."""
     used_ids = set(ont['ont_id'] for ont in existing_onts)
@@ -247,6 +592,22 @@ def find_next_available_service_port(existing_sp_ids, max_id=4095):
     return None
 
 
+def find_free_service_port_block(existing_sp_ids, count, max_id=4095):
+    """Find the first run of `count` consecutive free service-port IDs; returns its start."""
+    used_ids = set(existing_sp_ids)
+    run_start, run_length = None, 0
+    for i in range(1, max_id + 1):
+        if i in used_ids:
+            run_length = 0
+            continue
+        if run_length == 0:
+            run_start = i
+        run_length += 1
+        if run_length >= count:
+            return run_start
+    return None
+
+
 def generate_ont_add_command(ont_id, sn, line_profile_id, srv_profile_id, description=""):
     """Generate the ont add CLI command."""
     desc_part = f' desc "{description}"' if description else ''
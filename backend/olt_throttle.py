@@ -0,0 +1,139 @@
+"""
+OLT Throttle Module
+Adaptive per-OLT rate control: measures CLI round-trip latency and backs off
+session concurrency and command pacing when an OLT's control board slows down.
+"""
+import asyncio
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRateController:
+    """AIMD controller for one OLT.
+
+    Latency above `high_latency` halves the session limit and doubles the
+    pacing delay; latency below `target_latency` first sheds pacing, then
+    adds sessions back one at a time.
+    """
+
+    def __init__(self, key, max_sessions=2, target_latency=1.0, high_latency=2.0,
+                 max_pacing=2.0, cooldown=2.0, alpha=0.2):
+        self.key = key
+        self.max_sessions = max_sessions
+        self.target_latency = target_latency
+        self.high_latency = high_latency
+        self.max_pacing = max_pacing
+        self.cooldown = cooldown
+        self.alpha = alpha
+
+        self.limit = max_sessions
+        self.pacing = 0.0
+        self.ewma = None
+        self.samples = 0
+        self.backoffs = 0
+        self.state = 'normal'
+        self.in_flight = 0
+        self.waiting = 0
+        self._last_adjust = 0.0
+        self._lock = threading.Lock()
+        self._cond = None
+
+    # ---- session concurrency (event loop side) ----
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            self.waiting += 1
+            try:
+                await cond.wait_for(lambda: self.in_flight < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    # ---- command pacing (telnet thread side) ----
+
+    def before_command(self):
+        """Sleep for the current pacing delay before writing a command."""
+        delay = self.pacing
+        if delay > 0:
+            time.sleep(delay)
+
+    def page_delay(self):
+        return self.pacing
+
+    def observe(self, latency):
+        """Feed one OLT round-trip latency sample (seconds)."""
+        with self._lock:
+            self.samples += 1
+            self.ewma = latency if self.ewma is None else (
+                self.alpha * latency + (1 - self.alpha) * self.ewma
+            )
+            now = time.monotonic()
+            if now - self._last_adjust < self.cooldown:
+                return
+
+            if self.ewma > self.high_latency:
+                self.limit = max(1, self.limit // 2)
+                self.pacing = min(self.max_pacing, max(self.pacing * 2, 0.1))
+                self.state = 'backoff'
+                self.backoffs += 1
+                self._last_adjust = now
+                logger.warning(
+                    f"OLT {self.key} slow ({self.ewma:.2f}s): limit={self.limit} pacing={self.pacing:.2f}s"
+                )
+            elif self.ewma < self.target_latency and self.state != 'normal':
+                if self.pacing > 0:
+                    self.pacing = self.pacing / 2 if self.pacing > 0.05 else 0.0
+                elif self.limit < self.max_sessions:
+                    self.limit += 1
+                if self.pacing == 0 and self.limit >= self.max_sessions:
+                    self.state = 'normal'
+                    logger.info(f"OLT {self.key} recovered")
+                else:
+                    self.state = 'recovering'
+                self._last_adjust = now
+
+    def snapshot(self):
+        return {
+            'key': self.key,
+            'state': self.state,
+            'limit': self.limit,
+            'max_sessions': self.max_sessions,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'pacing_seconds': round(self.pacing, 3),
+            'latency_ewma_seconds': round(self.ewma, 3) if self.ewma is not None else None,
+            'target_latency_seconds': self.target_latency,
+            'samples': self.samples,
+            'backoffs': self.backoffs,
+        }
+
+
+class ThrottleRegistry:
+    """Hands out one AdaptiveRateController per OLT."""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._controllers = {}
+
+    def get(self, key):
+        if key not in self._controllers:
+            self._controllers[key] = AdaptiveRateController(key, **self.defaults)
+        return self._controllers[key]
+
+    def snapshot(self):
+        return [c.snapshot() for c in self._controllers.values()]
@@ -0,0 +1,83 @@
+"""
+OLT Timing Module
+Aggregates per-session telnet timelines (login phases and commands) into
+running totals per OLT and command type, so slow steps stand out fleet-wide.
+"""
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Timeline phases making up a fresh login, in order
+LOGIN_PHASES = ('tcp_connect', 'login_banner', 'login_username', 'login_password', 'enable', 'config')
+
+
+def timeline_groups(timeline):
+    """Fold timeline events into {verb_or_phase: totals}."""
+    groups = {}
+    for event in timeline:
+        key = event.get('verb') or event['phase']
+        group = groups.setdefault(key, {
+            'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'bytes': 0, 'pages': 0,
+        })
+        group['count'] += 1
+        group['errors'] += 0 if event.get('ok', True) else 1
+        group['total_ms'] += event['duration_ms']
+        group['max_ms'] = max(group['max_ms'], event['duration_ms'])
+        group['bytes'] += event.get('bytes', 0)
+        group['pages'] += event.get('pages', 0)
+    return groups
+
+
+class TimingStats:
+    """Running telnet timing totals in `telnet_timing_stats`, one doc per (OLT, verb)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.telnet_timing_stats.create_index(
+            [('olt_id', ASCENDING), ('verb', ASCENDING)], unique=True
+        )
+
+    async def record(self, olt_id, olt_name, timeline):
+        """Add one session's timeline to the running totals."""
+        if not timeline:
+            return
+        now = datetime.now(timezone.utc)
+        ops = []
+        for verb, group in timeline_groups(timeline).items():
+            ops.append(UpdateOne(
+                {'olt_id': olt_id, 'verb': verb},
+                {
+                    '$inc': {
+                        'count': group['count'],
+                        'errors': group['errors'],
+                        'total_ms': group['total_ms'],
+                        'bytes': group['bytes'],
+                        'pages': group['pages'],
+                    },
+                    '$max': {'max_ms': group['max_ms']},
+                    '$set': {'olt_name': olt_name, 'updated_at': now},
+                },
+                upsert=True
+            ))
+        try:
+            await self.db.telnet_timing_stats.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to record telnet timings for {olt_id}: {e}")
+
+    async def summary(self, olt_id=None, verb=None):
+        """Totals with mean latency, slowest command types first."""
+        query = {}
+        if olt_id:
+            query['olt_id'] = olt_id
+        if verb:
+            query['verb'] = verb
+        rows = await self.db.telnet_timing_stats.find(query).to_list(None)
+        for row in rows:
+            row['mean_ms'] = round(row['total_ms'] / row['count'], 1) if row.get('count') else None
+        rows.sort(key=lambda r: r['mean_ms'] or 0, reverse=True)
+        return rows
@@ -0,0 +1,271 @@
+"""
+OLT Transcript Module
+Records telnet sessions (bytes each way, timings, commands) to gzipped NDJSON
+files and replays them through HuaweiOLTConnection for parser regression
+checks and profiling without a live OLT.
+
+Replay a recording:
+    python olt_transcript.py <file.jsonl.gz> [--realtime] [--speed 2]
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+MASK = '********'
+
+
+def _text(data):
+    # latin-1 maps every byte to one code point, so recordings are lossless
+    return data.decode('latin-1')
+
+
+def _bytes(text):
+    return text.encode('latin-1')
+
+
+class SessionRecorder:
+    """Appends the events of one telnet session to a gzipped NDJSON file."""
+
+    def __init__(self, path, meta=None, secrets=()):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.secrets = [s for s in secrets if s]
+        self.started = time.monotonic()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._write({
+            'type': 'meta',
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            **(meta or {}),
+        })
+
+    @classmethod
+    def for_olt(cls, directory, olt, secrets=()):
+        """New recording under <directory>/<olt_id>/<timestamp>-<id>.jsonl.gz."""
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(directory, str(olt['_id']), f"{stamp}-{uuid.uuid4().hex[:8]}.jsonl.gz")
+        meta = {
+            'olt_id': str(olt['_id']),
+            'olt_name': olt.get('name'),
+            'host': olt.get('ip_address'),
+            'username': olt.get('username'),
+        }
+        return cls(path, meta, secrets)
+
+    def wrap(self, tn):
+        return RecordingTelnet(tn, self)
+
+    def _write(self, event):
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(event) + '\n')
+        except Exception as e:
+            logger.error(f"Transcript write failed ({self.path}): {e}")
+
+    def _offset(self):
+        return round(time.monotonic() - self.started, 4)
+
+    def sent(self, data):
+        text = _text(data)
+        # Only a write that is exactly a secret (the password line) is masked
+        if text.rstrip('\r\n') in self.secrets:
+            text = MASK + text[len(text.rstrip('\r\n')):]
+        self._write({'type': 'send', 't': self._offset(), 'data': text})
+
+    def received(self, call, data, wait, idx=None):
+        event = {'type': 'recv', 'call': call, 't': self._offset(), 'wait': round(wait, 4), 'data': _text(data)}
+        if idx is not None:
+            event['idx'] = idx
+        self._write(event)
+
+    def command(self, command):
+        self._write({'type': 'command', 't': self._offset(), 'command': command})
+
+    def commands(self, commands):
+        """A pipelined window, written to the OLT in one go."""
+        self._write({'type': 'commands', 't': self._offset(), 'commands': list(commands)})
+
+    def close(self):
+        if self._file is not None:
+            self._write({'type': 'close', 't': self._offset()})
+            self._file.close()
+            self._file = None
+
+
+class RecordingTelnet:
+    """Wraps a telnetlib.Telnet and mirrors every read/write into a recorder."""
+
+    def __init__(self, tn, recorder):
+        self.tn = tn
+        self.recorder = recorder
+
+    def write(self, data):
+        self.recorder.sent(data)
+        self.tn.write(data)
+
+    def read_until(self, match, timeout=None):
+        started = time.monotonic()
+        data = self.tn.read_until(match, timeout)
+        self.recorder.received('read_until', data, time.monotonic() - started)
+        return data
+
+    def expect(self, patterns, timeout=None):
+        started = time.monotonic()
+        idx, m, data = self.tn.expect(patterns, timeout)
+        self.recorder.received('expect', data, time.monotonic() - started, idx=idx)
+        return idx, m, data
+
+    def read_very_eager(self):
+        data = self.tn.read_very_eager()
+        if data:
+            self.recorder.received('eager', data, 0.0)
+        return data
+
+    def close(self):
+        try:
+            self.tn.close()
+        finally:
+            self.recorder.close()
+
+
+def load_transcript(path):
+    """Read a recording: (meta, events)."""
+    meta, events = {}, []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            event = json.loads(line)
+            if event['type'] == 'meta':
+                meta = event
+            else:
+                events.append(event)
+    return meta, events
+
+
+class ReplayTelnet:
+    """Stand-in for telnetlib.Telnet that serves recorded output in order.
+
+    `speed=None` replays as fast as possible; otherwise each read waits the
+    recorded OLT latency divided by `speed`. Writes that differ from the
+    recording (masked secrets aside) are collected in `mismatches`.
+    """
+
+    def __init__(self, events, speed=None):
+        self.sends = [e for e in events if e['type'] == 'send']
+        self.recvs = [e for e in events if e['type'] == 'recv']
+        self.speed = speed
+        self.mismatches = []
+        self.closed = False
+
+    def write(self, data):
+        if not self.sends:
+            self.mismatches.append({'expected': None, 'sent': _text(data)})
+            return
+        expected = self.sends.pop(0)['data']
+        if MASK not in expected and expected != _text(data):
+            self.mismatches.append({'expected': expected, 'sent': _text(data)})
+
+    def _next(self):
+        # Stray output drained by liveness checks is not part of any reply
+        while self.recvs and self.recvs[0]['call'] == 'eager':
+            self.recvs.pop(0)
+        if not self.recvs:
+            raise EOFError('transcript exhausted')
+        event = self.recvs.pop(0)
+        if self.speed:
+            time.sleep(event['wait'] / self.speed)
+        return event
+
+    def read_until(self, match, timeout=None):
+        return _bytes(self._next()['data'])
+
+    def expect(self, patterns, timeout=None):
+        event = self._next()
+        data = _bytes(event['data'])
+        idx = event.get('idx', -1)
+        m = re.search(patterns[idx], data) if 0 <= idx < len(patterns) else None
+        return idx, m, data
+
+    def read_very_eager(self):
+        if self.closed:
+            raise EOFError('telnet connection closed')
+        if self.recvs and self.recvs[0]['call'] == 'eager':
+            return _bytes(self.recvs.pop(0)['data'])
+        return b''
+
+    def close(self):
+        self.closed = True
+
+
+def replay_transcript(path, speed=None):
+    """Re-run a recorded session through HuaweiOLTConnection.
+
+    Returns the per-command outputs and timeline together with any writes
+    that diverged from the recording.
+    """
+    from olt_telnet import HuaweiOLTConnection
+
+    meta, events = load_transcript(path)
+    steps = [e for e in events if e['type'] in ('command', 'commands')]
+    replay = ReplayTelnet(events, speed=speed)
+
+    conn = HuaweiOLTConnection(
+        host=meta.get('host') or 'replay', username=meta.get('username') or '', password=MASK
+    )
+    conn.telnet_factory = lambda host, port, timeout: replay
+    started = time.monotonic()
+    success, message = conn.connect()
+    results = []
+    if success:
+        for step in steps:
+            if step['type'] == 'command':
+                results.append({'command': step['command'], 'output': conn.send_command(step['command'])})
+                continue
+            # Replay pipelined windows as written so reads and writes stay aligned
+            outputs = conn.send_commands(step['commands'], window=len(step['commands']))
+            results.extend({'command': c, 'output': o} for c, o in zip(step['commands'], outputs))
+    duration = time.monotonic() - started
+    conn.close()
+    return {
+        'meta': meta,
+        'connected': success,
+        'message': message,
+        'results': results,
+        'timeline': conn.timeline,
+        'duration_seconds': round(duration, 4),
+        'mismatches': replay.mismatches,
+    }
+
+
+def main():
+    from olt_telnet import parse_autofind_output, parse_ont_info_output, parse_service_port_output
+
+    parser = argparse.ArgumentParser(description='Replay a recorded OLT telnet session')
+    parser.add_argument('path')
+    parser.add_argument('--realtime', action='store_true', help='wait the recorded OLT latency')
+    parser.add_argument('--speed', type=float, default=1.0, help='real-time speed factor')
+    args = parser.parse_args()
+
+    report = replay_transcript(args.path, speed=args.speed if args.realtime else None)
+    print(f"{report['meta'].get('olt_name')} ({report['meta'].get('recorded_at')}): {report['message']}")
+    parsers = {
+        'display ont autofind': parse_autofind_output,
+        'display ont info': parse_ont_info_output,
+        'display service-port': parse_service_port_output,
+    }
+    for event, result in zip([e for e in report['timeline'] if e['phase'] == 'command'], report['results']):
+        parse = parsers.get(event['verb'])
+        parsed = f" parsed={len(parse(result['output']))}" if parse else ''
+        print(f"{event['duration_ms']:>9.1f} ms  {event['bytes']:>7} B  {event['pages']:>3} pg  {event['command']}{parsed}")
+    print(f"total {report['duration_seconds']}s, {len(report['mismatches'])} mismatched writes")
+
+
+if __name__ == '__main__':
+    main()
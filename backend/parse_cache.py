@@ -0,0 +1,78 @@
+"""
+Parse Cache Module
+Bounded LRU of parsed CLI output keyed by a hash of the raw text, so polling
+that returns the same autofind/service-port table skips the re-parse.
+"""
+import collections
+import hashlib
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+def output_digest(raw_output):
+    return hashlib.blake2b(raw_output.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def _freeze(records):
+    return tuple(MappingProxyType(dict(r)) if isinstance(r, Mapping) else r for r in records)
+
+
+def _thaw(records):
+    # Callers get their own list of dicts; the cached records stay read-only
+    return [dict(r) if isinstance(r, Mapping) else r for r in records]
+
+
+class ParseCache:
+    """LRU of parser results, one entry per (parser, output digest)."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def _count(self, name, field):
+        stats = self.stats.setdefault(name, {'hits': 0, 'misses': 0, 'evictions': 0})
+        stats[field] += 1
+
+    def get(self, func, raw_output):
+        """Cached result for this output, or None."""
+        if not self.enabled:
+            return None
+        key = (func.__name__, output_digest(raw_output))
+        with self._lock:
+            records = self._entries.get(key)
+            if records is None:
+                self._count(func.__name__, 'misses')
+                return None
+            self._entries.move_to_end(key)
+            self._count(func.__name__, 'hits')
+        return _thaw(records)
+
+    def put(self, func, raw_output, records):
+        if not self.enabled:
+            return
+        key = (func.__name__, output_digest(raw_output))
+        frozen = _freeze(records)
+        with self._lock:
+            self._entries[key] = frozen
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                (name, _), _ = self._entries.popitem(last=False)
+                self._count(name, 'evictions')
+
+    def snapshot(self):
+        with self._lock:
+            parsers = {}
+            for name, stats in self.stats.items():
+                lookups = stats['hits'] + stats['misses']
+                parsers[name] = {
+                    **stats,
+                    'hit_rate': round(stats['hits'] / lookups, 3) if lookups else None,
+                }
+            return {'maxsize': self.maxsize, 'entries': len(self._entries), 'parsers': parsers}
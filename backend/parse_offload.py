@@ -0,0 +1,85 @@
+"""
+Parse Offload Module
+Runs CLI output parsers off the event loop once the raw output is large
+enough to stall it, in a process pool (true CPU offload) or a dedicated
+thread that does not compete with telnet I/O for the default executor.
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class ParseOffloader:
+    """Inline parsing for small outputs, pooled parsing above `threshold` bytes."""
+
+    def __init__(self, threshold=65536, mode='process', workers=2, cache=None):
+        self.threshold = threshold
+        self.cache = cache
+        self.mode = mode
+        self.workers = workers
+        self._executor = None
+        self.inline = 0
+        self.offloaded = 0
+        self.fallbacks = 0
+        self.offload_seconds = 0.0
+
+    def _pool(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                # spawn: workers must not inherit the server's sockets and threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='parse')
+        return self._executor
+
+    async def parse(self, func, raw_output):
+        """Parse `raw_output` with `func` (a module-level parser)."""
+        if self.cache is not None:
+            cached = self.cache.get(func, raw_output)
+            if cached is not None:
+                return cached
+        result = await self._parse(func, raw_output)
+        if self.cache is not None:
+            self.cache.put(func, raw_output, result)
+        return result
+
+    async def _parse(self, func, raw_output):
+        if self.threshold <= 0 or len(raw_output) < self.threshold:
+            self.inline += 1
+            return func(raw_output)
+
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._pool(), func, raw_output)
+        except BrokenProcessPool as e:
+            logger.error(f"Parse pool broken, parsing {func.__name__} in a thread: {e}")
+            self._executor = None
+            self.fallbacks += 1
+            result = await asyncio.to_thread(func, raw_output)
+        self.offloaded += 1
+        self.offload_seconds += time.monotonic() - started
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def snapshot(self):
+        return {
+            'mode': self.mode,
+            'threshold_bytes': self.threshold,
+            'workers': self.workers,
+            'inline': self.inline,
+            'offloaded': self.offloaded,
+            'fallbacks': self.fallbacks,
+            'offload_seconds': round(self.offload_seconds, 3),
+        }
@@ -0,0 +1,308 @@
+"""
+Registration Planner Module
+Computes ONT IDs, service-port IDs and CLI commands for a registration batch
+from the cached inventory, so mistakes surface before any telnet session.
+"""
+import asyncio
+import re
+import logging
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from inventory import split_fsp
+from olt_telnet import (
+    parse_ont_info_output,
+    find_next_available_ont_id,
+    find_free_service_port_block,
+    generate_ont_add_command,
+    generate_service_port_command,
+)
+
+logger = logging.getLogger(__name__)
+
+FSP_PATTERN = re.compile(r'^\d+/\d+/\d+$')
+
+
+def profile_service_vlans(profile):
+    """VLANs that get a service-port for each ONT of this profile.
+    
+    Accepts lists and ranges such as '40', '100,200' or '100-101,300';
+    unparsable parts are skipped and duplicates dropped.
+    """
+    parts = [v.strip() for v in profile.get('business_vlans', '').split(',') if v.strip()]
+    vlans = []
+    for vlan_str in (parts if parts else ['40']):
+        try:
+            if '-' in vlan_str:
+                start, end = (int(v) for v in vlan_str.split('-', 1))
+                vlans.extend(range(min(start, end), max(start, end) + 1))
+            else:
+                vlans.append(int(vlan_str))
+        except ValueError:
+            continue
+    return list(dict.fromkeys(v for v in vlans if 1 <= v <= 4094))
+
+
+def allocate_service_port_block(used_sp, count):
+    """Consecutive free service-port IDs for one ONT's VLANs, or None if exhausted."""
+    if count == 0:
+        return []
+    start = find_free_service_port_block(used_sp, count)
+    return list(range(start, start + count)) if start is not None else None
+
+
+def new_entry(raw_entry):
+    """Normalize one `ont_entries` item into a registration entry.
+
+    A malformed F/S/P becomes an `invalid_fsp` conflict instead of
+    silently turning into port 0, on every registration path.
+    """
+    fsp = raw_entry.get('fsp', '0/0/0') or ''
+    frame, slot, port = split_fsp(fsp)
+    entry = {
+        'sn': raw_entry['sn'],
+        'fsp': fsp,
+        'description': raw_entry.get('description', ''),
+        'frame': frame,
+        'slot': slot,
+        'port': port,
+        'ont_id': None,
+        'service_port_id': None,
+        'service_ports': [],
+        'ont_command': None,
+        'conflicts': [],
+    }
+    if not FSP_PATTERN.match(str(fsp)):
+        entry['conflicts'].append(conflict('invalid_fsp', f"F/S/P tidak valid: {fsp}"))
+    return entry
+
+
+def assign_entry(entry, profile, ont_id, sp_ids, vlans):
+    """Fill in the assigned IDs and the commands the entry will send.
+    
+    The profile's user VLAN applies to single-VLAN profiles; with several
+    service VLANs each one keeps its own VLAN on the user side.
+    """
+    entry['ont_id'] = ont_id
+    entry['service_port_id'] = sp_ids[0] if sp_ids else None
+    entry['ont_command'] = generate_ont_add_command(
+        ont_id=ont_id,
+        sn=entry['sn'],
+        line_profile_id=profile['line_profile_id'],
+        srv_profile_id=profile['srv_profile_id'],
+        description=entry['description']
+    )
+    gemport = profile.get('gemport', 1)
+    entry['service_ports'] = []
+    for sp_id, vlan in zip(sp_ids, vlans):
+        user_vlan = (profile.get('user_vlan') if len(vlans) == 1 else None) or vlan
+        entry['service_ports'].append({
+            'sp_id': sp_id,
+            'vlan': vlan,
+            'user_vlan': user_vlan,
+            'gemport': gemport,
+            'command': generate_service_port_command(
+                sp_id=sp_id,
+                vlan=vlan,
+                frame=entry['frame'],
+                slot=entry['slot'],
+                port=entry['port'],
+                ont_id=ont_id,
+                gemport=gemport,
+                user_vlan=user_vlan
+            ),
+        })
+    return entry
+
+
+def conflict(code, message):
+    return {'code': code, 'message': message}
+
+
+def verify_plan_on_olt(conn, entries):
+    """Blocking: confirm planned ONT IDs/SNs are still free, one listing per port."""
+    by_port = {}
+    for entry in entries:
+        by_port.setdefault((entry['frame'], entry['slot'], entry['port']), []).append(entry)
+
+    mismatches = []
+    for (frame, slot, port), port_entries in sorted(by_port.items()):
+        conn.send_command(f"interface gpon {frame}/{slot}")
+        raw = conn.send_command(f"display ont info {port} all")
+        conn.send_command("quit")
+        existing = parse_ont_info_output(raw)
+        used_ids = {o['ont_id'] for o in existing}
+        used_sns = {o['sn'] for o in existing}
+        for entry in port_entries:
+            if entry['sn'] in used_sns:
+                mismatches.append({'sn': entry['sn'], 'fsp': entry['fsp'], **conflict(
+                    'already_registered', f"SN sudah terdaftar di {entry['fsp']}")})
+            elif entry['ont_id'] in used_ids:
+                mismatches.append({'sn': entry['sn'], 'fsp': entry['fsp'], **conflict(
+                    'ont_id_taken', f"ONT ID {entry['ont_id']} sudah dipakai di {entry['fsp']}")})
+    return mismatches
+
+
+class RegistrationPlanner:
+    """Builds registration plans and tracks the IDs they reserve."""
+
+    def __init__(self, db, inventory, ttl=900):
+        self.db = db
+        self.inventory = inventory
+        self.ttl = ttl
+        self._locks = {}
+
+    async def ensure_indexes(self):
+        await self.db.registration_plans.create_index('expires_at', expireAfterSeconds=0)
+        await self.db.registration_plans.create_index(
+            [('olt_id', ASCENDING), ('status', ASCENDING)]
+        )
+
+    def lock(self, olt_id):
+        """Per-OLT lock serializing ID allocation within this process
+        (the OLT lease serializes it across workers)."""
+        if olt_id not in self._locks:
+            self._locks[olt_id] = asyncio.Lock()
+        return self._locks[olt_id]
+
+    async def reserved_ids(self, olt_id, exclude_plan=None):
+        """IDs held by live plans: ({fsp: {ont_id}}, {sp_id}).
+
+        Executed and failed plans keep holding what was not released until
+        they expire, covering commands whose outcome could not be read
+        until the inventory has caught up with the OLT.
+        """
+        query = {
+            'olt_id': olt_id,
+            'status': {'$in': ['planned', 'executing', 'executed', 'failed']},
+            'expires_at': {'$gt': datetime.now(timezone.utc)},
+        }
+        if exclude_plan is not None:
+            query['_id'] = {'$ne': exclude_plan}
+        ont_ids, sp_ids = {}, set()
+        async for plan in self.db.registration_plans.find(query, {'reserved': 1}):
+            reserved = plan.get('reserved', {})
+            for item in reserved.get('ont_ids', []):
+                ont_ids.setdefault(item['fsp'], set()).add(item['ont_id'])
+            sp_ids.update(reserved.get('sp_ids', []))
+        return ont_ids, sp_ids
+
+    async def create_plan(self, olt, profile, ont_entries, username, lease=None):
+        """Compute every command and ID for a batch and store the plan.
+
+        `lease` is the caller's OLT lease; its fencing token is checked
+        before the reservation is written and kept on the plan.
+        """
+        olt_id = str(olt['_id'])
+        async with self.lock(olt_id):
+            version, synced_at = await self.inventory.get_version(olt_id)
+            plan_conflicts = []
+            if version is None:
+                plan_conflicts.append(conflict(
+                    'inventory_missing', 'Inventori OLT belum tersinkron, jalankan sync terlebih dahulu'))
+
+            used_onts = {}
+            async for p in self.db.port_inventory.find({'olt_id': olt_id}, {'fsp': 1, 'used_ont_ids': 1}):
+                used_onts[p['fsp']] = set(p.get('used_ont_ids', []))
+            used_sp = set(await self.db.service_port_inventory.distinct('sp_id', {'olt_id': olt_id}))
+            reserved_onts, reserved_sp = await self.reserved_ids(olt_id)
+            for fsp, ids in reserved_onts.items():
+                used_onts.setdefault(fsp, set()).update(ids)
+            used_sp |= reserved_sp
+
+            sns = [e.get('sn', '') for e in ont_entries]
+            registered = {}
+            async for doc in self.db.ont_inventory.find(
+                {'sn': {'$in': sns}}, {'sn': 1, 'olt_name': 1, 'fsp': 1, 'ont_id': 1}
+            ):
+                registered[doc['sn']] = doc
+
+            vlans = profile_service_vlans(profile)
+            seen_sns = set()
+            entries = []
+            reserved = {'ont_ids': [], 'sp_ids': []}
+            for raw_entry in ont_entries:
+                entry = new_entry(raw_entry)
+                sn = entry['sn']
+                if sn in seen_sns:
+                    entry['conflicts'].append(conflict('duplicate_sn', 'SN muncul lebih dari sekali dalam batch'))
+                seen_sns.add(sn)
+                if sn in registered:
+                    where = registered[sn]
+                    entry['conflicts'].append(conflict(
+                        'already_registered',
+                        f"SN sudah terdaftar di {where.get('olt_name')} {where['fsp']} ONT {where['ont_id']}"))
+
+                if not entry['conflicts'] and version is not None:
+                    port_used = used_onts.setdefault(entry['fsp'], set())
+                    ont_id = find_next_available_ont_id([{'ont_id': i} for i in port_used])
+                    sp_ids = allocate_service_port_block(used_sp, len(vlans))
+                    if ont_id is None:
+                        entry['conflicts'].append(conflict('port_full', 'Tidak ada ONT ID tersedia pada port ini'))
+                    elif sp_ids is None:
+                        entry['conflicts'].append(conflict('service_port_exhausted', 'Tidak ada service-port ID tersedia'))
+                    else:
+                        assign_entry(entry, profile, ont_id, sp_ids, vlans)
+                        port_used.add(ont_id)
+                        used_sp.update(sp_ids)
+                        reserved['ont_ids'].append({'fsp': entry['fsp'], 'ont_id': ont_id})
+                        reserved['sp_ids'].extend(sp_ids)
+                entries.append(entry)
+
+            now = datetime.now(timezone.utc)
+            plan = {
+                'olt_id': olt_id,
+                'olt_name': olt['name'],
+                'profile_id': str(profile['_id']),
+                'profile_name': profile['name'],
+                'inventory_version': version,
+                'inventory_synced_at': synced_at,
+                'entries': entries,
+                'conflicts': plan_conflicts,
+                'total': len(entries),
+                'executable': sum(1 for e in entries if not e['conflicts'] and e['ont_command']),
+                'reserved': reserved,
+                'status': 'planned',
+                'created_by': username,
+                'created_at': now,
+                'expires_at': now + timedelta(seconds=self.ttl),
+                'lease_token': lease.token if lease is not None else None,
+            }
+            if lease is not None:
+                await lease.verify()
+            result = await self.db.registration_plans.insert_one(plan)
+            plan['_id'] = result.inserted_id
+            return plan
+
+    def is_expired(self, plan):
+        expires_at = plan['expires_at']
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at <= datetime.now(timezone.utc)
+
+    async def get_plan(self, plan_id):
+        return await self.db.registration_plans.find_one({'_id': ObjectId(plan_id)})
+
+    async def release(self, plan_id, ont_ids=(), sp_ids=()):
+        """Drop reservations whose commands the OLT certainly did not run."""
+        pull = {}
+        if ont_ids:
+            pull['reserved.ont_ids'] = {'$in': list(ont_ids)}
+        if sp_ids:
+            pull['reserved.sp_ids'] = {'$in': list(sp_ids)}
+        if pull:
+            await self.db.registration_plans.update_one({'_id': ObjectId(plan_id)}, {'$pull': pull})
+
+    async def set_status(self, plan_id, status, expected, **fields):
+        """Move a plan from `expected` to `status`; stale plans free their reservations.
+
+        Returns the updated plan, or None when the plan is no longer in
+        `expected` (another request moved it first).
+        """
+        return await self.db.registration_plans.find_one_and_update(
+            {'_id': ObjectId(plan_id), 'status': expected},
+            {'$set': {'status': status, **fields}},
+            return_document=ReturnDocument.AFTER
+        )
@@ -0,0 +1,111 @@
+"""
+Read Cache Module
+Versioned in-process caches for rarely changing read models (OLT and profile
+lists). Writes bump a version counter kept in MongoDB, each worker polls the
+counters in the background, and responses carry an ETag derived from them so
+an unchanged list answers 304 without touching the database.
+"""
+import asyncio
+import logging
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header covers `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or any(t.removeprefix('W/') == etag.removeprefix('W/') for t in tags)
+
+
+class CacheVersions:
+    """Per-name version counters shared by every worker through `cache_versions`."""
+
+    def __init__(self, db, poll_interval=2.0, on_change=None):
+        self.db = db
+        self.poll_interval = poll_interval
+        # on_change(name, remote): a version moved, here (remote=False) or in another worker
+        self.on_change = on_change
+        self.versions = {}
+        self._refreshed = False
+        self._task = None
+
+    def get(self, name):
+        return self.versions.get(name, 0)
+
+    async def bump(self, name):
+        doc = await self.db.cache_versions.find_one_and_update(
+            {'_id': name}, {'$inc': {'version': 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self.versions[name] = max(self.get(name), doc['version'])
+        if self.on_change is not None:
+            self.on_change(name, False)
+
+    async def refresh(self):
+        async for doc in self.db.cache_versions.find():
+            previous = self.versions.get(doc['_id'])
+            self.versions[doc['_id']] = doc['version']
+            if self._refreshed and previous != doc['version'] and self.on_change is not None:
+                self.on_change(doc['_id'], True)
+        self._refreshed = True
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Cache version refresh error: {e}")
+
+    async def start(self):
+        await self.refresh()
+        if self._task is None and self.poll_interval > 0:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class ReadModelCache:
+    """One cached value, rebuilt by `build()` when any of `depends` changes version."""
+
+    def __init__(self, name, versions, build, depends=None):
+        self.name = name
+        self.versions = versions
+        self.build = build
+        self.depends = depends or [name]
+        self._key = None
+        self._value = None
+        self.hits = 0
+        self.builds = 0
+
+    def key(self):
+        return tuple(self.versions.get(n) for n in self.depends)
+
+    def etag(self):
+        return 'W/"' + self.name + '-' + '.'.join(str(v) for v in self.key()) + '"'
+
+    async def get(self):
+        key = self.key()
+        if self._key == key:
+            self.hits += 1
+            return self._value
+        value = await self.build()
+        self.builds += 1
+        # A write that landed mid-build leaves the key changed: do not pin it
+        if self.key() == key:
+            self._key, self._value = key, value
+        return value
+
+    def snapshot(self):
+        return {'etag': self.etag(), 'hits': self.hits, 'builds': self.builds}
@@ -0,0 +1,325 @@
+"""
+Retention Module
+Keeps the hot collections small: discovery snapshots expire through a TTL
+index and old registration logs move to gzipped, day-partitioned NDJSON
+archives that stay searchable through a slower file scan.
+"""
+import asyncio
+import contextlib
+import gzip
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from olt_lease import LeaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Relaxed extended JSON keeps ObjectId/datetime round-trippable
+ARCHIVE_JSON = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=True, tzinfo=timezone.utc)
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _truncate(path, size):
+    """Cut a partition back to `size` bytes, dropping a half-written append."""
+    if not os.path.exists(path):
+        return
+    if size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+    else:
+        os.remove(path)
+
+
+class RetentionManager:
+    """TTL indexes for snapshots, archiving for logs.
+
+    Each archive batch is written ahead to `archive_state` (log IDs and the
+    size of every partition before the append), so a run that died midway
+    is rolled back or finished by the next one instead of archiving and
+    counting the same logs twice. With `leases` only one worker archives.
+    """
+
+    JOB_LEASE = 'job:retention'
+
+    def __init__(self, db, archive_dir, discovery_ttl_days=30, log_retention_days=180,
+                 interval=21600, batch_size=1000, leases=None):
+        self.db = db
+        self.leases = leases
+        self.archive_dir = str(archive_dir)
+        self.discovery_ttl_days = discovery_ttl_days
+        self.log_retention_days = log_retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    async def ensure_indexes(self):
+        await self.db.registration_logs.create_index([('registered_at', DESCENDING)])
+        await self.db.discoveries.create_index([('olt_id', ASCENDING), ('scanned_at', DESCENDING)])
+        await self.db.archive_index.create_index(
+            [('collection', ASCENDING), ('day', ASCENDING)], unique=True
+        )
+        if self.discovery_ttl_days > 0:
+            await self._ensure_ttl(self.db.discoveries, 'scanned_at', self.discovery_ttl_days * 86400)
+        else:
+            # Retention turned off: a TTL index left by an earlier setting would keep deleting
+            await self._drop_ttl(self.db.discoveries, 'scanned_at')
+        # Logs only leave through the archive (never with LOG_RETENTION_DAYS=0)
+        await self._drop_ttl(self.db.registration_logs, 'registered_at')
+
+    async def _ensure_ttl(self, collection, field, seconds):
+        try:
+            await collection.create_index(field, expireAfterSeconds=seconds)
+        except OperationFailure:
+            # Existing index with another TTL: change it in place
+            await self.db.command(
+                'collMod', collection.name,
+                index={'keyPattern': {field: 1}, 'expireAfterSeconds': seconds}
+            )
+
+    async def _drop_ttl(self, collection, field):
+        for name, info in (await collection.index_information()).items():
+            if info.get('key') == [(field, 1)] and 'expireAfterSeconds' in info:
+                await collection.drop_index(name)
+                logger.info(f"Dropped TTL index {name} on {collection.name}")
+
+    def partition_path(self, collection, day):
+        return os.path.join(self.archive_dir, collection, day[:4], day[5:7], f"{day}.ndjson.gz")
+
+    def _append(self, path, docs):
+        # Each append is a new gzip member; readers see one continuous stream
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for doc in docs:
+                f.write(json_util.dumps(doc, json_options=ARCHIVE_JSON) + '\n')
+
+    def job_lease(self):
+        """Cross-worker lease held while archiving; raises LeaseUnavailableError if busy."""
+        if self.leases is None:
+            return contextlib.nullcontext()
+        return self.leases.job(self.JOB_LEASE)
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        """No logs move into archives (here or in another worker) while this is held."""
+        async with self._lock:
+            async with self.job_lease() as lease:
+                await self.recover()
+                yield lease
+
+    async def archive_logs(self):
+        """Move registration logs older than the retention window into archives."""
+        if self.log_retention_days <= 0:
+            return {'archived': 0}
+        try:
+            async with self.exclusive() as lease:
+                return await self._archive_logs(lease)
+        except LeaseUnavailableError as e:
+            logger.info(f"Log archiving skipped, running on {e.owner}")
+            return {'archived': 0, 'running_on': e.owner}
+
+    async def _archive_logs(self, lease):
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.log_retention_days)
+        archived = 0
+        while True:
+            batch = await self.db.registration_logs.find(
+                {'registered_at': {'$lt': cutoff}}
+            ).sort('registered_at', ASCENDING).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+
+            by_day = {}
+            for doc in batch:
+                day = _as_utc(doc['registered_at']).strftime('%Y-%m-%d')
+                by_day.setdefault(day, []).append(doc)
+
+            state = {
+                '_id': 'registration_logs',
+                'batch': uuid.uuid4().hex,
+                'ids': [d['_id'] for d in batch],
+                'days': [],
+                'appended': False,
+                'created_at': datetime.now(timezone.utc),
+            }
+            for day, docs in by_day.items():
+                path = self.partition_path('registration_logs', day)
+                success = sum(1 for d in docs if d.get('success'))
+                state['days'].append({
+                    'day': day, 'path': path, 'size': await asyncio.to_thread(_file_size, path),
+                    'count': len(docs), 'success': success, 'failed': len(docs) - success,
+                })
+            if lease is not None:
+                await lease.verify()
+            await self.db.archive_state.insert_one(state)
+
+            for day in state['days']:
+                await asyncio.to_thread(self._append, day['path'], by_day[day['day']])
+            await self.db.archive_state.update_one(
+                {'_id': state['_id'], 'batch': state['batch']}, {'$set': {'appended': True}}
+            )
+            await self._commit(state)
+            archived += len(batch)
+        if archived:
+            logger.info(f"Archived {archived} registration logs older than {cutoff.date()}")
+        return {'archived': archived, 'cutoff': cutoff}
+
+    async def _commit(self, state):
+        """Count an appended batch once per partition, then drop its logs (safe to repeat)."""
+        for day in state['days']:
+            try:
+                await self.db.archive_index.update_one(
+                    {'collection': 'registration_logs', 'day': day['day'], 'last_batch': {'$ne': state['batch']}},
+                    {
+                        '$inc': {'count': day['count'], 'success': day['success'], 'failed': day['failed']},
+                        '$set': {'path': day['path'], 'last_batch': state['batch'],
+                                 'updated_at': datetime.now(timezone.utc)},
+                    },
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                # This batch was already counted for the day
+                pass
+        # Delete only after the archive write went through
+        await self.db.registration_logs.delete_many({'_id': {'$in': state['ids']}})
+        await self.db.archive_state.delete_one({'_id': state['_id'], 'batch': state['batch']})
+
+    async def recover(self):
+        """Finish or roll back the batch an interrupted run left behind."""
+        state = await self.db.archive_state.find_one({'_id': 'registration_logs'})
+        if state is None:
+            return
+        if state['appended']:
+            await self._commit(state)
+            logger.info(f"Finished interrupted archive batch {state['batch']}")
+            return
+        for day in state['days']:
+            await asyncio.to_thread(_truncate, day['path'], day['size'])
+        await self.db.archive_state.delete_one({'_id': state['_id'], 'batch': state['batch']})
+        logger.info(f"Rolled back interrupted archive batch {state['batch']}")
+
+    async def archived_totals(self):
+        """Counts of archived logs, for totals that span hot and archived data."""
+        totals = {'count': 0, 'success': 0, 'failed': 0}
+        async for part in self.db.archive_index.find({'collection': 'registration_logs'}):
+            for key in totals:
+                totals[key] += part.get(key, 0)
+        return totals
+
+    async def archived_days(self, since=None):
+        """Days ('YYYY-MM-DD') with archived registration logs, oldest first."""
+        query = {'collection': 'registration_logs'}
+        if since:
+            query['day'] = {'$gte': since}
+        parts = await self.db.archive_index.find(query, {'day': 1}).sort('day', ASCENDING).to_list(None)
+        return [p['day'] for p in parts]
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json_util.loads(line, json_options=ARCHIVE_JSON) for line in f]
+
+    async def read_day(self, day):
+        """Every archived registration log of one day (hold `exclusive()` for a stable view)."""
+        return await asyncio.to_thread(self._read, self.partition_path('registration_logs', day))
+
+    @staticmethod
+    def _matches(doc, start, end, filters):
+        registered_at = _as_utc(doc['registered_at'])
+        if (start and registered_at < start) or (end and registered_at >= end):
+            return False
+        return all(doc.get(k) == v for k, v in filters.items())
+
+    def _scan(self, paths, start, end, filters, limit):
+        results = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    doc = json_util.loads(line, json_options=ARCHIVE_JSON)
+                    if not self._matches(doc, start, end, filters):
+                        continue
+                    results.append(doc)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def _partition_query(self, start=None, end=None):
+        query = {'collection': 'registration_logs'}
+        day_range = {}
+        if start:
+            day_range['$gte'] = start.strftime('%Y-%m-%d')
+        if end:
+            day_range['$lte'] = end.strftime('%Y-%m-%d')
+        if day_range:
+            query['day'] = day_range
+        return query
+
+    async def query_archive(self, start=None, end=None, limit=1000, **filters):
+        """Slow path: scan archived day partitions in [start, end) matching `filters`."""
+        parts = await self.db.archive_index.find(
+            self._partition_query(start, end)
+        ).sort('day', DESCENDING).to_list(None)
+        filters = {k: v for k, v in filters.items() if v is not None}
+        return await asyncio.to_thread(self._scan, [p['path'] for p in parts], start, end, filters, limit)
+
+    async def reaches_archive(self, start=None, end=None):
+        """Whether logs in [start, end) may be archived, now or while they are read."""
+        if self.log_retention_days > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=self.log_retention_days)
+            if start is None or start < cutoff:
+                return True
+        return bool(await self.db.archive_index.count_documents(self._partition_query(start, end), limit=1))
+
+    async def iter_archive(self, start=None, end=None, **filters):
+        """Archived logs in [start, end) matching `filters`, oldest first, one day file at a time.
+
+        Hold `exclusive()` while iterating so no batch moves between the
+        archive and the hot collection underneath the reader.
+        """
+        parts = await self.db.archive_index.find(
+            self._partition_query(start, end), {'day': 1}
+        ).sort('day', ASCENDING).to_list(None)
+        filters = {k: v for k, v in filters.items() if v is not None}
+        for part in parts:
+            docs = await self.read_day(part['day'])
+            docs.sort(key=lambda d: _as_utc(d['registered_at']))
+            for doc in docs:
+                if self._matches(doc, start, end, filters):
+                    yield doc
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.archive_logs()
+            except Exception as e:
+                logger.error(f"Log archiving error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0 and self.log_retention_days > 0:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
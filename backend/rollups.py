@@ -0,0 +1,296 @@
+"""
+Rollups Module
+Hourly and daily registration counters per OLT, profile and operator,
+incremented as each log is written so capacity-planning queries over months
+read a few hundred bucket documents instead of aggregating raw logs.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from olt_lease import LeaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    'hour': lambda t: t.replace(minute=0, second=0, microsecond=0),
+    'day': lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+# dimension -> (key field, display name field) on a registration log
+DIMENSIONS = {
+    'all': (None, None),
+    'olt': ('olt_id', 'olt_name'),
+    'profile': ('profile_id', 'profile_name'),
+    'user': ('registered_by', 'registered_by'),
+}
+
+# Seconds between backfill attempts while another worker runs it or it failed
+BACKFILL_RETRY = 60
+
+BACKFILL_FIELDS = {
+    'registered_at': 1, 'success': 1, 'timeline.duration_ms': 1, 'olt_id': 1, 'olt_name': 1,
+    'profile_id': 1, 'profile_name': 1, 'registered_by': 1,
+}
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def registration_duration_ms(log):
+    """Time spent on the OLT for this ONT: its commands in the timeline."""
+    durations = [e.get('duration_ms') for e in log.get('timeline') or [] if e.get('duration_ms') is not None]
+    return round(sum(durations), 1) if durations else None
+
+
+def bucket_increments(log):
+    """{(granularity, bucket, dimension, key): (name, counters)} for one log."""
+    registered_at = _utc(log['registered_at'])
+    duration = registration_duration_ms(log)
+    counters = {
+        'total': 1,
+        'success': 1 if log.get('success') else 0,
+        'failed': 0 if log.get('success') else 1,
+        'duration_ms_sum': duration or 0.0,
+        'duration_count': 1 if duration is not None else 0,
+    }
+    increments = {}
+    for granularity, truncate in GRANULARITIES.items():
+        bucket = truncate(registered_at)
+        for dimension, (key_field, name_field) in DIMENSIONS.items():
+            key = str(log.get(key_field)) if key_field else 'all'
+            name = log.get(name_field) if name_field else None
+            increments[(granularity, bucket, dimension, key)] = (name, counters)
+    return increments
+
+
+def _upserts(increments, backfill=False):
+    now = datetime.now(timezone.utc)
+    operations = []
+    for (granularity, bucket, dimension, key), (name, counters) in increments.items():
+        bucket_filter = {'_id': f"{granularity}:{bucket.isoformat()}:{dimension}:{key}"}
+        fields = {'name': name, 'updated_at': now}
+        if backfill:
+            # A bucket takes its backfill once; a repeat collides with the _id and is dropped
+            bucket_filter['backfilled'] = {'$ne': True}
+            fields['backfilled'] = True
+        operations.append(UpdateOne(
+            bucket_filter,
+            {
+                '$inc': counters,
+                '$set': fields,
+                '$setOnInsert': {
+                    'granularity': granularity, 'bucket': bucket, 'dimension': dimension, 'key': key,
+                },
+            },
+            upsert=True
+        ))
+    return operations
+
+
+def _merge(into, increments):
+    for bucket_key, (name, counters) in increments.items():
+        if bucket_key in into:
+            _, merged = into[bucket_key]
+            into[bucket_key] = (name, {k: merged[k] + v for k, v in counters.items()})
+        else:
+            into[bucket_key] = (name, dict(counters))
+
+
+def _present(doc):
+    count = doc.get('duration_count', 0)
+    total = doc.get('total', 0)
+    return {
+        'bucket': _utc(doc['bucket']).isoformat() if 'bucket' in doc else None,
+        'key': doc.get('key'),
+        'name': doc.get('name'),
+        'total': total,
+        'success': doc.get('success', 0),
+        'failed': doc.get('failed', 0),
+        'success_rate': round(doc.get('success', 0) / total, 4) if total else None,
+        'mean_duration_ms': round(doc.get('duration_ms_sum', 0.0) / count, 1) if count else None,
+    }
+
+
+class RegistrationRollups:
+    """`registration_rollups`: one document per (granularity, bucket, dimension, key)."""
+
+    def __init__(self, db):
+        self.db = db
+        self._task = None
+
+    async def ensure_indexes(self):
+        await self.db.registration_rollups.create_index([
+            ('granularity', ASCENDING), ('dimension', ASCENDING), ('bucket', ASCENDING), ('key', ASCENDING)
+        ])
+
+    async def record(self, log):
+        await self.db.registration_rollups.bulk_write(_upserts(bucket_increments(log)), ordered=False)
+
+    async def backfill_state(self, before):
+        """The backfill marker to resume from, or None once rollups cover every log."""
+        marker = await self.db.registration_rollups.find_one({'_id': 'backfill'})
+        if marker is None:
+            if await self.db.registration_rollups.estimated_document_count() > 0:
+                return None
+            try:
+                # Marker document: no granularity, so range queries never see it
+                await self.db.registration_rollups.insert_one({
+                    '_id': 'backfill', 'before': before, 'through': None, 'done': False,
+                    'started_at': datetime.now(timezone.utc),
+                })
+            except DuplicateKeyError:
+                pass
+            marker = await self.db.registration_rollups.find_one({'_id': 'backfill'})
+        return None if marker.get('done') else marker
+
+    async def _flush_day(self, day, logs):
+        """Fold one whole UTC day of logs and move the marker past it."""
+        increments = {}
+        for log in logs:
+            _merge(increments, bucket_increments(log))
+        if increments:
+            try:
+                await self.db.registration_rollups.bulk_write(_upserts(increments, backfill=True), ordered=False)
+            except BulkWriteError as e:
+                if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                    raise
+        next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        await self.db.registration_rollups.update_one({'_id': 'backfill'}, {'$set': {'through': next_day}})
+        return len(logs)
+
+    async def backfill(self, state, archive=None):
+        """Fold logs written before the marker's cutoff into the rollups, day by day.
+
+        Archived days come first (with any of their logs still in MongoDB),
+        then the remaining hot logs. Progress is kept on the marker, so a
+        restart resumes at the first unfinished day; a day redone after a
+        crash skips the buckets it already reached.
+        """
+        before = _utc(state['before'])
+        through = state.get('through')
+        folded = 0
+
+        def hot_range(start, end):
+            return {'registered_at': {'$gte': start, '$lt': min(end, before)}}
+
+        archived = await archive.archived_days(since=through) if archive is not None else []
+        for day in archived:
+            start = datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            if start >= before:
+                break
+            logs = [l for l in await archive.read_day(day) if _utc(l['registered_at']) < before]
+            logs += await self.db.registration_logs.find(
+                hot_range(start, start + timedelta(days=1)), BACKFILL_FIELDS
+            ).to_list(None)
+            folded += await self._flush_day(day, logs)
+
+        query = {'registered_at': {'$lt': before}}
+        if through:
+            query['registered_at']['$gte'] = datetime.strptime(through, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        done_days = set(archived)
+        day, logs = None, []
+        cursor = self.db.registration_logs.find(query, BACKFILL_FIELDS).sort('registered_at', ASCENDING)
+        async for log in cursor:
+            log_day = _utc(log['registered_at']).strftime('%Y-%m-%d')
+            if log_day in done_days:
+                continue
+            if log_day != day:
+                if day is not None:
+                    folded += await self._flush_day(day, logs)
+                day, logs = log_day, []
+            logs.append(log)
+        if day is not None:
+            folded += await self._flush_day(day, logs)
+
+        await self.db.registration_rollups.update_one(
+            {'_id': 'backfill'}, {'$set': {'done': True, 'finished_at': datetime.now(timezone.utc)}}
+        )
+        logger.info(f"Backfilled registration rollups from {folded} logs")
+        return folded
+
+    async def run_backfill(self, before, archive=None, retry=BACKFILL_RETRY):
+        """Backfill until the marker says done; only the worker holding the archive lease works on it."""
+        while True:
+            try:
+                state = await self.backfill_state(before)
+                if state is None:
+                    return
+                if archive is None:
+                    await self.backfill(state)
+                    return
+                async with archive.exclusive():
+                    # Re-read inside the lease: another worker may have moved it on
+                    state = await self.backfill_state(before)
+                    if state is not None:
+                        await self.backfill(state, archive)
+                return
+            except LeaseUnavailableError:
+                pass
+            except Exception as e:
+                logger.error(f"Rollup backfill error: {e}")
+            await asyncio.sleep(retry)
+
+    def start(self, before, archive=None):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_backfill(before, archive))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def series(self, granularity, dimension, start, end, key=None):
+        """Buckets in [start, end), oldest first."""
+        query = {
+            'granularity': granularity,
+            'dimension': dimension,
+            'bucket': {'$gte': GRANULARITIES[granularity](start), '$lt': end},
+        }
+        if key is not None:
+            query['key'] = key
+        docs = await self.db.registration_rollups.find(query).sort(
+            [('bucket', ASCENDING), ('key', ASCENDING)]
+        ).to_list(None)
+        return [_present(d) for d in docs]
+
+    async def summary(self, granularity, dimension, start, end):
+        """Totals per key over [start, end), busiest first."""
+        pipeline = [
+            {'$match': {
+                'granularity': granularity,
+                'dimension': dimension,
+                'bucket': {'$gte': GRANULARITIES[granularity](start), '$lt': end},
+            }},
+            {'$group': {
+                '_id': '$key',
+                'name': {'$last': '$name'},
+                'total': {'$sum': '$total'},
+                'success': {'$sum': '$success'},
+                'failed': {'$sum': '$failed'},
+                'duration_ms_sum': {'$sum': '$duration_ms_sum'},
+                'duration_count': {'$sum': '$duration_count'},
+            }},
+            {'$sort': {'total': -1}},
+        ]
+        rows = await self.db.registration_rollups.aggregate(pipeline).to_list(None)
+        totals = []
+        for row in rows:
+            total = _present({**row, 'key': row['_id']})
+            del total['bucket']
+            totals.append(total)
+        return totals
+
+
+def default_range(granularity, days=None):
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=days or (2 if granularity == 'hour' else 30))
+    return start, end
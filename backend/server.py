@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -8,24 +9,133 @@ from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import hashlib
 import jwt
 import asyncio
+import threading
+import time
 from bson import ObjectId
+from contextlib import asynccontextmanager
+from coalesce import SingleFlight
+from inventory import InventorySynchronizer
+from olt_telnet import OLTConnectionError
+from olt_throttle import ThrottleRegistry
+from olt_breaker import BreakerRegistry, CircuitOpenError
+from olt_pool import SessionPool
+from olt_lease import LeaseManager, LeaseLostError, LeaseUnavailableError
+from olt_health import probe_tcp
+from olt_timing import LOGIN_PHASES, TimingStats
+from olt_transcript import SessionRecorder
+from parse_offload import ParseOffloader
+from parse_cache import ParseCache
+from loop_monitor import LoopLagMonitor
+from retention import RetentionManager
+from bulk_import import BulkImporter
+from idempotency import IdempotencyStore
+from event_bus import EventBus
+from rollups import DIMENSIONS, GRANULARITIES, RegistrationRollups, default_range
+from dashboard_feed import DashboardFeed, log_summary
+from read_cache import CacheVersions, ReadModelCache, etag_matches
+from sn_index import SNLocationIndex
+from log_export import DEFAULT_FIELDS, EXPORT_FORMATS, log_filter, stream_logs
+from metrics import CONTENT_TYPE, MetricsRegistry, MongoCommandTimer
+from pymongo import UpdateOne
+from planner import (
+    RegistrationPlanner, allocate_service_port_block, assign_entry, conflict, new_entry,
+    profile_service_vlans, verify_plan_on_olt
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Prometheus metrics (served at /api/metrics)
+metrics = MetricsRegistry()
+mongo_latency = metrics.histogram(
+    'mongo_operation_seconds', 'MongoDB command latency', ['command'])
+mongo_failures = metrics.counter(
+    'mongo_operation_failures_total', 'Failed MongoDB commands', ['command'])
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandTimer(mongo_latency, mongo_failures)])
 db = client[os.environ.get('DB_NAME', 'olt_registration')]
 
 # JWT Config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'olt-huawei-secret-key-2024')
 JWT_ALGORITHM = 'HS256'
 
+# Discovery scans finishing within this window answer later scans of the same OLT
+DISCOVERY_FRESHNESS_SECONDS = float(os.environ.get('DISCOVERY_FRESHNESS_SECONDS', '5'))
+
+# Inventory sync: refresh each OLT at most every interval seconds (0 disables)
+INVENTORY_SYNC_INTERVAL = int(os.environ.get('INVENTORY_SYNC_INTERVAL', '900'))
+INVENTORY_SYNC_CONCURRENCY = int(os.environ.get('INVENTORY_SYNC_CONCURRENCY', '4'))
+
+# Adaptive per-OLT throttling: sessions per OLT and latency thresholds (seconds)
+OLT_MAX_SESSIONS = int(os.environ.get('OLT_MAX_SESSIONS', '2'))
+OLT_LATENCY_TARGET = float(os.environ.get('OLT_LATENCY_TARGET', '1.0'))
+OLT_LATENCY_HIGH = float(os.environ.get('OLT_LATENCY_HIGH', str(OLT_LATENCY_TARGET * 2)))
+OLT_MAX_PACING = float(os.environ.get('OLT_MAX_PACING', '2.0'))
+
+# Circuit breaker: consecutive failures before an OLT fails fast, and probe backoff (seconds)
+OLT_BREAKER_THRESHOLD = int(os.environ.get('OLT_BREAKER_THRESHOLD', '3'))
+OLT_BREAKER_BACKOFF = float(os.environ.get('OLT_BREAKER_BACKOFF', '10'))
+OLT_BREAKER_MAX_BACKOFF = float(os.environ.get('OLT_BREAKER_MAX_BACKOFF', '300'))
+
+# Idle logged-in sessions kept per OLT for reuse (0 seconds disables pooling)
+OLT_POOL_IDLE_SECONDS = float(os.environ.get('OLT_POOL_IDLE_SECONDS', '60'))
+OLT_POOL_MAX_IDLE = int(os.environ.get('OLT_POOL_MAX_IDLE', '1'))
+# Seconds a background teardown waits to answer the logout (y/n) prompt (0: just close the socket)
+OLT_LOGOUT_CONFIRM_TIMEOUT = float(os.environ.get('OLT_LOGOUT_CONFIRM_TIMEOUT', '2'))
+
+# Fleet health check: probe timeout (seconds) and parallel probes
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', '5'))
+HEALTH_CONCURRENCY = int(os.environ.get('HEALTH_CONCURRENCY', '100'))
+
+# Registration plans hold their reserved IDs for this many seconds
+REGISTRATION_PLAN_TTL = int(os.environ.get('REGISTRATION_PLAN_TTL', '900'))
+
+# Upper bound on OLTs registered in parallel by one batch request
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '8'))
+# Seconds without a heartbeat after which another worker resumes a bulk import (0: never)
+IMPORT_STALE_SECONDS = float(os.environ.get('IMPORT_STALE_SECONDS', '120'))
+
+# Parse CLI outputs at least this many bytes off the event loop ('process' or 'thread' pool)
+PARSE_OFFLOAD_BYTES = int(os.environ.get('PARSE_OFFLOAD_BYTES', '65536'))
+PARSE_POOL = os.environ.get('PARSE_POOL', 'process')
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '2'))
+
+# Parsed outputs remembered by content hash for repeated identical tables (0 disables)
+PARSE_CACHE_SIZE = int(os.environ.get('PARSE_CACHE_SIZE', '128'))
+
+# Log the blocking handler when the event loop stalls this long (seconds, 0 disables)
+LOOP_LAG_THRESHOLD = float(os.environ.get('LOOP_LAG_THRESHOLD', '0.25'))
+
+# Independent commands (ont add, service-port) written per round-trip; 1 disables pipelining
+OLT_PIPELINE_WINDOW = int(os.environ.get('OLT_PIPELINE_WINDOW', '8'))
+
+# Record every telnet session to gzipped transcripts under this directory (empty disables)
+TRANSCRIPT_DIR = os.environ.get('TRANSCRIPT_DIR', '')
+
+# Seconds an idle worker keeps ownership of an OLT without renewing it (0: single worker, no leases)
+OLT_LEASE_TTL = float(os.environ.get('OLT_LEASE_TTL', '30'))
+OLT_LEASE_WAIT = float(os.environ.get('OLT_LEASE_WAIT', '30'))
+
+# Results of requests sent with an Idempotency-Key are replayed for this long (seconds)
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+
+# How often each worker picks up OLT/profile list versions bumped by other workers (seconds)
+CACHE_VERSION_POLL = float(os.environ.get('CACHE_VERSION_POLL', '2'))
+
+# Discovery snapshots expire after this many days (0 keeps them forever)
+DISCOVERY_TTL_DAYS = int(os.environ.get('DISCOVERY_TTL_DAYS', '30'))
+
+# Registration logs older than this move to gzipped day files under ARCHIVE_DIR (0 disables)
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', '180'))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', str(ROOT_DIR / 'archive'))
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', '21600'))
+
 # Create the main app
 app = FastAPI(title="OLT Huawei Registration System")
 api_router = APIRouter(prefix="/api")
@@ -37,6 +147,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Concurrent discovery scans of the same OLT share one telnet session
+discovery_flight = SingleFlight(freshness=DISCOVERY_FRESHNESS_SECONDS)
+
+# One adaptive rate controller per OLT, shared by every code path
+throttles = ThrottleRegistry(
+    max_sessions=OLT_MAX_SESSIONS,
+    target_latency=OLT_LATENCY_TARGET,
+    high_latency=OLT_LATENCY_HIGH,
+    max_pacing=OLT_MAX_PACING
+)
+
+# One circuit breaker per OLT so a dead OLT fails fast everywhere
+breakers = BreakerRegistry(
+    failure_threshold=OLT_BREAKER_THRESHOLD,
+    base_backoff=OLT_BREAKER_BACKOFF,
+    max_backoff=OLT_BREAKER_MAX_BACKOFF
+)
+
+# Logged-in sessions parked at the config prompt between operations
+session_pool = SessionPool(max_idle_per_olt=OLT_POOL_MAX_IDLE, idle_timeout=OLT_POOL_IDLE_SECONDS)
+
+# Across workers, an OLT's sessions and queue live in whichever process holds its lease
+def olt_lease_name(olt_id):
+    return f"olt:{olt_id}"
+
+def keep_olt_lease(name):
+    # Background job leases (job:*) are never kept once their run ends
+    return name.startswith('olt:') and bool(session_pool.snapshot()['idle_sessions'].get(name.split(':', 1)[1]))
+
+async def yield_olt_lease(name):
+    if name.startswith('olt:'):
+        await drop_idle_sessions(name.split(':', 1)[1])
+
+leases = LeaseManager(
+    db, ttl=OLT_LEASE_TTL, wait=OLT_LEASE_WAIT,
+    keep=keep_olt_lease,
+    on_yield=yield_olt_lease
+)
+
+# Telnet phase/command timings aggregated per OLT and command type
+timing_stats = TimingStats(db)
+
+# Identical CLI outputs are parsed once; large ones in a worker pool off the event loop
+parse_cache = ParseCache(maxsize=PARSE_CACHE_SIZE)
+parse_offloader = ParseOffloader(
+    threshold=PARSE_OFFLOAD_BYTES, mode=PARSE_POOL, workers=PARSE_WORKERS, cache=parse_cache
+)
+
+def parse_cache_stats(field):
+    return [({'parser': name}, stats[field]) for name, stats in parse_cache.stats.items()]
+
+metrics.counter(
+    'parse_cache_hits_total', 'Parses answered from the output-hash cache', ['parser'],
+    collect=lambda: parse_cache_stats('hits'))
+metrics.counter(
+    'parse_cache_misses_total', 'Parses that missed the output-hash cache', ['parser'],
+    collect=lambda: parse_cache_stats('misses'))
+metrics.counter(
+    'parse_cache_evictions_total', 'Cached parses evicted by the LRU bound', ['parser'],
+    collect=lambda: parse_cache_stats('evictions'))
+
+# TTL on discovery snapshots, old registration logs archived out of the hot collection
+retention = RetentionManager(
+    db, ARCHIVE_DIR,
+    discovery_ttl_days=DISCOVERY_TTL_DAYS,
+    log_retention_days=LOG_RETENTION_DAYS,
+    interval=RETENTION_INTERVAL,
+    leases=leases
+)
+
+# Event-loop lag heartbeat with a watchdog that names the blocking handler
+loop_monitor = LoopLagMonitor(
+    threshold=LOOP_LAG_THRESHOLD,
+    lag_histogram=metrics.histogram('event_loop_lag_seconds', 'Event loop scheduling lag per heartbeat')
+)
+
+telnet_connect_latency = metrics.histogram(
+    'olt_telnet_connect_seconds', 'Telnet login time from TCP connect to config prompt', ['olt_id'])
+telnet_command_latency = metrics.histogram(
+    'olt_telnet_command_seconds', 'Telnet command time to prompt', ['olt_id', 'verb'])
+telnet_paging_events = metrics.counter(
+    'olt_telnet_paging_events_total', 'Pager prompts answered while reading output', ['olt_id', 'verb'])
+telnet_command_errors = metrics.counter(
+    'olt_telnet_command_errors_total', 'Commands that timed out or lost the session', ['olt_id', 'verb'])
+olt_session_failures = metrics.counter(
+    'olt_session_failures_total', 'OLT sessions that failed to log in or broke mid-use', ['olt_id'])
+registrations_total = metrics.counter(
+    'olt_registrations_total', 'ONT registrations attempted', ['olt_id', 'result'])
+metrics.gauge(
+    'olt_sessions_in_flight', 'Telnet sessions currently open per OLT', ['olt_id'],
+    collect=lambda: [({'olt_id': t['key']}, t['in_flight']) for t in throttles.snapshot()])
+metrics.gauge(
+    'olt_sessions_queued', 'Jobs waiting for a session slot per OLT', ['olt_id'],
+    collect=lambda: [({'olt_id': t['key']}, t['waiting']) for t in throttles.snapshot()])
+metrics.gauge(
+    'olt_pool_idle_sessions', 'Logged-in sessions parked in the pool per OLT', ['olt_id'],
+    collect=lambda: [({'olt_id': k}, n) for k, n in session_pool.snapshot()['idle_sessions'].items()])
+
 # ============================================================
 # HELPERS
 # ============================================================
@@ -61,6 +269,184 @@ def serialize_doc(doc):
             result[key] = value
     return result
 
+def build_olt_connection(olt):
+    """Create a telnet connection object for an OLT document."""
+    from olt_telnet import HuaweiOLTConnection
+    recorder = None
+    if TRANSCRIPT_DIR:
+        recorder = SessionRecorder.for_olt(TRANSCRIPT_DIR, olt, secrets=[olt['password']])
+    return HuaweiOLTConnection(
+        host=olt['ip_address'],
+        port=olt.get('port', 23),
+        username=olt['username'],
+        password=olt['password'],
+        throttle=throttles.get(str(olt['_id'])),
+        recorder=recorder,
+        pipeline_window=OLT_PIPELINE_WINDOW
+    )
+
+# Teardowns and stats writes still running after their request returned
+background_tasks = set()
+
+def run_in_background(coro):
+    """Run a coroutine off the request path, keeping a reference until it ends."""
+    task = asyncio.get_running_loop().create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def close_session(conn, throttle=None):
+    """Log out of a session; its throttle slot is freed once the VTY is.
+
+    Runs off the request path, so it can afford to confirm the logout.
+    """
+    try:
+        await asyncio.to_thread(conn.disconnect, OLT_LOGOUT_CONFIRM_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error closing OLT session: {e}")
+    finally:
+        if throttle is not None:
+            await throttle.release()
+
+def schedule_teardown(conn, throttle=None):
+    """Log out of a session in the background, off the request path."""
+    run_in_background(close_session(conn, throttle))
+
+def executor_usage():
+    """Worker threads and queued calls of the loop's default executor."""
+    executor = getattr(asyncio.get_running_loop(), '_default_executor', None)
+    if executor is None:
+        return {'threads': 0, 'max_workers': 0, 'queued': 0}
+    return {
+        'threads': len(executor._threads),
+        'max_workers': executor._max_workers,
+        'queued': executor._work_queue.qsize(),
+    }
+
+metrics.gauge(
+    'executor_threads', 'Default executor threads (telnet I/O runs here)', ['state'],
+    collect=lambda: [({'state': 'started'}, executor_usage()['threads']),
+                     ({'state': 'max'}, executor_usage()['max_workers'])])
+metrics.gauge(
+    'executor_queued_calls', 'Blocking calls waiting for an executor thread',
+    collect=lambda: [({}, executor_usage()['queued'])])
+metrics.gauge(
+    'process_threads', 'Live threads in the backend process',
+    collect=lambda: [({}, threading.active_count())])
+metrics.gauge(
+    'background_tasks', 'Teardowns and stats writes still running',
+    collect=lambda: [({}, len(background_tasks))])
+
+def observe_session_metrics(key, timeline):
+    """Feed one session's timeline into the telnet histograms and counters."""
+    login = [e for e in timeline if e['phase'] in LOGIN_PHASES]
+    if any(e['phase'] == 'config' for e in login):
+        telnet_connect_latency.observe(sum(e['duration_ms'] for e in login) / 1000, olt_id=key)
+    for event in timeline:
+        if event['phase'] != 'command':
+            continue
+        telnet_command_latency.observe(event['duration_ms'] / 1000, olt_id=key, verb=event['verb'])
+        if event['pages']:
+            telnet_paging_events.inc(event['pages'], olt_id=key, verb=event['verb'])
+        if not event['ok']:
+            telnet_command_errors.inc(olt_id=key, verb=event['verb'])
+
+@asynccontextmanager
+async def olt_session(olt):
+    """Open a throttled, circuit-protected telnet session to an OLT.
+    
+    Reuses an idle pooled session when one is available and parks the
+    session back in the pool if the caller finished cleanly. With several
+    workers the OLT's lease is held for the duration.
+    Raises OLTConnectionError when login fails, CircuitOpenError while
+    the OLT is failing fast and LeaseUnavailableError while another worker
+    owns the OLT.
+    """
+    key = str(olt['_id'])
+    lease = await leases.acquire(olt_lease_name(key))
+    try:
+        async with _olt_session(olt, key) as conn:
+            yield conn
+    finally:
+        await leases.release(lease)
+
+@asynccontextmanager
+async def _olt_session(olt, key):
+    breaker = breakers.get(key)
+    breaker.before_call()
+    throttle = throttles.get(key)
+    conn = None
+    failure = None
+    connected = False
+    pooled = False
+    try:
+        # A pooled session still holds the throttle slot it logged in with
+        conn = session_pool.checkout(key)
+        reused = conn is not None
+        if reused:
+            conn.reset_timeline(reused=True)
+        else:
+            await throttle.acquire()
+            try:
+                conn = build_olt_connection(olt)
+            except Exception:
+                await throttle.release()
+                raise
+        try:
+            if not reused:
+                success, msg = await asyncio.to_thread(conn.connect)
+                if not success:
+                    failure = msg
+                    raise OLTConnectionError(msg)
+            connected = True
+            try:
+                yield conn
+            except (OSError, EOFError) as e:
+                failure = str(e)
+                raise
+            # Only sessions seen back at the config prompt are reusable, and
+            # only while nobody is queued for the slot they would keep
+            pooled = (
+                not conn.command_errors and conn.at_config_prompt()
+                and not throttle.waiting and session_pool.checkin(key, conn)
+            )
+        finally:
+            timeline = list(conn.timeline)
+            observe_session_metrics(key, timeline)
+            run_in_background(timing_stats.record(key, olt['name'], timeline))
+            if not pooled:
+                # The OLT still counts the VTY until the logout is through
+                schedule_teardown(conn, throttle)
+    finally:
+        if failure is None and connected and conn.command_errors:
+            failure = f"{conn.command_errors} perintah timeout/terputus"
+        if failure is not None:
+            olt_session_failures.inc(olt_id=key)
+            breaker.record_failure(failure)
+        elif connected:
+            breaker.record_success()
+        else:
+            breaker.abandon()
+
+def teardown_pooled_session(conn):
+    """Close a session the pool gave up, handing back the slot it held."""
+    schedule_teardown(conn, conn.throttle)
+
+async def drop_idle_sessions(olt_id: str):
+    """Close pooled sessions of an OLT whose settings changed or that was removed."""
+    for conn in session_pool.drain(olt_id):
+        teardown_pooled_session(conn)
+
+def olt_connection_http_error(e):
+    """HTTP error for a failed OLT session; open circuits answer 503."""
+    if isinstance(e, (CircuitOpenError, LeaseUnavailableError)):
+        return HTTPException(
+            status_code=503, detail=str(e),
+            headers={'Retry-After': str(int(e.retry_after) + 1)}
+        )
+    if isinstance(e, LeaseLostError):
+        return HTTPException(status_code=409, detail=str(e))
+    return HTTPException(status_code=500, detail=f"Gagal koneksi ke OLT: {e}")
+
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -91,6 +477,49 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Mirrors every OLT's ONT and service-port tables into MongoDB
+inventory = InventorySynchronizer(
+    db, olt_session,
+    interval=INVENTORY_SYNC_INTERVAL,
+    concurrency=INVENTORY_SYNC_CONCURRENCY,
+    parse=parse_offloader.parse,
+    leases=leases
+)
+
+# Offline registration planning against the cached inventory
+planner = RegistrationPlanner(db, inventory, ttl=REGISTRATION_PLAN_TTL)
+
+# In-process events (new logs, scans, list changes) pushed to live dashboards
+event_bus = EventBus()
+
+# Version counters behind the ETags of the OLT and profile lists; changes,
+# including those made by other workers, are announced on the event bus
+cache_versions = CacheVersions(
+    db, poll_interval=CACHE_VERSION_POLL,
+    on_change=lambda name, remote: event_bus.publish({'type': f'{name}_changed', 'remote': remote})
+)
+
+# Dashboard numbers seeded once, then advanced by events
+dashboard_feed = DashboardFeed(db, event_bus, retention.archived_totals)
+
+# Hourly/daily registration counters per OLT, profile and operator
+rollups = RegistrationRollups(db)
+
+# Repeated Idempotency-Keys replay the stored result or attach to the running job
+idempotency = IdempotencyStore(db, ttl=IDEMPOTENCY_TTL, owner=leases.owner)
+
+async def idempotent(idempotency_key, scope, user, payload, response, job):
+    """Run `job` once per Idempotency-Key; without a key it simply runs."""
+    if not idempotency_key:
+        return await job()
+    result, replayed = await idempotency.run(idempotency_key, scope, user['username'], payload, job)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return result
+
+# Unregistered SN -> OLT and F/S/P, updated by every discovery scan
+sn_index = SNLocationIndex(db)
+
 # ============================================================
 # MODELS
 # ============================================================
@@ -122,6 +551,11 @@ class OLTUpdate(BaseModel):
     description: Optional[str] = None
     olt_version: Optional[str] = None
 
+class HealthCheckRequest(BaseModel):
+    olt_ids: Optional[List[str]] = None
+    full_login: bool = False
+    timeout: Optional[float] = None
+
 class ProfileCreate(BaseModel):
     name: str
     olt_id: str
@@ -155,9 +589,26 @@ class RegisterRequest(BaseModel):
     profile_id: str
     ont_entries: List[Dict[str, Any]]  # [{sn, fsp, description, ...}]
 
+class BatchRegisterRequest(BaseModel):
+    groups: List[RegisterRequest]
+    concurrency: Optional[int] = None
+
+class SNEntry(BaseModel):
+    sn: str = Field(min_length=1)  # hex (414C434C...) or vendor form (ALCL-...)
+    description: str = ''
+
+class RegisterBySNRequest(BaseModel):
+    profile: str  # profile name or id, looked up on the OLT where each SN was seen
+    ont_entries: List[SNEntry]
+    concurrency: Optional[int] = None
+
 class DiscoveryRequest(BaseModel):
     olt_id: str
 
+class InventorySyncRequest(BaseModel):
+    olt_id: Optional[str] = None
+    force: bool = False
+
 # ============================================================
 # AUTH ENDPOINTS
 # ============================================================
@@ -201,8 +652,7 @@ async def get_me(user=Depends(get_current_user)):
 # OLT ENDPOINTS
 # ============================================================
 
-@api_router.get("/olts")
-async def list_olts(user=Depends(get_current_user)):
+async def build_olt_list():
     olts = await db.olts.find().to_list(100)
     result = []
     for olt in olts:
@@ -212,6 +662,23 @@ async def list_olts(user=Depends(get_current_user)):
         result.append(s)
     return result
 
+olt_list_cache = ReadModelCache('olts', cache_versions, build_olt_list)
+
+def cached_list_response(request, cache):
+    """304 when the client already holds the current version, else None."""
+    etag = cache.etag()
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    return None
+
+@api_router.get("/olts")
+async def list_olts(request: Request, response: Response, user=Depends(get_current_user)):
+    not_modified = cached_list_response(request, olt_list_cache)
+    if not_modified:
+        return not_modified
+    response.headers['ETag'] = olt_list_cache.etag()
+    return await olt_list_cache.get()
+
 @api_router.post("/olts")
 async def create_olt(data: OLTCreate, user=Depends(get_current_user)):
     doc = data.model_dump()
@@ -219,6 +686,7 @@ async def create_olt(data: OLTCreate, user=Depends(get_current_user)):
     doc['created_by'] = user['username']
     doc['status'] = 'unknown'
     result = await db.olts.insert_one(doc)
+    await cache_versions.bump('olts')
     doc['_id'] = result.inserted_id
     return serialize_doc(doc)
 
@@ -238,6 +706,8 @@ async def update_olt(olt_id: str, data: OLTUpdate, user=Depends(get_current_user
         raise HTTPException(status_code=400, detail="No data to update")
     update_data['updated_at'] = datetime.now(timezone.utc)
     await db.olts.update_one({'_id': ObjectId(olt_id)}, {'$set': update_data})
+    await cache_versions.bump('olts')
+    await drop_idle_sessions(olt_id)
     olt = await db.olts.find_one({'_id': ObjectId(olt_id)})
     s = serialize_doc(olt)
     s['password'] = '****'
@@ -248,51 +718,119 @@ async def delete_olt(olt_id: str, user=Depends(get_current_user)):
     result = await db.olts.delete_one({'_id': ObjectId(olt_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
+    await cache_versions.bump('olts')
+    await drop_idle_sessions(olt_id)
+    # Its SNs can no longer be registered by SN alone
+    await sn_index.remove_olt(olt_id)
     return {'message': 'OLT berhasil dihapus'}
 
+async def check_olt_health(olt, full_login: bool, timeout: float):
+    """Probe one OLT: TCP/banner always, plus a pooled login when requested."""
+    olt_id = str(olt['_id'])
+    result = {
+        'olt_id': olt_id,
+        'name': olt['name'],
+        'ip_address': olt['ip_address'],
+        **await probe_tcp(olt['ip_address'], olt.get('port', 23), timeout=timeout),
+        'login_ok': None,
+        'login_ms': None,
+    }
+    status = 'reachable' if result['banner'] else 'disconnected'
+    
+    if full_login and result['reachable']:
+        started = time.monotonic()
+        try:
+            async with olt_session(olt):
+                pass
+            result['login_ok'] = True
+            status = 'connected'
+        except OLTConnectionError as e:
+            result['login_ok'] = False
+            result['error'] = str(e)
+            status = 'disconnected'
+        except Exception as e:
+            result['login_ok'] = False
+            result['error'] = str(e)
+            status = 'error'
+        result['login_ms'] = round((time.monotonic() - started) * 1000, 1)
+    
+    result['status'] = status
+    return result
+
+@api_router.post("/olts/health")
+async def check_fleet_health(data: HealthCheckRequest, user=Depends(get_current_user)):
+    query = {'_id': {'$in': [ObjectId(i) for i in data.olt_ids]}} if data.olt_ids else {}
+    olts = await db.olts.find(query).to_list(None)
+    timeout = data.timeout or HEALTH_PROBE_TIMEOUT
+    semaphore = asyncio.Semaphore(HEALTH_CONCURRENCY)
+    
+    async def bounded(olt):
+        async with semaphore:
+            return await check_olt_health(olt, data.full_login, timeout)
+    
+    started = time.monotonic()
+    results = await asyncio.gather(*(bounded(o) for o in olts))
+    
+    now = datetime.now(timezone.utc)
+    if results:
+        await db.olts.bulk_write([
+            UpdateOne(
+                {'_id': ObjectId(r['olt_id'])},
+                {'$set': {
+                    'status': r['status'],
+                    'last_test': now,
+                    'last_latency_ms': r['login_ms'] if r['login_ok'] else r['latency_ms'],
+                }}
+            )
+            for r in results
+        ], ordered=False)
+        await cache_versions.bump('olts')
+    
+    return {
+        'checked': len(results),
+        'reachable': sum(1 for r in results if r['reachable']),
+        'unreachable': sum(1 for r in results if not r['reachable']),
+        'login_ok': sum(1 for r in results if r['login_ok']) if data.full_login else None,
+        'duration_seconds': round(time.monotonic() - started, 3),
+        'results': results
+    }
+
 @api_router.post("/olts/{olt_id}/test")
 async def test_olt_connection(olt_id: str, user=Depends(get_current_user)):
     olt = await db.olts.find_one({'_id': ObjectId(olt_id)})
     if not olt:
         raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
     
-    from olt_telnet import HuaweiOLTConnection
-    conn = HuaweiOLTConnection(
-        host=olt['ip_address'],
-        port=olt.get('port', 23),
-        username=olt['username'],
-        password=olt['password']
-    )
-    
     try:
-        success, message = await asyncio.to_thread(conn.connect)
-        if success:
-            await db.olts.update_one(
-                {'_id': ObjectId(olt_id)},
-                {'$set': {'status': 'connected', 'last_test': datetime.now(timezone.utc)}}
-            )
-            return {'success': True, 'message': message}
-        else:
-            await db.olts.update_one(
-                {'_id': ObjectId(olt_id)},
-                {'$set': {'status': 'disconnected', 'last_test': datetime.now(timezone.utc)}}
-            )
-            return {'success': False, 'message': message}
+        async with olt_session(olt):
+            pass
+    except OLTConnectionError as e:
+        await db.olts.update_one(
+            {'_id': ObjectId(olt_id)},
+            {'$set': {'status': 'disconnected', 'last_test': datetime.now(timezone.utc)}}
+        )
+        await cache_versions.bump('olts')
+        return {'success': False, 'message': str(e)}
     except Exception as e:
         await db.olts.update_one(
             {'_id': ObjectId(olt_id)},
             {'$set': {'status': 'error', 'last_test': datetime.now(timezone.utc)}}
         )
+        await cache_versions.bump('olts')
         return {'success': False, 'message': str(e)}
-    finally:
-        conn.disconnect()
+    
+    await db.olts.update_one(
+        {'_id': ObjectId(olt_id)},
+        {'$set': {'status': 'connected', 'last_test': datetime.now(timezone.utc)}}
+    )
+    await cache_versions.bump('olts')
+    return {'success': True, 'message': 'Berhasil terkoneksi ke OLT'}
 
 # ============================================================
 # PROFILE ENDPOINTS
 # ============================================================
 
-@api_router.get("/profiles")
-async def list_profiles(user=Depends(get_current_user)):
+async def build_profile_list():
     profiles = await db.profiles.find().to_list(100)
     result = []
     for p in profiles:
@@ -308,6 +846,17 @@ async def list_profiles(user=Depends(get_current_user)):
         result.append(s)
     return result
 
+# Profile rows embed their OLT's name and IP, so OLT writes invalidate too
+profile_list_cache = ReadModelCache('profiles', cache_versions, build_profile_list, depends=['profiles', 'olts'])
+
+@api_router.get("/profiles")
+async def list_profiles(request: Request, response: Response, user=Depends(get_current_user)):
+    not_modified = cached_list_response(request, profile_list_cache)
+    if not_modified:
+        return not_modified
+    response.headers['ETag'] = profile_list_cache.etag()
+    return await profile_list_cache.get()
+
 @api_router.post("/profiles")
 async def create_profile(data: ProfileCreate, user=Depends(get_current_user)):
     doc = data.model_dump()
@@ -315,6 +864,7 @@ async def create_profile(data: ProfileCreate, user=Depends(get_current_user)):
     doc['created_by'] = user['username']
     doc['status'] = 'active'
     result = await db.profiles.insert_one(doc)
+    await cache_versions.bump('profiles')
     doc['_id'] = result.inserted_id
     return serialize_doc(doc)
 
@@ -325,6 +875,7 @@ async def update_profile(profile_id: str, data: ProfileUpdate, user=Depends(get_
         raise HTTPException(status_code=400, detail="No data to update")
     update_data['updated_at'] = datetime.now(timezone.utc)
     await db.profiles.update_one({'_id': ObjectId(profile_id)}, {'$set': update_data})
+    await cache_versions.bump('profiles')
     profile = await db.profiles.find_one({'_id': ObjectId(profile_id)})
     return serialize_doc(profile)
 
@@ -333,59 +884,87 @@ async def delete_profile(profile_id: str, user=Depends(get_current_user)):
     result = await db.profiles.delete_one({'_id': ObjectId(profile_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Profile tidak ditemukan")
+    await cache_versions.bump('profiles')
     return {'message': 'Profile berhasil dihapus'}
 
 # ============================================================
 # DISCOVERY ENDPOINTS
 # ============================================================
 
+async def run_discovery_scan(olt, olt_id: str, username: str):
+    """Run 'display ont autofind all' on an OLT and store the snapshot."""
+    from olt_telnet import parse_autofind_output
+    
+    try:
+        async with olt_session(olt) as conn:
+            raw_output = await asyncio.to_thread(conn.send_command, "display ont autofind all")
+            timeline = list(conn.timeline)
+    except OLTConnectionError as e:
+        raise olt_connection_http_error(e)
+    
+    discovered = await parse_offloader.parse(parse_autofind_output, raw_output)
+    
+    # Save discovery snapshot
+    scanned_at = datetime.now(timezone.utc)
+    discovery_doc = {
+        'olt_id': olt_id,
+        'olt_name': olt['name'],
+        'scanned_at': scanned_at,
+        'scanned_by': username,
+        'raw_output': raw_output,
+        'onts': discovered,
+        'count': len(discovered),
+        'timeline': timeline
+    }
+    result = await db.discoveries.insert_one(discovery_doc)
+    await sn_index.record_scan(olt_id, olt['name'], discovered, scanned_at)
+    event_bus.publish({'type': 'discovery', 'discovery': {
+        'id': str(result.inserted_id),
+        'olt_id': olt_id,
+        'olt_name': olt['name'],
+        'count': len(discovered),
+        'scanned_at': scanned_at.isoformat(),
+        'scanned_by': username,
+    }})
+    
+    return {
+        'success': True,
+        'count': len(discovered),
+        'onts': discovered,
+        'scanned_at': scanned_at.isoformat(),
+        'discovery_id': str(result.inserted_id)
+    }
+
 @api_router.post("/discovery/scan")
-async def scan_ont_autofind(data: DiscoveryRequest, user=Depends(get_current_user)):
+async def scan_ont_autofind(data: DiscoveryRequest, response: Response, user=Depends(get_current_user),
+                            idempotency_key: Optional[str] = Header(None)):
+    return await idempotent(
+        idempotency_key, 'discovery/scan', user, data, response,
+        lambda: run_scan_ont_autofind(data, user)
+    )
+
+async def run_scan_ont_autofind(data, user):
     olt = await db.olts.find_one({'_id': ObjectId(data.olt_id)})
     if not olt:
         raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
     
-    from olt_telnet import HuaweiOLTConnection, parse_autofind_output
-    conn = HuaweiOLTConnection(
-        host=olt['ip_address'],
-        port=olt.get('port', 23),
-        username=olt['username'],
-        password=olt['password']
-    )
-    
     try:
-        success, msg = await asyncio.to_thread(conn.connect)
-        if not success:
-            raise HTTPException(status_code=500, detail=f"Gagal koneksi ke OLT: {msg}")
-        
-        raw_output = await asyncio.to_thread(conn.send_command, "display ont autofind all")
-        discovered = parse_autofind_output(raw_output)
-        
-        # Save discovery snapshot
-        discovery_doc = {
-            'olt_id': data.olt_id,
-            'olt_name': olt['name'],
-            'scanned_at': datetime.now(timezone.utc),
-            'scanned_by': user['username'],
-            'raw_output': raw_output,
-            'onts': discovered,
-            'count': len(discovered)
-        }
-        await db.discoveries.insert_one(discovery_doc)
-        
-        return {
-            'success': True,
-            'count': len(discovered),
-            'onts': discovered,
-            'scanned_at': datetime.now(timezone.utc).isoformat()
-        }
+        result, shared = await discovery_flight.run(
+            data.olt_id, run_discovery_scan, olt, data.olt_id, user['username']
+        )
+        return {**result, 'shared': shared}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Discovery scan error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.disconnect()
+
+@api_router.get("/discovery/sn/{sn}")
+async def locate_ont_by_sn(sn: str, user=Depends(get_current_user)):
+    location = await sn_index.lookup(sn)
+    if not location:
+        raise HTTPException(status_code=404, detail="SN tidak ditemukan di hasil discovery")
+    return serialize_doc(location)
 
 @api_router.get("/discovery/latest/{olt_id}")
 async def get_latest_discovery(olt_id: str, user=Depends(get_current_user)):
@@ -401,8 +980,295 @@ async def get_latest_discovery(olt_id: str, user=Depends(get_current_user)):
 # REGISTRATION ENDPOINTS
 # ============================================================
 
+def new_registration_result(entry):
+    return {
+        'sn': entry['sn'],
+        'fsp': entry['fsp'],
+        'description': entry['description'],
+        'success': False,
+        'ont_id': entry['ont_id'],
+        'service_port_id': entry['service_port_id'],
+        'service_ports': [{**sp, 'output': None, 'sent': False, 'error': None} for sp in entry['service_ports']],
+        'commands': [],
+        'output': [],
+        'timeline': [],
+        'outcome': None,
+        'error': None
+    }
+
+async def execute_registration_entries(conn, entries, release=None):
+    """Send the precomputed commands of a batch and collect the outputs.
+    
+    The `ont add` lines of each GPON interface go out as one pipelined
+    burst; the service-ports of the ONTs the OLT accepted then follow in
+    another. Responses are classified into typed outcomes, so an ONT that
+    failed to add never gets its service-ports sent, and `release` (an
+    async callable taking ONT IDs and service-port IDs) frees the IDs of
+    commands the OLT certainly did not run; IDs of commands with no
+    readable reply stay reserved. When the session loses sync the batch
+    stops: commands written but not read back are 'unknown', the rest are
+    'not_sent'. Each result carries its share of the session timeline as
+    `timeline`.
+    """
+    from olt_telnet import classify_ont_add, classify_service_port, not_executed, not_sent
+    
+    results = [new_registration_result(entry) for entry in entries]
+    by_interface = {}
+    for entry, reg_result in zip(entries, results):
+        by_interface.setdefault((entry['frame'], entry['slot']), []).append((entry, reg_result))
+    
+    desynced = False
+    for (frame, slot), group in by_interface.items():
+        # Enter interface, add every ONT, exit interface
+        commands = [f"interface gpon {frame}/{slot}"] + [entry['ont_command'] for entry, _ in group] + ["quit"]
+        if desynced:
+            outputs = []
+        else:
+            timeline_start = len(conn.timeline)
+            try:
+                outputs = await asyncio.to_thread(conn.send_commands, commands)
+            except Exception as e:
+                # Whatever was written may have run; nothing can be read back
+                logger.error(f"ONT add burst failed on {frame}/{slot}: {e}")
+                conn.close()
+                outputs = [None] * len(commands)
+            events = {e.get('command'): e for e in conn.timeline[timeline_start:]}
+            desynced = len(outputs) < len(commands) or None in outputs
+        for index, (entry, reg_result) in enumerate(group, start=1):
+            if index >= len(outputs):
+                reg_result['outcome'] = not_sent('Tidak dikirim: sesi OLT kehilangan sinkronisasi')
+            else:
+                ont_output = outputs[index]
+                reg_result['outcome'] = classify_ont_add(ont_output)
+                reg_result['commands'].append(entry['ont_command'])
+                if ont_output:
+                    reg_result['output'].append(ont_output)
+                if entry['ont_command'] in events:
+                    reg_result['timeline'].append(events[entry['ont_command']])
+            if not reg_result['outcome']['ok']:
+                reg_result['error'] = reg_result['outcome']['message']
+    
+    failed = [reg_result for reg_result in results if reg_result['error'] is not None]
+    for reg_result in failed:
+        for sp in reg_result['service_ports']:
+            sp['outcome'] = {'code': 'skipped', 'ok': False, 'message': 'ONT gagal ditambahkan'}
+    if release and failed:
+        await release(
+            [{'fsp': r['fsp'], 'ont_id': r['ont_id']} for r in failed if not_executed(r['outcome'])],
+            [sp['sp_id'] for r in failed for sp in r['service_ports']]
+        )
+    
+    burst = [(reg_result, sp) for reg_result in results if reg_result['error'] is None
+             for sp in reg_result['service_ports']]
+    if burst and desynced:
+        # The session is gone; added ONTs are left without service-ports
+        for _, sp in burst:
+            sp['outcome'] = not_sent('Service-port tidak dikirim: sesi OLT kehilangan sinkronisasi')
+            sp['error'] = sp['outcome']['message']
+        if release:
+            await release([], [sp['sp_id'] for _, sp in burst])
+    elif burst:
+        timeline_start = len(conn.timeline)
+        try:
+            outputs = await asyncio.to_thread(conn.send_commands, [sp['command'] for _, sp in burst])
+        except Exception as e:
+            logger.error(f"Service-port burst failed: {e}")
+            conn.close()
+            outputs = [None] * len(burst)
+        events = {e.get('command'): e for e in conn.timeline[timeline_start:]}
+        for index, (reg_result, sp) in enumerate(burst):
+            if index >= len(outputs):
+                sp['outcome'] = not_sent('Tidak dikirim: sesi OLT kehilangan sinkronisasi')
+            else:
+                sp_output = outputs[index]
+                sp['output'] = sp_output
+                sp['sent'] = True
+                sp['outcome'] = classify_service_port(sp_output)
+                reg_result['commands'].append(sp['command'])
+                if sp_output:
+                    reg_result['output'].append(sp_output)
+                if sp['command'] in events:
+                    reg_result['timeline'].append(events[sp['command']])
+            sp['error'] = sp['outcome']['message'] if not sp['outcome']['ok'] else None
+        failed_sp = [sp['sp_id'] for _, sp in burst if not_executed(sp['outcome'])]
+        if release and failed_sp:
+            await release([], failed_sp)
+    
+    for reg_result in results:
+        sp_errors = [sp['error'] for sp in reg_result['service_ports'] if sp.get('error')]
+        if reg_result['error'] is None and sp_errors:
+            reg_result['error'] = '; '.join(sp_errors)
+        reg_result['success'] = reg_result['error'] is None
+    return results
+
+async def record_registration(olt, profile, reg_result, username, session_timeline=None):
+    """Write the registration log and update the cached inventory.
+    
+    `session_timeline` holds the shared session setup (login or pool reuse
+    and ID detection) that preceded this entry.
+    """
+    registrations_total.inc(olt_id=str(olt['_id']), result='success' if reg_result['success'] else 'failure')
+    # The ONT exists on the OLT even when one of its service-ports failed
+    if (reg_result.get('outcome') or {}).get('ok'):
+        await inventory.note_registered_ont(
+            olt, reg_result['fsp'], reg_result['ont_id'], reg_result['sn'],
+            [sp for sp in reg_result['service_ports'] if (sp.get('outcome') or {}).get('ok')]
+        )
+        await sn_index.remove(reg_result['sn'])
+    
+    log_doc = {
+        'olt_id': str(olt['_id']),
+        'olt_name': olt['name'],
+        'profile_id': str(profile['_id']),
+        'profile_name': profile['name'],
+        'sn': reg_result['sn'],
+        'fsp': reg_result['fsp'],
+        'ont_id': reg_result['ont_id'],
+        'service_port_id': reg_result['service_port_id'],
+        'service_ports': reg_result['service_ports'],
+        'outcome': reg_result.get('outcome'),
+        'description': reg_result['description'],
+        'success': reg_result['success'],
+        'error': reg_result.get('error'),
+        'commands': reg_result['commands'],
+        'output': reg_result['output'],
+        'timeline': reg_result.get('timeline', []),
+        'session_timeline': session_timeline or [],
+        'registered_at': datetime.now(timezone.utc),
+        'registered_by': username
+    }
+    await db.registration_logs.insert_one(log_doc)
+    try:
+        await rollups.record(log_doc)
+    except Exception as e:
+        # The log is written; a missed rollup only skews the statistics
+        logger.error(f"Rollup update failed for {log_doc['sn']}: {e}")
+    event_bus.publish({'type': 'registration', 'log': log_summary(log_doc)})
+    try:
+        await cache_versions.bump('registration_logs')
+    except Exception as e:
+        logger.error(f"Cache version bump failed: {e}")
+
+def conflict_result(entry):
+    """Result for an entry that was not sent to the OLT."""
+    return {
+        'sn': entry['sn'],
+        'fsp': entry['fsp'],
+        'description': entry['description'],
+        'success': False,
+        'ont_id': entry['ont_id'],
+        'service_port_id': entry['service_port_id'],
+        'service_ports': [],
+        'commands': [],
+        'output': [],
+        'error': '; '.join(c['message'] for c in entry['conflicts']),
+        'conflicts': entry['conflicts']
+    }
+
+def summarize_results(results):
+    return {
+        'success': all(r['success'] for r in results),
+        'results': results,
+        'total': len(results),
+        'success_count': sum(1 for r in results if r['success']),
+        'fail_count': sum(1 for r in results if not r['success'])
+    }
+
+async def register_entries(conn, olt, profile, ont_entries, username, results=None):
+    """Register entries over an open session, detecting free IDs live from the OLT.
+    
+    `results` is filled in place, so a caller still has the finished
+    entries if this raises: entries never attempted stay None and those
+    handed to the OLT read 'unknown' until their replies are classified.
+    """
+    from olt_telnet import parse_ont_info_output, parse_service_port_output, find_next_available_ont_id, not_read
+    
+    olt_id = str(olt['_id'])
+    entries = [new_entry(raw_entry) for raw_entry in ont_entries]
+    if results is None:
+        results = []
+    results[:] = [None] * len(entries)
+    
+    # Free IDs are read from the OLT and used before anyone else on this
+    # worker may read them (plans and other sessions to the same OLT)
+    async with planner.lock(olt_id):
+        # Get existing service ports for auto-detection
+        sp_raw = await asyncio.to_thread(conn.send_command, "display service-port all")
+        used_sp = set(await parse_offloader.parse(parse_service_port_output, sp_raw))
+    
+        # IDs reserved by pending plans are off limits here too
+        reserved_onts, reserved_sp = await planner.reserved_ids(olt_id)
+        used_sp |= reserved_sp
+        vlans = profile_service_vlans(profile)
+    
+        # Get existing ONTs for auto-detection, one listing per port
+        used_onts, port_errors = {}, {}
+        for entry in {e['fsp']: e for e in entries if not e['conflicts']}.values():
+            try:
+                await asyncio.to_thread(conn.send_command, f"interface gpon {entry['frame']}/{entry['slot']}")
+                ont_raw = await asyncio.to_thread(conn.send_command, f"display ont info {entry['port']} all")
+                existing_onts = await parse_offloader.parse(parse_ont_info_output, ont_raw)
+                await asyncio.to_thread(conn.send_command, "quit")
+            except Exception as e:
+                port_errors[entry['fsp']] = str(e)
+                continue
+            used_onts[entry['fsp']] = {o['ont_id'] for o in existing_onts} | reserved_onts.get(entry['fsp'], set())
+        session_timeline = list(conn.timeline)
+    
+        executable = []
+        for index, entry in enumerate(entries):
+            if entry['conflicts']:
+                results[index] = conflict_result(entry)
+                continue
+            if entry['fsp'] in port_errors:
+                results[index] = {**conflict_result(entry), 'error': port_errors[entry['fsp']]}
+                await record_registration(olt, profile, results[index], username, session_timeline)
+                continue
+        
+            # Auto-detect next ONT ID and a service-port block covering every VLAN
+            port_used = used_onts[entry['fsp']]
+            next_ont_id = find_next_available_ont_id([{'ont_id': i} for i in port_used])
+            sp_ids = allocate_service_port_block(used_sp, len(vlans))
+            if next_ont_id is None:
+                entry['conflicts'].append(conflict('port_full', 'Tidak ada ONT ID tersedia pada port ini'))
+            elif sp_ids is None:
+                entry['conflicts'].append(conflict('service_port_exhausted', 'Tidak ada service-port ID tersedia'))
+            if entry['conflicts']:
+                results[index] = conflict_result(entry)
+                continue
+        
+            assign_entry(entry, profile, next_ont_id, sp_ids, vlans)
+            port_used.add(next_ont_id)
+            used_sp.update(sp_ids)
+            executable.append(index)
+    
+        # Fencing: the IDs above were allocated under this worker's lease
+        await leases.fence(olt_lease_name(olt_id))
+        for index in executable:
+            outcome = not_read()
+            results[index] = {**new_registration_result(entries[index]), 'success': False,
+                              'outcome': outcome, 'error': outcome['message']}
+        reg_results = await execute_registration_entries(conn, [entries[i] for i in executable])
+        for index, reg_result in zip(executable, reg_results):
+            results[index] = reg_result
+    for index, reg_result in zip(executable, reg_results):
+        # Log registration
+        await record_registration(olt, profile, reg_result, username, session_timeline)
+    
+    # Registered ONTs leave the autofind table; do not serve a stale scan
+    discovery_flight.invalidate(olt_id)
+    
+    return results
+
 @api_router.post("/register")
-async def register_onts(data: RegisterRequest, user=Depends(get_current_user)):
+async def register_onts(data: RegisterRequest, response: Response, user=Depends(get_current_user),
+                        idempotency_key: Optional[str] = Header(None)):
+    return await idempotent(
+        idempotency_key, 'register', user, data, response,
+        lambda: run_register_onts(data, user)
+    )
+
+async def run_register_onts(data, user):
     olt = await db.olts.find_one({'_id': ObjectId(data.olt_id)})
     if not olt:
         raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
@@ -411,163 +1277,436 @@ async def register_onts(data: RegisterRequest, user=Depends(get_current_user)):
     if not profile:
         raise HTTPException(status_code=404, detail="Profile tidak ditemukan")
     
-    from olt_telnet import HuaweiOLTConnection, parse_ont_info_output, parse_service_port_output
-    from olt_telnet import find_next_available_ont_id, find_next_available_service_port
-    from olt_telnet import generate_ont_add_command, generate_service_port_command
+    try:
+        async with olt_session(olt) as conn:
+            results = await register_entries(conn, olt, profile, data.ont_entries, user['username'])
+        return summarize_results(results)
     
-    conn = HuaweiOLTConnection(
-        host=olt['ip_address'],
-        port=olt.get('port', 23),
-        username=olt['username'],
-        password=olt['password']
+    except OLTConnectionError as e:
+        raise olt_connection_http_error(e)
+    except Exception as e:
+        logger.error(f"Registration error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def throughput(count, seconds):
+    """ONTs per minute, guarding against zero durations."""
+    return round(count / seconds * 60, 2) if seconds > 0 else 0.0
+
+async def register_olt_groups(olt_id, groups, username, semaphore):
+    """Run every group of one OLT sequentially over a single session."""
+    summary = {'olt_id': olt_id, 'olt_name': None, 'error': None, 'results': []}
+    
+    def fail_all(entries, message):
+        for raw_entry in entries:
+            summary['results'].append({**conflict_result(new_entry(raw_entry)), 'error': message})
+    
+    async with semaphore:
+        started = time.monotonic()
+        current, group_results = 0, []
+        try:
+            olt = await db.olts.find_one({'_id': ObjectId(olt_id)})
+            if not olt:
+                raise Exception("OLT tidak ditemukan")
+            summary['olt_name'] = olt['name']
+            
+            async with olt_session(olt) as conn:
+                for current, group in enumerate(groups):
+                    group_results = []
+                    profile = await db.profiles.find_one({'_id': ObjectId(group.profile_id)})
+                    if not profile:
+                        fail_all(group.ont_entries, "Profile tidak ditemukan")
+                        continue
+                    await register_entries(conn, olt, profile, group.ont_entries, username, group_results)
+                    summary['results'].extend(group_results)
+                current = len(groups)
+        except Exception as e:
+            message = olt_connection_http_error(e).detail if isinstance(e, OLTConnectionError) else str(e)
+            logger.error(f"Batch registration error on OLT {olt_id}: {message}")
+            summary['error'] = message
+            # Entries of the interrupted group that already have a result keep
+            # it (an ONT added before the error is on the OLT); the rest fail
+            for index, raw_entry in enumerate(groups[current].ont_entries if current < len(groups) else []):
+                reg_result = group_results[index] if index < len(group_results) else None
+                if reg_result is None:
+                    fail_all([raw_entry], message)
+                else:
+                    summary['results'].append(reg_result)
+            fail_all([entry for g in groups[current + 1:] for entry in g.ont_entries], message)
+        
+        duration = time.monotonic() - started
+    
+    summary.update(summarize_results(summary['results']))
+    summary['duration_seconds'] = round(duration, 3)
+    summary['onts_per_minute'] = throughput(summary['success_count'], duration)
+    return summary
+
+async def run_batch(by_olt, username, requested_concurrency=None):
+    """Register {olt_id: [RegisterRequest]} groups, one session per OLT."""
+    concurrency = max(1, min(requested_concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    started = time.monotonic()
+    olt_summaries = await asyncio.gather(*(
+        register_olt_groups(olt_id, groups, username, semaphore)
+        for olt_id, groups in by_olt.items()
+    ))
+    duration = time.monotonic() - started
+    
+    total = sum(s['total'] for s in olt_summaries)
+    success_count = sum(s['success_count'] for s in olt_summaries)
+    return {
+        'success': all(s['success'] for s in olt_summaries),
+        'olts': olt_summaries,
+        'olt_count': len(olt_summaries),
+        'total': total,
+        'success_count': success_count,
+        'fail_count': total - success_count,
+        'concurrency': concurrency,
+        'duration_seconds': round(duration, 3),
+        'onts_per_minute': throughput(success_count, duration)
+    }
+
+@api_router.post("/register/batch")
+async def register_batch(data: BatchRegisterRequest, response: Response, user=Depends(get_current_user),
+                         idempotency_key: Optional[str] = Header(None)):
+    return await idempotent(
+        idempotency_key, 'register/batch', user, data, response,
+        lambda: run_register_batch(data, user)
+    )
+
+async def run_register_batch(data, user):
+    by_olt = {}
+    for group in data.groups:
+        by_olt.setdefault(group.olt_id, []).append(group)
+    return await run_batch(by_olt, user['username'], data.concurrency)
+
+async def find_olt_profile(olt_id, key):
+    """Profile of an OLT by id or by name."""
+    query = {'olt_id': olt_id}
+    if ObjectId.is_valid(key):
+        query['_id'] = ObjectId(key)
+    else:
+        query['name'] = key
+    return await db.profiles.find_one(query)
+
+@api_router.post("/register/by-sn")
+async def register_by_sn(data: RegisterBySNRequest, response: Response, user=Depends(get_current_user),
+                         idempotency_key: Optional[str] = Header(None)):
+    return await idempotent(
+        idempotency_key, 'register/by-sn', user, data, response,
+        lambda: run_register_by_sn(data, user)
+    )
+
+async def run_register_by_sn(data, user):
+    """Register ONTs given only their SN; OLT and F/S/P come from the SN index."""
+    by_olt, unresolved, profiles = {}, [], {}
+    for entry in data.ont_entries:
+        raw_entry = entry.model_dump()
+        location = await sn_index.lookup(raw_entry['sn'])
+        if not location:
+            unresolved.append({'sn': raw_entry['sn'], 'error': 'SN tidak ditemukan di hasil discovery'})
+            continue
+        olt_id = location['olt_id']
+        if olt_id not in profiles:
+            profiles[olt_id] = await find_olt_profile(olt_id, data.profile)
+        if not profiles[olt_id]:
+            unresolved.append({
+                'sn': raw_entry['sn'], 'olt_id': olt_id,
+                'error': f"Profile '{data.profile}' tidak ditemukan pada OLT {location.get('olt_name')}"
+            })
+            continue
+        if olt_id not in by_olt:
+            by_olt[olt_id] = [RegisterRequest(olt_id=olt_id, profile_id=str(profiles[olt_id]['_id']), ont_entries=[])]
+        by_olt[olt_id][0].ont_entries.append({**raw_entry, 'sn': location['sn'], 'fsp': location['fsp']})
+    
+    summary = await run_batch(by_olt, user['username'], data.concurrency)
+    summary['unresolved'] = unresolved
+    summary['success'] = summary['success'] and not unresolved
+    summary['total'] += len(unresolved)
+    summary['fail_count'] += len(unresolved)
+    return summary
+
+async def register_import_jobs(olt_id, jobs, username):
+    """Run bulk-import jobs of one OLT over a single session, yielding (job, results)."""
+    olt = await db.olts.find_one({'_id': ObjectId(olt_id)})
+    if not olt:
+        raise Exception("OLT tidak ditemukan")
+    profiles = {}
+    try:
+        async with olt_session(olt) as conn:
+            async for job in jobs:
+                if job['profile_id'] not in profiles:
+                    profiles[job['profile_id']] = await db.profiles.find_one({'_id': ObjectId(job['profile_id'])})
+                profile = profiles[job['profile_id']]
+                if not profile:
+                    yield job, [
+                        {**conflict_result(new_entry(e)), 'error': "Profile tidak ditemukan"} for e in job['entries']
+                    ]
+                    continue
+                yield job, await register_entries(conn, olt, profile, job['entries'], username)
+    except OLTConnectionError as e:
+        raise Exception(olt_connection_http_error(e).detail)
+
+bulk_importer = BulkImporter(
+    db, register_import_jobs, sn_index, concurrency=BATCH_CONCURRENCY,
+    owner=leases.owner, stale_after=IMPORT_STALE_SECONDS
+)
+
+# Bytes read from an uploaded file per chunk
+UPLOAD_CHUNK = 64 * 1024
+
+async def upload_chunks(upload):
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK)
+        if not chunk:
+            break
+        yield chunk
+
+@api_router.post("/register/import")
+async def import_registrations(request: Request, user=Depends(get_current_user), profile: Optional[str] = None):
+    """Bulk registration from a CSV (columns: sn, description, profile).
+    
+    Accepts a raw text/csv body or a multipart form with the CSV in a
+    `file` field (and optionally `profile`). The CSV is read in chunks;
+    rows are matched to the latest discovery snapshots and registered in
+    the background. Poll the import for progress.
+    """
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        upload = form.get('file')
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Field 'file' berisi CSV wajib diisi")
+        profile = form.get('profile') or profile
+        try:
+            imported = await bulk_importer.ingest(upload_chunks(upload), user['username'], default_profile=profile)
+        finally:
+            await form.close()
+    else:
+        imported = await bulk_importer.ingest(request.stream(), user['username'], default_profile=profile)
+    import_id = str(imported['_id'])
+    run_in_background(bulk_importer.run(import_id))
+    return serialize_doc(imported)
+
+@api_router.get("/register/imports/{import_id}")
+async def get_registration_import(import_id: str, user=Depends(get_current_user)):
+    imported = await bulk_importer.get(import_id)
+    if not imported:
+        raise HTTPException(status_code=404, detail="Import tidak ditemukan")
+    return serialize_doc(imported)
+
+@api_router.get("/register/imports/{import_id}/rows")
+async def get_registration_import_rows(import_id: str, user=Depends(get_current_user),
+                                       status: Optional[str] = None, skip: int = 0, limit: int = 100):
+    rows = await bulk_importer.rows(import_id, status=status, skip=skip, limit=min(limit, 1000))
+    return {'rows': [serialize_doc(r) for r in rows]}
+
+@api_router.post("/register/plans")
+async def create_registration_plan(data: RegisterRequest, user=Depends(get_current_user)):
+    olt = await db.olts.find_one({'_id': ObjectId(data.olt_id)})
+    if not olt:
+        raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
+    
+    profile = await db.profiles.find_one({'_id': ObjectId(data.profile_id)})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile tidak ditemukan")
+    
+    try:
+        async with leases.hold(olt_lease_name(data.olt_id)) as lease:
+            plan = await planner.create_plan(olt, profile, data.ont_entries, user['username'], lease=lease)
+    except OLTConnectionError as e:
+        raise olt_connection_http_error(e)
+    return serialize_doc(plan)
+
+@api_router.get("/register/plans/{plan_id}")
+async def get_registration_plan(plan_id: str, user=Depends(get_current_user)):
+    plan = await planner.get_plan(plan_id)
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan tidak ditemukan")
+    return serialize_doc(plan)
+
+@api_router.post("/register/plans/{plan_id}/execute")
+async def execute_registration_plan(plan_id: str, response: Response, user=Depends(get_current_user),
+                                    idempotency_key: Optional[str] = Header(None)):
+    return await idempotent(
+        idempotency_key, 'register/plans/execute', user, {'plan_id': plan_id}, response,
+        lambda: run_registration_plan(plan_id, user)
+    )
+
+def plan_taken_error():
+    """409 for a plan another request already moved out of 'planned'."""
+    return HTTPException(status_code=409, detail="Plan sudah dieksekusi oleh permintaan lain")
+
+async def run_registration_plan(plan_id, user):
+    plan = await planner.get_plan(plan_id)
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan tidak ditemukan")
+    if plan['status'] != 'planned':
+        raise HTTPException(status_code=409, detail=f"Plan berstatus {plan['status']}, tidak bisa dieksekusi")
+    if planner.is_expired(plan):
+        raise HTTPException(status_code=409, detail="Plan sudah kedaluwarsa, buat plan ulang")
+    
+    olt = await db.olts.find_one({'_id': ObjectId(plan['olt_id'])})
+    if not olt:
+        raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
+    profile = await db.profiles.find_one({'_id': ObjectId(plan['profile_id'])})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile tidak ditemukan")
+    
+    version, _ = await inventory.get_version(plan['olt_id'])
+    if version is None or version != plan['inventory_version']:
+        if not await planner.set_status(plan_id, 'stale', 'planned'):
+            raise plan_taken_error()
+        raise HTTPException(status_code=409, detail="Inventori OLT berubah sejak plan dibuat, buat plan ulang")
+    
+    executable = [e for e in plan['entries'] if not e['conflicts'] and e['ont_command']]
+    # Only the request that moves the plan out of 'planned' may execute it
+    claimed = await planner.set_status(
+        plan_id, 'executing', 'planned',
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=REGISTRATION_PLAN_TTL)
     )
+    if not claimed:
+        raise plan_taken_error()
     
     results = []
     
     try:
-        success, msg = await asyncio.to_thread(conn.connect)
-        if not success:
-            raise HTTPException(status_code=500, detail=f"Gagal koneksi ke OLT: {msg}")
-        
-        # Get existing service ports for auto-detection
-        sp_raw = await asyncio.to_thread(conn.send_command, "display service-port all")
-        existing_sp = parse_service_port_output(sp_raw)
-        
-        for entry in data.ont_entries:
-            sn = entry['sn']
-            fsp = entry.get('fsp', '0/0/0')
-            description = entry.get('description', '')
+        async with olt_session(olt) as conn:
+            # Cheap version check: one ONT listing per affected port
+            mismatches = await asyncio.to_thread(verify_plan_on_olt, conn, executable)
+            session_timeline = list(conn.timeline)
+            if mismatches:
+                await planner.set_status(plan_id, 'stale', 'executing', mismatches=mismatches)
+                raise HTTPException(status_code=409, detail={
+                    'message': 'Kondisi OLT tidak sesuai plan, sinkronkan inventori dan buat plan ulang',
+                    'mismatches': mismatches
+                })
             
-            parts = fsp.split('/')
-            frame = int(parts[0]) if len(parts) > 0 else 0
-            slot = int(parts[1]) if len(parts) > 1 else 0
-            port = int(parts[2]) if len(parts) > 2 else 0
+            async def release(ont_ids, sp_ids):
+                await planner.release(plan_id, ont_ids, sp_ids)
             
-            reg_result = {
-                'sn': sn,
-                'fsp': fsp,
-                'description': description,
-                'success': False,
-                'ont_id': None,
-                'service_port_id': None,
-                'commands': [],
-                'output': [],
-                'error': None
-            }
+            await leases.fence(olt_lease_name(plan['olt_id']))
             
-            try:
-                # Get existing ONTs on this port for auto-detection
-                await asyncio.to_thread(conn.send_command, f"interface gpon {frame}/{slot}")
-                ont_raw = await asyncio.to_thread(conn.send_command, f"display ont info {port} all")
-                existing_onts = parse_ont_info_output(ont_raw)
-                await asyncio.to_thread(conn.send_command, "quit")
-                
-                # Auto-detect next ONT ID
-                next_ont_id = find_next_available_ont_id(existing_onts)
-                if next_ont_id is None:
-                    reg_result['error'] = 'Tidak ada ONT ID tersedia pada port ini'
-                    results.append(reg_result)
-                    continue
-                
-                # Auto-detect next service port
-                next_sp_id = find_next_available_service_port(existing_sp)
-                if next_sp_id is None:
-                    reg_result['error'] = 'Tidak ada service-port ID tersedia'
-                    results.append(reg_result)
+            reg_results = iter(await execute_registration_entries(conn, executable, release))
+            for entry in plan['entries']:
+                if entry['conflicts'] or not entry['ont_command']:
+                    results.append(conflict_result(entry))
                     continue
-                
-                reg_result['ont_id'] = next_ont_id
-                reg_result['service_port_id'] = next_sp_id
-                
-                # Enter interface and add ONT
-                await asyncio.to_thread(conn.send_command, f"interface gpon {frame}/{slot}")
-                
-                ont_cmd = generate_ont_add_command(
-                    ont_id=next_ont_id,
-                    sn=sn,
-                    line_profile_id=profile['line_profile_id'],
-                    srv_profile_id=profile['srv_profile_id'],
-                    description=description
-                )
-                reg_result['commands'].append(ont_cmd)
-                ont_output = await asyncio.to_thread(conn.send_command, ont_cmd)
-                reg_result['output'].append(ont_output)
-                
-                # Exit interface
-                await asyncio.to_thread(conn.send_command, "quit")
-                
-                # Parse VLANs from profile
-                vlans = [v.strip() for v in profile.get('business_vlans', '').split(',') if v.strip()]
-                
-                # Add service port for each VLAN (or just the first one)
-                for vlan_str in (vlans if vlans else ['40']):
-                    try:
-                        vlan = int(vlan_str.split('-')[0])  # Handle ranges like 100-101
-                    except ValueError:
-                        continue
-                    
-                    sp_cmd = generate_service_port_command(
-                        sp_id=next_sp_id,
-                        vlan=vlan,
-                        frame=frame,
-                        slot=slot,
-                        port=port,
-                        ont_id=next_ont_id,
-                        gemport=profile.get('gemport', 1),
-                        user_vlan=profile.get('user_vlan') or vlan
-                    )
-                    reg_result['commands'].append(sp_cmd)
-                    sp_output = await asyncio.to_thread(conn.send_command, sp_cmd)
-                    reg_result['output'].append(sp_output)
-                    
-                    # Add to existing SP list for next iteration
-                    existing_sp.append(next_sp_id)
-                    next_sp_id = find_next_available_service_port(existing_sp)
-                    
-                    break  # Only first VLAN for now
-                
-                reg_result['success'] = True
-                
-            except Exception as e:
-                reg_result['error'] = str(e)
-            
-            results.append(reg_result)
-            
-            # Log registration
-            log_doc = {
-                'olt_id': data.olt_id,
-                'olt_name': olt['name'],
-                'profile_id': data.profile_id,
-                'profile_name': profile['name'],
-                'sn': sn,
-                'fsp': fsp,
-                'ont_id': reg_result['ont_id'],
-                'service_port_id': reg_result['service_port_id'],
-                'description': description,
-                'success': reg_result['success'],
-                'error': reg_result.get('error'),
-                'commands': reg_result['commands'],
-                'output': reg_result['output'],
-                'registered_at': datetime.now(timezone.utc),
-                'registered_by': user['username']
-            }
-            await db.registration_logs.insert_one(log_doc)
+                reg_result = next(reg_results)
+                results.append(reg_result)
+                await record_registration(olt, profile, reg_result, user['username'], session_timeline)
         
-        return {
-            'success': all(r['success'] for r in results),
-            'results': results,
-            'total': len(results),
-            'success_count': sum(1 for r in results if r['success']),
-            'fail_count': sum(1 for r in results if not r['success'])
-        }
+        discovery_flight.invalidate(plan['olt_id'])
+        await planner.set_status(
+            plan_id, 'executed', 'executing',
+            executed_at=datetime.now(timezone.utc),
+            executed_by=user['username']
+        )
+        return {**summarize_results(results), 'plan_id': plan_id}
     
     except HTTPException:
         raise
+    except OLTConnectionError as e:
+        await planner.set_status(plan_id, 'failed', 'executing', error=str(e))
+        raise olt_connection_http_error(e)
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error(f"Plan execution error: {e}")
+        await planner.set_status(plan_id, 'failed', 'executing', error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.disconnect()
+
+# ============================================================
+# INVENTORY ENDPOINTS
+# ============================================================
+
+@api_router.get("/inventory/search")
+async def search_inventory(sn: str, user=Depends(get_current_user)):
+    onts = await db.ont_inventory.find({'sn': sn.strip().upper()}).to_list(100)
+    results = []
+    for ont in onts:
+        s = serialize_doc(ont)
+        sps = await db.service_port_inventory.find(
+            {'olt_id': ont['olt_id'], 'fsp': ont['fsp'], 'ont_id': ont['ont_id']}
+        ).to_list(100)
+        s['service_ports'] = [serialize_doc(sp) for sp in sps]
+        results.append(s)
+    return {'sn': sn, 'count': len(results), 'locations': results}
+
+@api_router.get("/inventory/ports")
+async def list_inventory_ports(user=Depends(get_current_user), olt_id: Optional[str] = None,
+                               full_only: bool = False, min_onts: int = 0, limit: int = 500):
+    query = {}
+    if olt_id:
+        query['olt_id'] = olt_id
+    if full_only:
+        query['full'] = True
+    if min_onts:
+        query['ont_count'] = {'$gte': min_onts}
+    ports = await db.port_inventory.find(query).sort('ont_count', -1).limit(limit).to_list(limit)
+    return {'ports': [serialize_doc(p) for p in ports], 'total': len(ports)}
+
+@api_router.get("/inventory/status")
+async def get_inventory_status(user=Depends(get_current_user)):
+    states = await db.inventory_sync.find({}, {'ont_hash': 0, 'sp_hash': 0}).to_list(None)
+    return {'interval': INVENTORY_SYNC_INTERVAL, 'olts': [serialize_doc(s) for s in states]}
+
+@api_router.post("/inventory/sync")
+async def trigger_inventory_sync(data: InventorySyncRequest, user=Depends(get_current_user)):
+    if data.olt_id:
+        olt = await db.olts.find_one({'_id': ObjectId(data.olt_id)})
+        if not olt:
+            raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
+        return {'results': [await inventory.sync_olt(olt, force=data.force)]}
+    return {'results': await inventory.sync_all(force=data.force)}
+
+# ============================================================
+# THROTTLE / CIRCUIT BREAKER / SESSION POOL ENDPOINTS
+# ============================================================
+
+@api_router.get("/throttle")
+async def list_throttle_state(user=Depends(get_current_user)):
+    return {'olts': throttles.snapshot()}
+
+async def require_olt(olt_id: str):
+    """404 unless olt_id names a stored OLT (per-OLT registries create entries on lookup)."""
+    if not ObjectId.is_valid(olt_id) or not await db.olts.count_documents({'_id': ObjectId(olt_id)}, limit=1):
+        raise HTTPException(status_code=404, detail="OLT tidak ditemukan")
+
+@api_router.get("/throttle/{olt_id}")
+async def get_throttle_state(olt_id: str, user=Depends(get_current_user)):
+    await require_olt(olt_id)
+    return throttles.get(olt_id).snapshot()
+
+@api_router.get("/sessions")
+async def get_session_pool_state(user=Depends(get_current_user)):
+    return session_pool.snapshot()
+
+@api_router.get("/leases")
+async def get_lease_state(user=Depends(get_current_user)):
+    return leases.snapshot()
+
+@api_router.get("/breakers")
+async def list_breaker_state(user=Depends(get_current_user)):
+    return {'olts': breakers.snapshot()}
+
+@api_router.post("/breakers/{olt_id}/reset")
+async def reset_breaker(olt_id: str, user=Depends(get_current_user)):
+    await require_olt(olt_id)
+    breakers.get(olt_id).reset()
+    return breakers.get(olt_id).snapshot()
+
+@api_router.get("/runtime")
+async def get_runtime_state(user=Depends(get_current_user)):
+    return {
+        'event_loop': loop_monitor.snapshot(),
+        'parsing': parse_offloader.snapshot(),
+        'parse_cache': parse_cache.snapshot(),
+        'read_caches': {c.name: c.snapshot() for c in (olt_list_cache, profile_list_cache)}
+    }
+
+@api_router.get("/timings")
+async def get_telnet_timings(user=Depends(get_current_user), olt_id: Optional[str] = None,
+                             verb: Optional[str] = None):
+    rows = await timing_stats.summary(olt_id=olt_id, verb=verb)
+    return {'timings': [serialize_doc(r) for r in rows]}
 
 # ============================================================
 # REGISTRATION LOGS ENDPOINTS
@@ -579,6 +1718,79 @@ async def get_registration_logs(user=Depends(get_current_user), limit: int = 100
     total = await db.registration_logs.count_documents({})
     return {'logs': [serialize_doc(l) for l in logs], 'total': total}
 
+@api_router.get("/logs/export")
+async def export_registration_logs(user=Depends(get_current_user), format: str = 'csv',
+                                   fields: Optional[str] = None, start: Optional[datetime] = None,
+                                   end: Optional[datetime] = None, olt_id: Optional[str] = None,
+                                   username: Optional[str] = None, success: Optional[bool] = None,
+                                   gzip: bool = False):
+    """Stream matching logs as CSV/NDJSON straight from the cursor.
+
+    Ranges reaching past the retention cutoff read the archived day files
+    first, then the hot collection.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format tidak didukung: {format}")
+    columns = [f.strip() for f in fields.split(',') if f.strip()] if fields else DEFAULT_FIELDS
+    projection = {f: 1 for f in columns}
+    if '_id' not in projection:
+        projection['_id'] = 0
+    start = start.replace(tzinfo=timezone.utc) if start and start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end and end.tzinfo is None else end
+    
+    cursor = db.registration_logs.find(
+        log_filter(start, end, olt_id, username, success), projection
+    ).sort('registered_at', 1).batch_size(500)
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"registration_logs.{extension}" + ('.gz' if gzip else '')
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if gzip:
+        media_type = 'application/gzip'
+    if await retention.reaches_archive(start, end):
+        docs = archived_then_hot(cursor, start, end, olt_id=olt_id, registered_by=username, success=success)
+        try:
+            # First step takes the archive lock, so a busy archiver answers 503 before the body starts
+            await docs.__anext__()
+        except LeaseUnavailableError as e:
+            raise olt_connection_http_error(e)
+        cursor = docs
+        headers['X-Includes-Archive'] = 'true'
+    return StreamingResponse(
+        stream_logs(cursor, format, columns, compress=gzip), media_type=media_type, headers=headers
+    )
+
+async def archived_then_hot(cursor, start, end, **filters):
+    """Archived logs in range, then the hot cursor, with archiving held off throughout.
+
+    Yields None once the archive lock is held, before any log.
+    """
+    async with retention.exclusive():
+        yield None
+        async for doc in retention.iter_archive(start, end, **filters):
+            yield doc
+        async for doc in cursor:
+            yield doc
+
+@api_router.get("/logs/archive")
+async def search_archived_logs(user=Depends(get_current_user), start: Optional[datetime] = None,
+                               end: Optional[datetime] = None, olt_id: Optional[str] = None,
+                               username: Optional[str] = None, success: Optional[bool] = None,
+                               limit: int = 100):
+    """Slow path over archived logs: scans the gzipped day files in range."""
+    start = start.replace(tzinfo=timezone.utc) if start and start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end and end.tzinfo is None else end
+    logs = await retention.query_archive(
+        start=start, end=end, limit=min(limit, 1000),
+        olt_id=olt_id, registered_by=username, success=success
+    )
+    return {'logs': [serialize_doc(l) for l in logs], 'count': len(logs)}
+
+@api_router.post("/logs/archive")
+async def archive_registration_logs(user=Depends(get_current_user)):
+    result = await retention.archive_logs()
+    return serialize_doc(result)
+
 @api_router.get("/logs/{log_id}")
 async def get_log_detail(log_id: str, user=Depends(get_current_user)):
     log = await db.registration_logs.find_one({'_id': ObjectId(log_id)})
@@ -592,29 +1804,103 @@ async def get_log_detail(log_id: str, user=Depends(get_current_user)):
 
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(user=Depends(get_current_user)):
-    total_olts = await db.olts.count_documents({})
-    total_profiles = await db.profiles.count_documents({})
-    total_registrations = await db.registration_logs.count_documents({})
-    success_registrations = await db.registration_logs.count_documents({'success': True})
-    failed_registrations = await db.registration_logs.count_documents({'success': False})
-    
-    # Today's registrations
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_registrations = await db.registration_logs.count_documents(
-        {'registered_at': {'$gte': today_start}}
-    )
-    
-    # Recent logs
-    recent_logs = await db.registration_logs.find().sort('registered_at', -1).limit(5).to_list(5)
+    stats = await dashboard_feed.compute()
+    stats['recent_logs'] = [serialize_doc(l) for l in stats['recent_logs']]
+    return stats
+
+@api_router.websocket("/ws/dashboard")
+async def dashboard_updates(websocket: WebSocket, token: Optional[str] = None):
+    """Live dashboard: a snapshot on connect, then one update per burst of events.
     
+    Browsers cannot set headers on a WebSocket, so the JWT comes as ?token=.
+    The socket is read alongside the event queue, so a client that goes
+    away is noticed even while nothing is published.
+    """
+    try:
+        verify_token(token or '')
+    except Exception:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+    subscription = event_bus.subscribe()
+    receiver = asyncio.ensure_future(websocket.receive())
+    getter = None
+    try:
+        await websocket.send_json({'type': 'snapshot', 'stats': await dashboard_feed.snapshot()})
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                if receiver.result()['type'] == 'websocket.disconnect':
+                    break
+                # Client messages carry nothing; keep listening
+                receiver = asyncio.ensure_future(websocket.receive())
+            if getter not in done:
+                continue
+            events = [getter.result()]
+            while not subscription.queue.empty():
+                events.append(subscription.queue.get_nowait())
+            pushed = [e for e in events if e['type'] in ('registration', 'discovery')]
+            if not pushed and not any(e['type'] == 'stats' for e in events):
+                continue
+            await websocket.send_json({
+                'type': 'update',
+                'events': pushed,
+                'stats': await dashboard_feed.snapshot()
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (getter, receiver):
+            if task is not None:
+                task.cancel()
+        subscription.close()
+
+# ============================================================
+# REGISTRATION STATISTICS
+# ============================================================
+
+def rollup_range(granularity, dimension, start, end, days):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Granularity tidak didukung: {granularity}")
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Dimensi tidak didukung: {dimension}")
+    default_start, default_end = default_range(granularity, days)
+    start = start or default_start
+    end = end or default_end
+    # Naive query datetimes are taken as UTC, like the buckets
+    return (start.replace(tzinfo=timezone.utc) if start.tzinfo is None else start,
+            end.replace(tzinfo=timezone.utc) if end.tzinfo is None else end)
+
+@api_router.get("/stats/registrations")
+async def get_registration_series(user=Depends(get_current_user), granularity: str = 'hour',
+                                  dimension: str = 'all', key: Optional[str] = None,
+                                  start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                  days: Optional[int] = None):
+    """Registrations per hour/day bucket, per OLT, profile or operator."""
+    start, end = rollup_range(granularity, dimension, start, end, days)
+    buckets = await rollups.series(granularity, dimension, start, end, key=key)
+    return {
+        'granularity': granularity,
+        'dimension': dimension,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': buckets
+    }
+
+@api_router.get("/stats/registrations/summary")
+async def get_registration_summary(user=Depends(get_current_user), granularity: str = 'day',
+                                   dimension: str = 'olt', start: Optional[datetime] = None,
+                                   end: Optional[datetime] = None, days: Optional[int] = None):
+    """Totals per OLT, profile or operator over a range, busiest first."""
+    start, end = rollup_range(granularity, dimension, start, end, days)
+    totals = await rollups.summary(granularity, dimension, start, end)
     return {
-        'total_olts': total_olts,
-        'total_profiles': total_profiles,
-        'total_registrations': total_registrations,
-        'success_registrations': success_registrations,
-        'failed_registrations': failed_registrations,
-        'today_registrations': today_registrations,
-        'recent_logs': [serialize_doc(l) for l in recent_logs]
+        'granularity': granularity,
+        'dimension': dimension,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': totals
     }
 
 # ============================================================
@@ -625,9 +1911,18 @@ async def get_dashboard_stats(user=Depends(get_current_user)):
 async def health_check():
     return {"status": "healthy", "service": "OLT Huawei Registration"}
 
+@api_router.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 # Include router
 app.include_router(api_router)
 
+@app.middleware("http")
+async def track_in_flight_requests(request, call_next):
+    with loop_monitor.track(f"{request.method} {request.url.path}"):
+        return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -636,6 +1931,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_background_services():
+    # Logs written from here on are counted live; older ones by the backfill
+    rollup_cutoff = datetime.now(timezone.utc)
+    await inventory.ensure_indexes()
+    await planner.ensure_indexes()
+    await timing_stats.ensure_indexes()
+    await retention.ensure_indexes()
+    await bulk_importer.ensure_indexes()
+    await sn_index.ensure_indexes()
+    await leases.ensure_indexes()
+    await idempotency.ensure_indexes()
+    await rollups.ensure_indexes()
+    await sn_index.ensure_built()
+    inventory.start()
+    session_pool.start(teardown=teardown_pooled_session)
+    loop_monitor.start()
+    retention.start()
+    rollups.start(rollup_cutoff, archive=retention)
+    bulk_importer.start()
+    leases.start()
+    await cache_versions.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await inventory.stop()
+    await loop_monitor.stop()
+    await retention.stop()
+    await rollups.stop()
+    await bulk_importer.stop()
+    await cache_versions.stop()
+    parse_offloader.shutdown()
+    await session_pool.stop()
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    await leases.stop()
     client.close()
@@ -0,0 +1,82 @@
+"""
+SN Index Module
+Fleet-wide map of unregistered ONT serial numbers to where they were last
+seen (OLT, F/S/P, equipment ID), kept current as discovery scans land so
+one SN resolves with a single indexed lookup.
+"""
+import logging
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class SNLocationIndex:
+    """One `ont_locations` document per unregistered SN."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.ont_locations.create_index('sn', unique=True)
+        await self.db.ont_locations.create_index('sn_friendly')
+        await self.db.ont_locations.create_index([('olt_id', ASCENDING), ('last_seen', ASCENDING)])
+
+    async def record_scan(self, olt_id, olt_name, onts, scanned_at):
+        """Upsert every SN of an autofind snapshot and drop the OLT's SNs it no longer lists."""
+        operations = [
+            UpdateOne(
+                {'sn': ont['sn'].upper()},
+                {
+                    '$set': {
+                        'sn_friendly': (ont.get('sn_friendly') or '').upper(),
+                        'olt_id': olt_id,
+                        'olt_name': olt_name,
+                        'fsp': ont.get('fsp'),
+                        'equipment_id': ont.get('equipment_id'),
+                        'vendor_id': ont.get('vendor_id'),
+                        'last_seen': scanned_at,
+                    },
+                    '$setOnInsert': {'first_seen': scanned_at},
+                },
+                upsert=True
+            )
+            for ont in onts if ont.get('sn') and ont.get('fsp')
+        ]
+        if operations:
+            await self.db.ont_locations.bulk_write(operations, ordered=False)
+        # Registered or unplugged since the last scan
+        await self.db.ont_locations.delete_many({'olt_id': olt_id, 'last_seen': {'$lt': scanned_at}})
+
+    async def lookup(self, sn):
+        """Location of an SN given in hex (414C434C...) or vendor form (ALCL-...)."""
+        key = sn.strip().upper()
+        location = await self.db.ont_locations.find_one({'sn': key})
+        if location is None and key:
+            location = await self.db.ont_locations.find_one({'sn_friendly': key})
+        return location
+
+    async def resolve(self, sn):
+        location = await self.lookup(sn)
+        return {'olt_id': location['olt_id'], 'fsp': location['fsp']} if location else None
+
+    async def remove(self, sn):
+        await self.db.ont_locations.delete_one({'sn': sn.upper()})
+
+    async def remove_olt(self, olt_id):
+        await self.db.ont_locations.delete_many({'olt_id': olt_id})
+
+    async def rebuild(self):
+        """Seed the index from the latest snapshot of every OLT."""
+        async for olt in self.db.olts.find({}, {'_id': 1, 'name': 1}):
+            olt_id = str(olt['_id'])
+            snapshot = await self.db.discoveries.find_one(
+                {'olt_id': olt_id}, {'onts': 1, 'scanned_at': 1}, sort=[('scanned_at', -1)]
+            )
+            if snapshot:
+                await self.record_scan(olt_id, olt.get('name'), snapshot.get('onts', []), snapshot['scanned_at'])
+
+    async def ensure_built(self):
+        if await self.db.ont_locations.estimated_document_count() == 0:
+            await self.rebuild()
+            logger.info("SN location index rebuilt from latest discovery snapshots")
@@ -6,6 +6,9 @@ import { Badge } from "@/components/ui/badge";
 import { Server, FileText, ClipboardList, CheckCircle, XCircle, Activity } from "lucide-react";
 import { Skeleton } from "@/components/ui/skeleton";
 
+// Same origin as the REST API, over ws:// or wss://
+const WS_URL = `${API.replace(/^http/, "ws")}/ws/dashboard`;
+
 export default function DashboardPage() {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -14,6 +17,36 @@ export default function DashboardPage() {
     fetchStats();
   }, []);
 
+  // Live updates pushed by the server; reconnect after a drop
+  useEffect(() => {
+    let socket;
+    let retry;
+    let closed = false;
+
+    const connect = () => {
+      const token = localStorage.getItem("token");
+      if (!token) return;
+      socket = new WebSocket(`${WS_URL}?token=${encodeURIComponent(token)}`);
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.stats) {
+          setStats(message.stats);
+          setLoading(false);
+        }
+      };
+      socket.onclose = () => {
+        if (!closed) retry = setTimeout(connect, 5000);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (socket) socket.close();
+    };
+  }, []);
+
   const fetchStats = async () => {
     try {
       const res = await axios.get(`${API}/dashboard/stats`);
@@ -168,6 +168,8 @@ export default function OLTManagementPage() {
     switch (status) {
       case "connected":
         return <Badge className="bg-emerald-100 text-emerald-800 border-emerald-200 hover:bg-emerald-100" data-testid="status-connected-badge"><Wifi className="w-3 h-3 mr-1" />Connected</Badge>;
+      case "reachable":
+        return <Badge className="bg-amber-100 text-amber-800 border-amber-200 hover:bg-amber-100" data-testid="status-reachable-badge"><Wifi className="w-3 h-3 mr-1" />Reachable</Badge>;
       case "disconnected":
         return <Badge className="bg-red-100 text-red-800 border-red-200 hover:bg-red-100" data-testid="status-disconnected-badge"><WifiOff className="w-3 h-3 mr-1" />Disconnected</Badge>;
       case "error":
@@ -0,0 +1,452 @@
+"""
+OLT Protocol Tests - Parsing, Pipelining and Replay
+Runs the backend's telnet protocol code against scripted MA5600 output,
+without an OLT connection.
+"""
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from olt_telnet import (  # noqa: E402
+    HuaweiOLTConnection,
+    classify_ont_add,
+    classify_service_port,
+    find_free_service_port_block,
+    not_executed,
+    parse_service_port_output,
+    parse_service_port_table,
+)
+from olt_transcript import SessionRecorder, replay_transcript  # noqa: E402
+from planner import allocate_service_port_block, profile_service_vlans  # noqa: E402
+
+# ============================================================
+# MOCK CLI OUTPUTS
+# ============================================================
+
+SYSNAME = "MA5600"
+
+# Layout printed by the OLT: 'gpon 0/1 /7' followed by ONT ID and gemport
+MOCK_SERVICE_PORT_TABLE_OUTPUT = """
+  -----------------------------------------------------------------------------
+   INDEX VLAN VLAN     PORT F/ S/ P VPI  VCI   FLOW  FLOW       RX   TX   STATE
+         ID   ATTR     TYPE                    TYPE  PARA
+  -----------------------------------------------------------------------------
+       1   40 common   gpon 0/1 /7  0    1     vlan  40         -    -    up
+       2  100 common   gpon 0/1 /7  0    2     vlan  100        -    -    up
+      12  881 common   gpon 0/2 /3  12   1     vlan  881        -    -    down
+  -----------------------------------------------------------------------------
+   Total : 3  (Up/Down :    2/1)
+"""
+
+# Compact layout: 'gpon 0/1/7 /<ont>'
+MOCK_SERVICE_PORT_COMPACT_OUTPUT = """
+  -------------------------------------------------------------------------
+  INDEX  VLAN VLAN     PORT                  F/ S/P  VPI  VCI  FLOW  FLOW
+         ID   ATTR                                            TYPE  PARA
+  -------------------------------------------------------------------------
+  5      88   common   gpon 0/2/3 /0         -    -   1    -     -
+  103    881  common   gpon 0/1/7 /3         -    -   1    -     -
+  -------------------------------------------------------------------------
+"""
+
+MOCK_ONT_ADD_SUCCESS_OUTPUT = """
+ont add 7 4 sn-auth "48575443D7B00234" omci ont-lineprofile-id 15 ont-srvprofile-id 15
+  Number of ONTs that can be added: 1, success: 1
+  PortID :7, ONTID :4
+"""
+
+MOCK_ONT_ADD_FAILURES = {
+    'duplicate_sn': "  Failure: SN already exists",
+    'ont_id_taken': "  Failure: The ONT ID has already existed",
+    'profile_missing': "  Failure: The line profile does not exist",
+    'port_full': "  Failure: The number of ONTs reaches the upper limit",
+    'failed': "  Number of ONTs that can be added: 1, success: 0",
+    'cli_error': "                  ^\r\n  % Unknown command, the error locates at '^'",
+}
+
+MOCK_SERVICE_PORT_FAILURES = {
+    'service_port_exists': "  Failure: Service virtual port has existed already",
+    'vlan_missing': "  Failure: The VLAN does not exist",
+    'gemport_missing': "  Failure: The GEM port does not exist",
+    'ont_missing': "  Failure: The ONT does not exist",
+}
+
+PAGER = b"---- More ( Press 'Q' to break ) ----"
+
+
+class ScriptedTelnet:
+    """telnetlib.Telnet stand-in that answers each written line from a script.
+
+    `replies` maps a command prefix to its output; a list of strings is
+    paged, the next page following each space written. A reply of None
+    never returns a prompt.
+    """
+
+    def __init__(self, replies=None, sysname=SYSNAME):
+        self.replies = replies or {}
+        self.sysname = sysname.encode('ascii')
+        self.buffer = b"User name:"
+        self.state = 'username'
+        self.mode = b">"
+        self.pages = []
+        self.written = []
+        self.closed = False
+
+    def _prompt(self):
+        return b"\r\n" + self.sysname + self.mode
+
+    def _reply(self, command):
+        for prefix, reply in self.replies.items():
+            if command.startswith(prefix):
+                return reply
+        return ""
+
+    def _line(self, line):
+        if self.state == 'username':
+            self.state = 'password'
+            self.buffer += b"User password:"
+            return
+        if self.state == 'password':
+            self.state = 'cli'
+            self.buffer += self._prompt()
+            return
+        self.buffer += line.encode('ascii') + b"\r\n"
+        if self.state == 'logout':
+            if line == 'y':
+                self.closed = True
+            else:
+                self.state = 'cli'
+                self.buffer += self._prompt()
+            return
+        if line == 'quit' and self.mode == b">":
+            self.state = 'logout'
+            self.buffer += b"  Are you sure to log out? (y/n)[n]:"
+            return
+        if line == 'enable':
+            self.mode = b"#"
+        elif line == 'config' or (line == 'quit' and self.mode.startswith(b"(config-")):
+            self.mode = b"(config)#"
+        elif line == 'quit':
+            self.mode = b"#" if self.mode == b"(config)#" else b">"
+        elif line.startswith('interface gpon '):
+            self.mode = b"(config-if-gpon-" + line.split()[-1].encode('ascii') + b")#"
+        reply = self._reply(line)
+        if reply is None:
+            return
+        if isinstance(reply, list):
+            self.pages = [p.encode('ascii') for p in reply[1:]]
+            self.buffer += reply[0].encode('ascii') + b"\r\n" + PAGER
+            return
+        self.buffer += reply.encode('ascii') + self._prompt()
+
+    def write(self, data):
+        self.written.append(data)
+        if data == b" " and self.pages:
+            self.buffer += self.pages.pop(0)
+            if self.pages:
+                self.buffer += b"\r\n" + PAGER
+            else:
+                self.buffer += self._prompt()
+            return
+        for line in data.decode('ascii').split('\n')[:-1]:
+            self._line(line)
+
+    def read_until(self, match, timeout=None):
+        end = self.buffer.find(match)
+        end = len(self.buffer) if end < 0 else end + len(match)
+        text, self.buffer = self.buffer[:end], self.buffer[end:]
+        return text
+
+    def expect(self, patterns, timeout=None):
+        # Like telnetlib: the first pattern in list order that matches wins
+        for idx, pattern in enumerate(patterns):
+            m = re.compile(pattern).search(self.buffer) if isinstance(pattern, bytes) else pattern.search(self.buffer)
+            if m:
+                text, self.buffer = self.buffer[:m.end()], self.buffer[m.end():]
+                return idx, m, text
+        text, self.buffer = self.buffer, b""
+        return -1, None, text
+
+    def read_very_eager(self):
+        if self.closed:
+            raise EOFError('telnet connection closed')
+        text, self.buffer = self.buffer, b""
+        return text
+
+    def close(self):
+        self.closed = True
+
+
+def scripted_connection(replies=None, pipeline_window=1, recorder=None):
+    """A logged-in HuaweiOLTConnection talking to a ScriptedTelnet."""
+    telnet = ScriptedTelnet(replies)
+    conn = HuaweiOLTConnection('olt-test', username='admin', password='secret',
+                               recorder=recorder, pipeline_window=pipeline_window)
+    conn.telnet_factory = lambda host, port, timeout: telnet
+    success, message = conn.connect()
+    assert success, message
+    return conn, telnet
+
+
+# ============================================================
+# TESTS
+# ============================================================
+
+def test_parse_service_port_table():
+    """Both service-port layouts parse into full records."""
+    print("=" * 60)
+    print("TEST: Parse Service Port Table")
+    print("=" * 60)
+
+    records = parse_service_port_table(MOCK_SERVICE_PORT_TABLE_OUTPUT)
+    assert [r['sp_id'] for r in records] == [1, 2, 12], f"Got {records}"
+    assert records[0] == {
+        'sp_id': 1, 'vlan': 40, 'vlan_attr': 'common', 'fsp': '0/1/7', 'ont_id': 0, 'gemport': 1
+    }, f"Got {records[0]}"
+    assert (records[2]['fsp'], records[2]['ont_id'], records[2]['gemport']) == ('0/2/3', 12, 1)
+
+    compact = parse_service_port_table(MOCK_SERVICE_PORT_COMPACT_OUTPUT)
+    assert [(r['sp_id'], r['vlan'], r['fsp'], r['ont_id']) for r in compact] == [
+        (5, 88, '0/2/3', 0), (103, 881, '0/1/7', 3)
+    ], f"Got {compact}"
+
+    print(f"✓ Parsed {len(records)} + {len(compact)} service-port records")
+    print()
+
+
+def test_replay_parser_regression():
+    """A recorded session replays to the same outputs and parses the same way."""
+    print("=" * 60)
+    print("TEST: Transcript Replay Parser Regression")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.jsonl.gz')
+        recorder = SessionRecorder(path, {'host': 'olt-test', 'username': 'admin'}, secrets=['secret'])
+        conn, _ = scripted_connection(
+            {'display service-port all': MOCK_SERVICE_PORT_TABLE_OUTPUT.strip('\n')}, recorder=recorder
+        )
+        live = conn.send_command('display service-port all')
+        conn.close()
+
+        replay = replay_transcript(path)
+
+    assert replay['connected'], replay['message']
+    assert replay['mismatches'] == [], f"Writes diverged: {replay['mismatches']}"
+    assert [r['command'] for r in replay['results']] == ['display service-port all']
+    replayed = replay['results'][0]['output']
+    assert replayed == live
+    assert parse_service_port_table(replayed) == parse_service_port_table(MOCK_SERVICE_PORT_TABLE_OUTPUT)
+    assert parse_service_port_output(replayed) == [1, 2, 12]
+
+    print(f"✓ Replayed {len(replay['results'])} command(s), {len(replay['timeline'])} timeline events")
+    print()
+
+
+def test_profile_service_vlans():
+    """Business VLAN lists and ranges expand to one VLAN per service-port."""
+    print("=" * 60)
+    print("TEST: Profile VLAN Expansion")
+    print("=" * 60)
+
+    cases = [
+        ('40', [40]),
+        ('100,200', [100, 200]),
+        ('100-102,300', [100, 101, 102, 300]),
+        ('102-100', [100, 101, 102]),
+        ('40, 40-41 ,x,5000,0', [40, 41]),
+        ('', [40]),
+    ]
+    for business_vlans, expected in cases:
+        vlans = profile_service_vlans({'business_vlans': business_vlans})
+        assert vlans == expected, f"{business_vlans!r}: expected {expected}, got {vlans}"
+        print(f"✓ {business_vlans!r} -> {vlans}")
+    print()
+
+
+def test_find_free_service_port_block():
+    """Service-port blocks are the first run of consecutive free IDs."""
+    print("=" * 60)
+    print("TEST: Free Service-Port Block")
+    print("=" * 60)
+
+    used = parse_service_port_output(MOCK_SERVICE_PORT_COMPACT_OUTPUT) + [1, 2, 4, 6, 7]
+    assert find_free_service_port_block(used, 1) == 3
+    assert find_free_service_port_block(used, 2) == 8
+    assert find_free_service_port_block([], 3) == 1
+    assert find_free_service_port_block(range(1, 4094), 2) == 4094
+    assert find_free_service_port_block(range(1, 4095), 2) is None
+    assert find_free_service_port_block(range(1, 4095), 1) == 4095
+
+    assert allocate_service_port_block(used, 3) == [8, 9, 10]
+    assert allocate_service_port_block(used, 0) == []
+    assert allocate_service_port_block(range(1, 4096), 1) is None
+
+    print(f"✓ Blocks found around used IDs {sorted(used)}")
+    print()
+
+
+def service_port_commands(count, start=10):
+    return [
+        f'service-port {start + i} vlan 40 gpon 0/1/7 ont {i} gemport 1 multi-service user-vlan 40 tag-transform translate'
+        for i in range(count)
+    ]
+
+
+def test_pipelined_demux():
+    """A pipelined burst is split back into one output per command at each prompt."""
+    print("=" * 60)
+    print("TEST: Pipelined Output Demux")
+    print("=" * 60)
+
+    commands = service_port_commands(5)
+    conn, telnet = scripted_connection(
+        {'service-port 11 ': 'Failure: Service virtual port has existed already'}, pipeline_window=4
+    )
+    conn.send_command('interface gpon 0/1')
+    writes = len(telnet.written)
+    outputs = conn.send_commands(commands)
+
+    assert len(outputs) == len(commands), f"Expected {len(commands)} outputs, got {len(outputs)}"
+    for command, output in zip(commands, outputs):
+        assert output.startswith(command), f"Output of {command!r} is {output!r}"
+        assert output.rstrip().endswith(f"{SYSNAME}(config-if-gpon-0/1)#")
+    assert 'has existed' in outputs[1] and 'has existed' not in outputs[0] + outputs[2]
+    assert len(telnet.written) - writes == 2, "Expected one write per window of 4"
+    assert conn.command_errors == 0 and conn.tn is not None
+
+    print(f"✓ {len(commands)} commands in {len(telnet.written) - writes} writes, outputs aligned")
+    print()
+
+
+def test_pipelined_desync():
+    """A pager mid-burst stops it: unread commands get None, unsent ones are dropped."""
+    print("=" * 60)
+    print("TEST: Pipelined Desync")
+    print("=" * 60)
+
+    commands = service_port_commands(5)
+    conn, telnet = scripted_connection(
+        {'service-port 12 ': ['Warning: page one', 'page two']}, pipeline_window=2
+    )
+    writes = len(telnet.written)
+    outputs = conn.send_commands(commands)
+
+    # Window [10, 11] read back, window [12, 13] written but unread, 14 never sent
+    assert len(outputs) == 4, f"Expected 4 outputs, got {len(outputs)}"
+    assert outputs[0].startswith(commands[0]) and outputs[1].startswith(commands[1])
+    assert outputs[2:] == [None, None]
+    assert len(telnet.written) - writes == 2
+    assert not any(commands[4].encode('ascii') in w for w in telnet.written)
+    assert conn.command_errors == 1
+    assert conn.tn is None and telnet.closed, "A desynced session must be dropped"
+
+    print(f"✓ Burst stopped after {outputs.count(None)} unread command(s), session dropped")
+    print()
+
+
+def test_sequential_timeout_desync():
+    """Without pipelining a missing prompt also ends the burst and the session."""
+    print("=" * 60)
+    print("TEST: Sequential Timeout Desync")
+    print("=" * 60)
+
+    commands = service_port_commands(3)
+    conn, telnet = scripted_connection({'service-port 11 ': None})
+    outputs = conn.send_commands(commands, timeout=0)
+
+    assert len(outputs) == 2 and outputs[0].startswith(commands[0]) and outputs[1] is None, f"Got {outputs}"
+    assert not any(commands[2].encode('ascii') in w for w in telnet.written)
+    assert conn.tn is None and telnet.closed
+
+    print("✓ Timeout returned None for the unread command and dropped the session")
+    print()
+
+
+def test_disconnect_confirms_logout():
+    """With confirm_timeout the quits reach user mode and the (y/n) prompt is answered."""
+    print("=" * 60)
+    print("TEST: Disconnect Confirms Logout")
+    print("=" * 60)
+
+    conn, telnet = scripted_connection()
+    conn.send_command('interface gpon 0/1')
+    conn.send_command('quit')
+    writes = len(telnet.written)
+    conn.disconnect(confirm_timeout=1)
+
+    assert telnet.written[writes:] == [b"quit\nquit\nquit\n", b"y\n"], f"Got {telnet.written[writes:]}"
+    assert telnet.closed and conn.tn is None
+
+    conn, telnet = scripted_connection()
+    writes = len(telnet.written)
+    conn.disconnect()
+    assert telnet.written[writes:] == [b"quit\nquit\nquit\n"] and telnet.closed, "No confirmation without a timeout"
+
+    print("✓ Logout prompt answered before closing; skipped when confirm_timeout is 0")
+    print()
+
+
+def test_classify_ont_add():
+    """'ont add' output becomes a typed outcome."""
+    print("=" * 60)
+    print("TEST: Classify ont add")
+    print("=" * 60)
+
+    outcome = classify_ont_add(MOCK_ONT_ADD_SUCCESS_OUTPUT)
+    assert outcome['ok'] and outcome['code'] == 'success' and outcome['ont_id'] == 4, f"Got {outcome}"
+    for code, output in MOCK_ONT_ADD_FAILURES.items():
+        outcome = classify_ont_add(output)
+        assert outcome['code'] == code and not outcome['ok'], f"{code}: got {outcome}"
+        assert not_executed(outcome), f"{code} is a definite rejection"
+        print(f"✓ {code}")
+
+    # Written but unread, or read back empty: the OLT may have run it
+    assert classify_ont_add(None)['code'] == 'unknown'
+    assert classify_ont_add('')['code'] == 'no_response'
+    assert not not_executed(classify_ont_add(None)) and not not_executed(classify_ont_add(''))
+    print("✓ unknown / no_response keep their IDs reserved")
+    print()
+
+
+def test_classify_service_port():
+    """'service-port' output becomes a typed outcome; silence means success."""
+    print("=" * 60)
+    print("TEST: Classify service-port")
+    print("=" * 60)
+
+    assert classify_service_port('service-port 10 vlan 40 gpon 0/1/7 ont 4 gemport 1\r\n')['ok']
+    for code, output in MOCK_SERVICE_PORT_FAILURES.items():
+        outcome = classify_service_port(output)
+        assert outcome['code'] == code and not_executed(outcome), f"{code}: got {outcome}"
+        print(f"✓ {code}")
+    assert classify_service_port(None)['code'] == 'unknown'
+    assert classify_service_port('')['code'] == 'no_response'
+    print()
+
+
+if __name__ == '__main__':
+    print("\n🔧 Huawei MA5600 OLT - Protocol Tests\n")
+
+    try:
+        test_parse_service_port_table()
+        test_replay_parser_regression()
+        test_profile_service_vlans()
+        test_find_free_service_port_block()
+        test_pipelined_demux()
+        test_pipelined_desync()
+        test_sequential_timeout_desync()
+        test_disconnect_confirms_logout()
+        test_classify_ont_add()
+        test_classify_service_port()
+
+        print("=" * 60)
+        print("ALL PROTOCOL TESTS PASSED!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ TEST FAILED: {e}")
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")
@@ -0,0 +1,105 @@
+"""
+Registration Plan Tests - Execution Claims
+Runs run_registration_plan against an in-memory database with the OLT
+session replaced, so no OLT or MongoDB server is needed.
+"""
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+
+from fastapi import HTTPException  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+from planner import RegistrationPlanner  # noqa: E402
+
+# ============================================================
+# MOCK INVENTORY AND OLT SESSION
+# ============================================================
+
+INVENTORY_VERSION = 'v1'
+
+
+class MockInventory:
+    async def get_version(self, olt_id):
+        # Yield so concurrent executes interleave between reading and claiming the plan
+        await asyncio.sleep(0)
+        return INVENTORY_VERSION, datetime.now(timezone.utc)
+
+
+async def seed_plan(db):
+    olt = await db.olts.insert_one({'name': 'OLT-TEST'})
+    profile = await db.profiles.insert_one({'name': 'Paket 20M'})
+    plan = await db.registration_plans.insert_one({
+        'olt_id': str(olt.inserted_id),
+        'profile_id': str(profile.inserted_id),
+        'inventory_version': INVENTORY_VERSION,
+        'entries': [],
+        'status': 'planned',
+        'expires_at': datetime.now(timezone.utc) + timedelta(minutes=15),
+    })
+    return str(plan.inserted_id)
+
+
+# ============================================================
+# TESTS
+# ============================================================
+
+def test_concurrent_execute_claims_plan_once():
+    """Two executes of one plan: only one opens an OLT session, the other gets 409."""
+    print("=" * 60)
+    print("TEST: Concurrent Plan Execution")
+    print("=" * 60)
+
+    sessions = []
+
+    @asynccontextmanager
+    async def mock_olt_session(olt):
+        sessions.append(olt['_id'])
+        raise HTTPException(status_code=503, detail="OLT session not available in tests")
+        yield
+
+    db = AsyncMongoMockClient()['test_registration_plans']
+    saved = server.db, server.planner, server.inventory, server.olt_session
+    server.db, server.inventory, server.olt_session = db, MockInventory(), mock_olt_session
+    server.planner = RegistrationPlanner(db, server.inventory)
+
+    async def run():
+        plan_id = await seed_plan(db)
+        user = {'username': 'operator'}
+        return await asyncio.gather(
+            server.run_registration_plan(plan_id, user),
+            server.run_registration_plan(plan_id, user),
+            return_exceptions=True
+        ), plan_id
+
+    try:
+        outcomes, plan_id = asyncio.run(run())
+    finally:
+        server.db, server.planner, server.inventory, server.olt_session = saved
+
+    codes = sorted(o.status_code for o in outcomes)
+    assert len(sessions) == 1, f"Expected one OLT session, got {len(sessions)}"
+    assert codes == [409, 503], f"Got {codes}"
+    print(f"✓ One execute reached the OLT session, the other answered 409 (plan {plan_id})")
+    print()
+
+
+if __name__ == '__main__':
+    print("\n🔧 Registration Plans - Execution Tests\n")
+
+    try:
+        test_concurrent_execute_claims_plan_once()
+
+        print("=" * 60)
+        print("ALL REGISTRATION PLAN TESTS PASSED!")
+        print("=" * 60)
+    except AssertionError as e:
+        print(f"\n❌ TEST FAILED: {e}")
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}")